@@ -4,20 +4,71 @@ https://github.com/Robpol86/docoptcfg
 https://pypi.python.org/pypi/docoptcfg
 """
 
+import array
+import ast
+import glob
+import hashlib
+import itertools
+import json
+import locale
+import mmap
 import os
+import pprint
+import re
+import select
+import string
+import struct
 import sys
+import tempfile
+import threading
+import time
+import weakref
+from collections import deque
+from contextlib import contextmanager
 
 try:
     from ConfigParser import ConfigParser, Error
 except ImportError:
     from configparser import ConfigParser, Error
 
+try:
+    from httplib import HTTPConnection, HTTPException, HTTPSConnection
+    from urlparse import urlsplit
+except ImportError:
+    from http.client import HTTPConnection, HTTPException, HTTPSConnection
+    from urllib.parse import urlsplit
+
+try:
+    from collections.abc import Mapping, Sequence
+except ImportError:
+    from collections import Mapping, Sequence
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    ThreadPoolExecutor = None  # Python 2 without the futures backport. Files are read sequentially.
+
 import docopt
 
-__all__ = ('docoptcfg',)
+__all__ = ('clear_cache', 'CompactList', 'compile', 'ConfigCache', 'DictSource', 'DirSource', 'docoptcfg',
+           'docoptcfg_many', 'EnvIndex', 'EnvSource', 'generate', 'HttpSource', 'IniSource', 'LayeredSource',
+           'LazyResult', 'ResultCache', 'Source', 'Spec', 'Stats', 'watch', 'Watcher')
 __author__ = '@Robpol86'
 __license__ = 'MIT'
 __version__ = '1.0.2'
+ENCODING = locale.getpreferredencoding(False)
+DISK_CACHE_FORMAT = 1
+SECTION_INDEXES = dict()  # id(ConfigParser) to (weak reference, section names, section_index()).
+SPEC_CACHE = dict()  # get_spec() key to (Spec, last used tick).
+SPEC_CACHE_SIZE = 128
+SPEC_LOCK = threading.Lock()
+SPEC_TICKS = itertools.count()
+TIMER = getattr(time, 'perf_counter', time.time)
 
 
 class DocoptcfgError(Exception):
@@ -29,107 +80,1132 @@ class DocoptcfgFileError(Exception):
 
     FILE_PATH = ''
 
-    def __init__(self, message, original_error=None):
+    def __init__(self, message, original_error=None, file_path=''):
         """Constructor."""
         self.message = message
         self.original_error = original_error
-        super(DocoptcfgFileError, self).__init__(message, self.FILE_PATH, original_error)
+        self.FILE_PATH = file_path  # pylint: disable=invalid-name
+        super(DocoptcfgFileError, self).__init__(message, file_path, original_error)
 
+    def __reduce__(self):
+        """Support pickling (e.g. raised in a process pool)."""
+        return self.__class__, (self.message, self.original_error, self.FILE_PATH)
 
-def settable_options(doc, argv, ignore, options_first):
-    """Determine which options we can set, which ones are boolean, and which ones are repeatable.
 
-    All set items are option long names.
+class DocoptcfgExit(docopt.DocoptExit):
+    """docopt.DocoptExit with the usage of a specific docstring instead of the one docopt stores globally."""
 
-    :param str doc: Docstring from docoptcfg().
-    :param iter argv: CLI arguments from docoptcfg().
-    :param iter ignore: Options to ignore from docoptcfg().
-    :param bool options_first: docopt argument from docoptcfg().
+    def __init__(self, message='', usage=''):
+        """Constructor."""
+        self.usage = usage
+        SystemExit.__init__(self, (message + '\n' + usage).strip())  # pylint: disable=non-parent-init-called
 
-    :return: Settable options, boolean options, repeatable options, and short to long option name mapping.
-    :rtype: tuple
+
+class Stats(object):
+    """Wall time per phase and counters collected while resolving options. Pass an instance to docoptcfg(stats=...).
+
+    Phases are compile, argv, and one per value source (env and config by default). Counters are listed in COUNTERS,
+    custom value sources may add their own.
+
+    :ivar dict timings: Phase name to seconds spent.
+    :ivar dict counters: Counter name to value.
+    """
+
+    COUNTERS = ('env_lookups', 'files_opened', 'bytes_read', 'cache_hits', 'cache_misses', 'from_argv', 'from_env',
+                'from_file')
+
+    def __init__(self):
+        """Constructor."""
+        self.timings = dict()
+        self.counters = dict((c, 0) for c in self.COUNTERS)
+
+    @contextmanager
+    def phase(self, name):
+        """Context manager adding its wall time to a phase.
+
+        :param str name: Phase name.
+        """
+        start = TIMER()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + TIMER() - start
+
+    def incr(self, name, value=1):
+        """Increment a counter.
+
+        :param str name: Counter name.
+        :param int value: Amount to add.
+        """
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def report(self, section=''):
+        """One line human readable summary.
+
+        :param str section: Program name to prefix the line with.
+
+        :return: Summary.
+        :rtype: str
+        """
+        parts = ['docoptcfg [{0}]'.format(section)]
+        parts.extend('{0}={1:.3f}ms'.format(n, self.timings[n] * 1000) for n in sorted(self.timings))
+        parts.extend('{0}={1}'.format(n, self.counters[n]) for n in self.COUNTERS)
+        parts.extend('{0}={1}'.format(n, self.counters[n]) for n in sorted(set(self.counters) - set(self.COUNTERS)))
+        return ' '.join(parts)
+
+
+class NullStats(Stats):
+    """Stats that discards everything, used when no stats are requested."""
+
+    class NullPhase(object):
+        """No-op context manager."""
+
+        def __enter__(self):
+            """Do nothing."""
+            pass
+
+        def __exit__(self, *_):
+            """Do nothing."""
+            pass
+
+    PHASE = NullPhase()
+
+    def phase(self, name):
+        """Do nothing.
+
+        :param str name: Phase name.
+        """
+        return self.PHASE
+
+    def incr(self, name, value=1):
+        """Do nothing.
+
+        :param str name: Counter name.
+        :param int value: Amount to add.
+        """
+        pass
+
+
+NULL_STATS = NullStats()
+
+
+def pattern_leaves(pattern, *types):
+    """Same as docopt's pattern.flat() without concatenating lists with sum() (quadratic for nodes with many children).
+
+    :param pattern: docopt pattern tree node.
+    :param iter types: Only return nodes of these classes. All leaves if empty.
+
+    :return: Nodes in the same order as pattern.flat().
+    :rtype: list
     """
-    settable, booleans, repeatable, short_map = set(), set(), set(), dict()
+    leaves, stack = list(), [pattern]
+    while stack:
+        node = stack.pop()
+        if node.__class__ in types:
+            leaves.append(node)
+        elif hasattr(node, 'children'):
+            stack.extend(reversed(node.children))
+        elif not types:
+            leaves.append(node)
+    return leaves
+
 
-    # Determine which options are settable by docoptcfg and which ones are flags/booleans.
-    options = docopt.parse_defaults(doc)
-    short_map.update((o.short, o.long) for o in options)
-    parsed_argv = docopt.parse_argv(docopt.TokenStream(argv, docopt.DocoptExit), list(options), options_first)
-    overridden = [o.long for o in parsed_argv if hasattr(o, 'long')]
+def parse_usage(formal_usage, options):
+    """Same as docopt.parse_pattern() but options are looked up in dicts instead of a linear search per usage option.
+
+    :raise docopt.DocoptLanguageError: If the usage section is invalid.
+
+    :param str formal_usage: Output of docopt.formal_usage().
+    :param list options: Options from docopt.parse_defaults(). Options only found in the usage section are appended.
+
+    :return: Unfixed pattern tree.
+    :rtype: docopt.Required
+    """
+    by_long, by_short = dict(), dict()
     for option in options:
-        if option.long in overridden or (option.long in ignore or option.short in ignore):
-            continue
+        by_long.setdefault(option.long, list()).append(option)
+        by_short.setdefault(option.short, list()).append(option)
+    tokens = docopt.TokenStream(re.sub(r'([\[\]\(\)\|]|\.\.\.)', r' \1 ', formal_usage), docopt.DocoptLanguageError)
+
+    def new_option(short, long_, argcount):
+        """Add an option only found in the usage section."""
+        option = docopt.Option(short, long_, argcount)
+        options.append(option)
+        by_long.setdefault(long_, list()).append(option)
+        by_short.setdefault(short, list()).append(option)
+        return option
+
+    def parse_long():
+        """Parse a long option and its argument.
+
+        long ::= '--' chars [ ( ' ' | '=' ) chars ] ;
+        """
+        long_, eq, value = tokens.move().partition('=')
+        value = None if eq == value == '' else value
+        similar = by_long.get(long_, ())
+        if len(similar) > 1:
+            raise tokens.error('%s is not a unique prefix: %s?' % (long_, ', '.join(o.long for o in similar)))
+        if not similar:
+            return [new_option(None, long_, 1 if eq == '=' else 0)]
+        option = docopt.Option(similar[0].short, similar[0].long, similar[0].argcount, similar[0].value)
         if option.argcount == 0:
-            booleans.add(option.long)
-        settable.add(option.long)
-
-    # Determine which options are repeatable.
-    if settable and '...' in doc:
-        pattern = docopt.parse_pattern(docopt.formal_usage(docopt.DocoptExit.usage), options)
-        for option in pattern.fix().flat():
-            if not hasattr(option, 'long'):
-                continue  # Positional argument or sub-command.
-            if getattr(option, 'long') not in settable:
+            if value is not None:
+                raise tokens.error('%s must not have an argument' % option.long)
+        elif value is None:
+            if tokens.current() is None:
+                raise tokens.error('%s requires argument' % option.long)
+            tokens.move()
+        return [option]
+
+    def parse_shorts():
+        """Parse stacked short options and the argument of the last one.
+
+        shorts ::= '-' ( chars )* [ [ ' ' ] chars ] ;
+        """
+        left, parsed = tokens.move().lstrip('-'), list()
+        while left != '':
+            short, left = '-' + left[0], left[1:]
+            similar = by_short.get(short, ())
+            if len(similar) > 1:
+                raise tokens.error('%s is specified ambiguously %d times' % (short, len(similar)))
+            if not similar:
+                parsed.append(new_option(short, None, 0))
+                continue
+            option = docopt.Option(short, similar[0].long, similar[0].argcount, similar[0].value)
+            if option.argcount != 0:
+                if left == '':
+                    if tokens.current() is None:
+                        raise tokens.error('%s requires argument' % short)
+                    tokens.move()
+                left = ''
+            parsed.append(option)
+        return parsed
+
+    def parse_expr():
+        """Parse sequences separated by pipes.
+
+        expr ::= seq ( '|' seq )* ;
+        """
+        seq = parse_seq()
+        if tokens.current() != '|':
+            return seq
+        result = [docopt.Required(*seq)] if len(seq) > 1 else seq
+        while tokens.current() == '|':
+            tokens.move()
+            seq = parse_seq()
+            result += [docopt.Required(*seq)] if len(seq) > 1 else seq
+        return [docopt.Either(*result)] if len(result) > 1 else result
+
+    def parse_seq():
+        """Parse atoms, each optionally repeated with an ellipsis.
+
+        seq ::= ( atom [ '...' ] )* ;
+        """
+        result = list()
+        while tokens.current() not in [None, ']', ')', '|']:
+            atom = parse_atom()
+            if tokens.current() == '...':
+                atom = [docopt.OneOrMore(*atom)]
+                tokens.move()
+            result += atom
+        return result
+
+    def parse_atom():
+        """Parse a group, the options shortcut, an option, an argument, or a command.
+
+        atom ::= '(' expr ')' | '[' expr ']' | 'options' | long | shorts | argument | command ;
+        """
+        token = tokens.current()
+        if token in '([':
+            tokens.move()
+            matching, pattern = {'(': [')', docopt.Required], '[': [']', docopt.Optional]}[token]
+            result = pattern(*parse_expr())
+            if tokens.move() != matching:
+                raise tokens.error("unmatched '%s'" % token)
+            return [result]
+        if token == 'options':
+            tokens.move()
+            return [docopt.AnyOptions()]
+        if token.startswith('--') and token != '--':
+            return parse_long()
+        if token.startswith('-') and token not in ('-', '--'):
+            return parse_shorts()
+        if token.startswith('<') and token.endswith('>') or token.isupper():
+            return [docopt.Argument(tokens.move())]
+        return [docopt.Command(tokens.move())]
+
+    result = parse_expr()
+    if tokens.current() is not None:
+        raise tokens.error('unexpected ending: %r' % ' '.join(tokens))
+    return docopt.Required(*result)
+
+
+def pattern_cases(node):
+    """Expand a pattern into all combinations of Either branches, like docopt's Pattern.either without its re-scans.
+
+    :param node: docopt pattern tree node.
+
+    :return: List of cases, each a list of leaves. OneOrMore children appear twice.
+    :rtype: list
+    """
+    if not hasattr(node, 'children'):
+        return [[node]]
+    if node.__class__ is docopt.Either:
+        return [case for child in node.children for case in pattern_cases(child)]
+    if node.__class__ is docopt.OneOrMore:
+        child_cases = pattern_cases(node.children[0])
+        return [a + b for a in child_cases for b in child_cases]
+    cases = [[]]
+    for child in node.children:
+        child_cases = pattern_cases(child)
+        if len(child_cases) == 1:
+            for case in cases:
+                case.extend(child_cases[0])  # Most nodes. Extend in place instead of copying.
+        else:
+            cases = [a + b for a in cases for b in child_cases]
+    return cases
+
+
+def fix_pattern(pattern):
+    """Same as docopt's pattern.fix() but with dicts instead of list.index() and list.count() (quadratic).
+
+    Equal leaves are replaced by one shared object, then leaves appearing more than once in a case become repeatable
+    (counters for flags and commands, lists for the rest). Expanding cases is skipped when nothing can repeat: no
+    "..." and no leaf used more than once.
+
+    :param pattern: docopt pattern tree root. Modified in place.
+
+    :return: The same pattern.
+    """
+    uniq, leaf_count, one_or_more = dict(), 0, False
+    stack = [pattern]
+    while stack:
+        node = stack.pop()
+        one_or_more = one_or_more or node.__class__ is docopt.OneOrMore
+        for i, child in enumerate(node.children):
+            if hasattr(child, 'children'):
+                stack.append(child)
+            else:
+                node.children[i] = uniq.setdefault(repr(child), child)
+                leaf_count += 1
+    if not one_or_more and len(uniq) == leaf_count:
+        return pattern  # Common case, nothing repeats.
+
+    for case in pattern_cases(pattern):
+        reprs = [repr(leaf) for leaf in case]
+        counts = dict()
+        for key in reprs:
+            counts[key] = counts.get(key, 0) + 1
+        for leaf in [l for l, k in zip(case, reprs) if counts[k] > 1]:
+            if leaf.__class__ is docopt.Argument or leaf.__class__ is docopt.Option and leaf.argcount:
+                if leaf.value is None:
+                    leaf.value = []
+                elif not hasattr(leaf.value, 'append'):
+                    leaf.value = leaf.value.split()
+            if leaf.__class__ is docopt.Command or leaf.__class__ is docopt.Option and leaf.argcount == 0:
+                leaf.value = 0
+    return pattern
+
+
+def unique_commands(leaves):
+    """Command names in the order they first appear.
+
+    :param iter leaves: Pattern tree leaves.
+
+    :return: Command names.
+    :rtype: tuple
+    """
+    seen = set()
+    commands = list()
+    for leaf in leaves:
+        if leaf.__class__ is docopt.Command and leaf.name not in seen:
+            seen.add(leaf.name)
+            commands.append(leaf.name)
+    return tuple(commands)
+
+
+def command_orders(node):
+    """Command names of each usage case in the order argv gives them, e.g. [('remote',), ('sync', 'remote')].
+
+    Either branches are expanded like pattern_cases() but other leaves are dropped, so options don't multiply cases.
+
+    :param node: docopt pattern tree node.
+
+    :return: Unique tuples of unique command names, in usage order.
+    :rtype: list
+    """
+    if not hasattr(node, 'children'):
+        return [(node.name,)] if node.__class__ is docopt.Command else [()]
+    if node.__class__ is docopt.Either:
+        orders = [order for child in node.children for order in command_orders(child)]
+    else:
+        orders = [()]
+        for child in node.children:
+            orders = [a + tuple(c for c in b if c not in a) for a in orders for b in command_orders(child)]
+    seen = set()
+    return [o for o in orders if not (o in seen or seen.add(o))]
+
+
+class Spec(object):
+    """Docstring parsed by docopt and analyzed by docoptcfg once, reusable for many command lines.
+
+    Everything that only depends on the docstring and docoptcfg() arguments (not argv) is computed here so that
+    parse() only does per-argv work.
+
+    :ivar str doc: Docstring passed to docopt.
+    :ivar str usage: Printable usage section of the docstring.
+    :ivar str section: Program name, the config file section to read.
+    :ivar str env_prefix: Variable name prefix, or None if environment variables are disabled.
+    :ivar str config_option: Config option long name, or None if config files are disabled.
+    :ivar tuple ignore: Options never set by environment variables or config files.
+    :ivar str config_reader: How to read config files, None to parse the whole file. See CONFIG_READERS.
+    :ivar list options: Options parsed from the options section of the docstring.
+    :ivar docopt.Required pattern: Fixed usage pattern tree ready for matching.
+    :ivar list leaves: The pattern tree's leaves, same as pattern.flat().
+    :ivar tuple commands: Command names in usage order.
+    :ivar list command_orders: Command names of each usage case in argv order. See command_orders().
+    :ivar set candidates: Option long names settable by docoptcfg unless overridden by argv.
+    :ivar set booleans: Option long names of boolean/flag types.
+    :ivar set repeatable: Option long names of repeatable options.
+    :ivar dict short_map: Short to long option name mapping.
+    :ivar dict env_names: Option long name to environment variable name mapping.
+    """
+
+    def __init__(self, doc, env_prefix=None, config_option=None, ignore=None, config_reader=None):
+        """Constructor.
+
+        :raise DocoptcfgError: If `config_reader` is invalid.
+
+        :param str doc: Docstring passed to docopt.
+        :param str env_prefix: Enable environment variable support, prefix of said variables.
+        :param str config_option: Enable config file support, docopt option defining path to config file.
+        :param iter ignore: Options to ignore. Default is --help and --version.
+        :param str config_reader: Only read the program's section of config files: 'stream' or 'mmap'.
+        """
+        if config_reader is not None and config_reader not in CONFIG_READERS:
+            raise DocoptcfgError('Invalid config_reader: {0}'.format(config_reader))
+        self.doc = doc
+        self.usage = docopt.printable_usage(doc)
+        self.section = self.usage.split()[1]
+        self.env_prefix = env_prefix
+        self.ignore = ('--help', '--version') if ignore is None else tuple(ignore)
+        self.config_reader = config_reader
+        self.options = docopt.parse_defaults(doc)
+        self.short_map = dict((o.short, o.long) for o in self.options)
+        self.config_option = None if config_option is None else self.short_map.get(config_option, config_option)
+
+        # Parse usage pattern the same way docopt.docopt() does, including the [options] shortcut.
+        self.argv_options = list(self.options)  # parse_usage() appends options only found in usage section.
+        self.pattern = parse_usage(docopt.formal_usage(self.usage), self.argv_options)
+        pattern_options = set(pattern_leaves(self.pattern, docopt.Option))
+        any_options_list = pattern_leaves(self.pattern, docopt.AnyOptions)
+        if any_options_list:
+            doc_options = set(docopt.Option(o.short, o.long, o.argcount, o.value) for o in self.options)  # Copies.
+            for any_options in any_options_list:
+                any_options.children = list(doc_options - pattern_options)
+        fix_pattern(self.pattern)
+        self.leaves = pattern_leaves(self.pattern)
+        self.commands = unique_commands(self.leaves)
+        self.command_orders = command_orders(self.pattern)
+
+        # Determine which options are settable by docoptcfg and which ones are flags/booleans.
+        self.candidates, self.booleans, self.repeatable = set(), set(), set()
+        for option in self.options:
+            if option.long is None or option.long in self.ignore or option.short in self.ignore:
+                continue  # Short only options have no environment variable or config file name.
+            if option.argcount == 0:
+                self.booleans.add(option.long)
+            self.candidates.add(option.long)
+
+        # Determine which options are repeatable. fix_pattern() already gave them counter or list values.
+        for option in self.leaves:
+            if option.__class__ is not docopt.Option or option.long not in self.candidates:
                 continue  # Don't care about this if we can't set it.
-            if getattr(option, 'long') in booleans and getattr(option, 'value') == 0:
-                repeatable.add(getattr(option, 'long'))
-            elif hasattr(getattr(option, 'value'), '__iter__'):
-                repeatable.add(getattr(option, 'long'))
+            if option.long in self.booleans and option.value is not False:  # Counter, not a plain flag.
+                self.repeatable.add(option.long)
+            elif hasattr(option.value, 'append'):
+                self.repeatable.add(option.long)
+
+        # Environment variable names.
+        self.env_names = dict()
+        if env_prefix is not None:
+            for key in self.candidates:
+                self.env_names[key] = '{0}{1}'.format(env_prefix, key[2:].replace('-', '_').upper())
+
+    def dump(self):
+        """Serialize to JSON compatible data. The pattern tree's shared leaves are stored once and referenced by index.
+
+        :return: Everything needed by load().
+        :rtype: dict
+        """
+        leaves, leaf_index = list(), dict()
+
+        def dump_option(option):
+            """Serialize docopt.Option."""
+            return ['Option', option.short, option.long, option.argcount, option.value]
+
+        def dump_pattern(pattern):
+            """Serialize pattern tree node."""
+            if hasattr(pattern, 'children'):
+                return [pattern.__class__.__name__] + [dump_pattern(c) for c in pattern.children]
+            if id(pattern) not in leaf_index:
+                leaf_index[id(pattern)] = len(leaves)
+                if pattern.__class__ is docopt.Option:
+                    leaves.append(dump_option(pattern))
+                else:
+                    leaves.append([pattern.__class__.__name__, pattern.name, pattern.value])
+            return leaf_index[id(pattern)]
+
+        return dict(
+            argv_options=[dump_option(o) for o in self.argv_options],
+            booleans=sorted(self.booleans),
+            candidates=sorted(self.candidates),
+            config_option=self.config_option,
+            config_reader=self.config_reader,
+            doc=self.doc,
+            env_names=self.env_names,
+            env_prefix=self.env_prefix,
+            ignore=list(self.ignore),
+            leaves=leaves,
+            options=[dump_option(o) for o in self.options],
+            pattern=dump_pattern(self.pattern),
+            repeatable=sorted(self.repeatable),
+            section=self.section,
+            short_map=sorted(self.short_map.items(), key=lambda i: str(i)),
+            usage=self.usage,
+        )
+
+    @classmethod
+    def load(cls, data):
+        """Rebuild a Spec from dump() output without parsing the docstring.
+
+        :raise KeyError, IndexError, TypeError, ValueError, AssertionError: If data is invalid.
+
+        :param dict data: Output of dump().
+
+        :return: Compiled docstring.
+        :rtype: Spec
+        """
+        def load_leaf(leaf):
+            """Deserialize pattern tree leaf."""
+            if leaf[0] == 'Option':
+                return docopt.Option(*leaf[1:])
+            return {'Argument': docopt.Argument, 'Command': docopt.Command}[leaf[0]](*leaf[1:])
+
+        leaves = [load_leaf(l) for l in data['leaves']]
+
+        def load_pattern(node):
+            """Deserialize pattern tree node."""
+            if not hasattr(node, 'append'):  # Leaf index, not a list.
+                return leaves[node]
+            parents = (docopt.AnyOptions, docopt.Either, docopt.OneOrMore, docopt.Optional, docopt.Required)
+            return dict((c.__name__, c) for c in parents)[node[0]](*[load_pattern(c) for c in node[1:]])
+
+        self = cls.__new__(cls)
+        self.argv_options = [load_leaf(o) for o in data['argv_options']]
+        self.booleans = set(data['booleans'])
+        self.candidates = set(data['candidates'])
+        self.config_option = data['config_option']
+        self.config_reader = data['config_reader']
+        self.doc = data['doc']
+        self.env_names = dict(data['env_names'])
+        self.env_prefix = data['env_prefix']
+        self.ignore = tuple(data['ignore'])
+        self.options = [load_leaf(o) for o in data['options']]
+        self.pattern = load_pattern(data['pattern'])
+        self.leaves = pattern_leaves(self.pattern)
+        self.commands = unique_commands(self.leaves)
+        self.command_orders = command_orders(self.pattern)
+        self.repeatable = set(data['repeatable'])
+        self.section = data['section']
+        self.short_map = dict((s, l) for s, l in data['short_map'])
+        self.usage = data['usage']
+        return self
+
+    def parse_argv(self, argv, help=True, version=None, options_first=False,  # pylint: disable=redefined-builtin
+                   response_files=False):
+        """Match argv against the compiled pattern like docopt.docopt() does, without re-parsing the docstring.
+
+        argv is tokenized and parsed only once. The same parsed tokens are used to determine which options were set on
+        the command line.
+
+        :raise DocoptcfgExit: If argv doesn't match the usage pattern or a response file can't be read.
+
+        :param iter argv: CLI arguments.
+        :param bool help: docopt argument, handle -h/--help.
+        :param version: docopt argument, printed on --version if not None.
+        :param bool options_first: docopt argument.
+        :param bool response_files: Replace @path arguments with the lines of that file.
+
+        :return: Dictionary constructed by docopt and option long names overridden by argv.
+        :rtype: tuple
+        """
+        try:
+            if response_files:
+                argv = expand_response_files(argv.split() if hasattr(argv, 'split') else argv)
+            tokens = TokenQueue(argv, docopt.DocoptExit)  # docopt checks identity of DocoptExit.
+            parsed = docopt.parse_argv(tokens, list(self.argv_options), options_first)
+        except docopt.DocoptExit as exc:
+            # Message is followed by whatever usage is in the docopt.DocoptExit class attribute, shared by all threads.
+            raise DocoptcfgExit(str(exc.code).split('\n', 1)[0], self.usage)
+        overridden = set(o.long for o in parsed if hasattr(o, 'long'))
+        docopt.extras(help, version, parsed, self.doc)
+        matched, left, collected = self.pattern.match(parsed)
+        if not matched or left:
+            raise DocoptcfgExit(usage=self.usage)
+        # Copy lists so callers can't modify the defaults stored in the shared pattern tree.
+        docopt_dict = docopt.Dict((a.name, list(a.value) if hasattr(a.value, 'append') else a.value)
+                                  for a in self.leaves + collected)
+        return docopt_dict, overridden
+
+    def parse(self, argv=None, help=True, version=None, options_first=False, environ=None,  # pylint: disable=W0622
+              stats=None, lazy=False, sources=None, response_files=False, compact=False):
+        """Parse argv and apply environment variable and config file defaults.
+
+        :raise DocoptcfgError: If `config_option` isn't found in docstring.
+        :raise DocoptcfgFileError: On any error while trying to read and parse config file (if enabled).
+
+        :param iter argv: CLI arguments. sys.argv[1:] if None.
+        :param bool help: docopt argument, handle -h/--help.
+        :param version: docopt argument, printed on --version if not None.
+        :param bool options_first: docopt argument.
+        :param dict environ: Mapping to read environment variables from instead of os.environ.
+        :param Stats stats: Collect timings and counters in this instance.
+        :param bool lazy: Return a LazyResult, only looking up environment variables and config file values when read.
+        :param iter sources: Value sources in priority order. Environment variables then config file if None.
+        :param bool response_files: Replace @path arguments with the lines of that file.
+        :param compact: Return repeatable values of the default sources as a CompactList. 'intern' to also store
+            duplicate values once.
+
+        :return: Dictionary constructed by docopt and updated by docoptcfg.
+        :rtype: dict
+        """
+        if argv is None:
+            argv = sys.argv[1:]
+        stats = stats or NULL_STATS
+        with stats.phase('argv'):
+            docopt_dict, overridden = self.parse_argv(argv, help, version, options_first, response_files)
+        stats.incr('from_argv', len(overridden))
+        if lazy:
+            return LazyResult(self, docopt_dict, overridden, environ, sources=sources, compact=compact)
+        return self.resolve(docopt_dict, overridden, environ, stats=stats, sources=sources, compact=compact)
+
+    def resolve(self, docopt_dict, overridden, environ=None, env_index=None, get_config=None, stats=None,
+                sources=None, compact=False):
+        """Apply environment variable and config file defaults to a docopt dictionary from parse_argv().
+
+        :raise DocoptcfgError: If `config_option` isn't found in docstring.
+        :raise DocoptcfgFileError: On any error while trying to read and parse config file (if enabled).
+
+        :param dict docopt_dict: Dictionary constructed by docopt. Updated in place.
+        :param set overridden: Option long names overridden by argv.
+        :param dict environ: Mapping to read environment variables from instead of os.environ.
+        :param EnvIndex env_index: Already indexed environment variables. Built from `environ` if None.
+        :param get_config: Function with the same signature as ConfigCache.get(). CONFIG_CACHE.get if None.
+        :param Stats stats: Collect timings and counters in this instance.
+        :param iter sources: Value sources (e.g. EnvSource, IniSource, DictSource) in priority order. If None then
+            environment variables then the config file, depending on env_prefix and config_option.
+        :param compact: Return repeatable values of the default sources as a CompactList. 'intern' to also store
+            duplicate values once.
 
-    return settable, booleans, repeatable, short_map
+        :return: Dictionary constructed by docopt and updated by docoptcfg.
+        :rtype: dict
+        """
+        if sources is None:
+            sources = self.default_sources(environ, env_index, get_config, compact)
+        settable = self.candidates - overridden
+        stats = stats or NULL_STATS
 
+        # Ask each source, in priority order, only for options still unresolved. Stop once everything is resolved.
+        for source in sources:
+            if not settable:
+                break
+            with stats.phase(source.PHASE):
+                defaults = source.values(self, settable, docopt_dict, stats)
+            stats.incr(source.COUNTER, len(defaults))
+            settable -= set(defaults)  # No longer settable by later sources.
+            docopt_dict.update(defaults)
+
+        return docopt_dict
+
+    def subcommands(self, docopt_dict):
+        """Commands matched by argv, in argv order.
+
+        Selects config file sections: ('sync', 'remote') reads [prog sync remote], then [prog sync], then [prog].
+
+        The order is taken from the first usage case with exactly the matched commands. docopt matches commands in
+        pattern order, so that's the order they were given on the command line (unless two cases have the same
+        commands in a different order, e.g. "prog a b" and "prog b a").
+
+        :param dict docopt_dict: Dictionary constructed by docopt.
+
+        :return: Command names.
+        :rtype: tuple
+        """
+        matched = set(c for c in self.commands if docopt_dict.get(c))
+        for order in self.command_orders:
+            commands = tuple(c for c in order if c in matched)
+            if len(commands) == len(matched):
+                return commands
+        return tuple(c for c in self.commands if c in matched)
+
+    def default_sources(self, environ=None, env_index=None, get_config=None, compact=False, config=None):
+        """Value sources used when none are given: environment variables then the config file (if enabled).
+
+        :param dict environ: Mapping to read environment variables from instead of os.environ.
+        :param EnvIndex env_index: Already indexed environment variables. Built from `environ` if None.
+        :param get_config: Function with the same signature as ConfigCache.get(). CONFIG_CACHE.get if None.
+        :param compact: Return repeatable values as a CompactList. 'intern' to also store duplicate values once.
+        :param config: In memory config file (see IniSource) used instead of the file given by config_option.
+
+        :return: Sources in priority order.
+        :rtype: list
+        """
+        sources = list()
+        if self.env_prefix is not None:
+            sources.append(EnvSource(environ=environ, env_index=env_index, compact=compact))
+        if config is not None:
+            sources.append(IniSource(compact=compact, config=config))
+        elif self.config_option is not None:
+            sources.append(IniSource(get_config=get_config, compact=compact))
+        return sources
+
+
+class TokenQueue(deque):
+    """docopt.TokenStream backed by a deque.
+
+    docopt consumes tokens from the front, which is O(1) here instead of list.pop(0) moving every remaining token.
+
+    :ivar error: Exception class raised by docopt on errors.
+    """
+
+    def __init__(self, source, error):
+        """Constructor.
+
+        :param iter source: Tokens. Consumed once, may be a generator. Strings are split on whitespace like docopt does.
+        :param error: Exception class raised by docopt on errors.
+        """
+        super(TokenQueue, self).__init__(source.split() if hasattr(source, 'split') else source)
+        self.error = error
+
+    def move(self):
+        """Remove and return the first token. None if empty."""
+        return self.popleft() if self else None
+
+    def current(self):
+        """First token. None if empty."""
+        return self[0] if self else None
+
+
+def read_response_file(path):
+    """Memory map a response file and yield one argument per line, without reading the whole file into a list.
+
+    Blank lines are skipped.
+
+    :raise IOError: If file can't be read.
+
+    :param str path: Path to response file.
+
+    :return: Yields arguments.
+    :rtype: iter
+    """
+    with open(path, 'rb') as handle:
+        size = os.fstat(handle.fileno()).st_size
+        if not size:
+            return  # Empty files can't be memory mapped.
+        data = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            start = 0
+            while start < size:
+                end = data.find(b'\n', start)
+                end = size if end < 0 else end
+                line = data[start:end].rstrip(b'\r')
+                start = end + 1
+                if line:
+                    yield line if bytes is str else line.decode(ENCODING)
+        finally:
+            data.close()
+
+
+def expand_response_files(argv, parents=()):
+    """Replace @path arguments with the lines of that file (one argument per line). Response files may include others.
+
+    :raise docopt.DocoptExit: If a response file can't be read or includes itself.
+
+    :param iter argv: CLI arguments.
+    :param tuple parents: Absolute paths of the response files being expanded, to detect recursion.
+
+    :return: Yields arguments.
+    :rtype: iter
+    """
+    for arg in argv:
+        if not arg.startswith('@') or arg == '@':
+            yield arg
+            continue
+        path = os.path.abspath(arg[1:])
+        if path in parents:
+            raise docopt.DocoptExit('Response file {0} includes itself.'.format(arg[1:]))
+        try:
+            for nested in expand_response_files(read_response_file(path), parents + (path,)):
+                yield nested
+        except (IOError, OSError) as exc:
+            raise docopt.DocoptExit('Unable to read response file {0}: {1}'.format(arg[1:], exc))
+
+
+def compile(doc, env_prefix=None, config_option=None, ignore=None, config_reader=None):  # pylint: disable=W0622
+    """Parse and analyze a docstring once. Call parse() on the returned object for every argv.
+
+    :param str doc: Docstring passed to docopt.
+    :param str env_prefix: Enable environment variable support, prefix of said variables.
+    :param str config_option: Enable config file support, docopt option defining path to config file.
+    :param iter ignore: Options to ignore. Default is --help and --version.
+    :param str config_reader: Only read the program's section of config files: 'stream' or 'mmap'.
+
+    :return: Compiled docstring.
+    :rtype: Spec
+    """
+    return Spec(doc, env_prefix, config_option, ignore, config_reader)
+
+
+def get_spec(doc, env_prefix=None, config_option=None, ignore=None, config_reader=None, disk_cache=None):
+    """Memoized compile(). Used by docoptcfg() so the same docstring is only parsed once per process.
+
+    Keeps the SPEC_CACHE_SIZE most recently used compiled docstrings.
+
+    :param str doc: Docstring passed to docopt.
+    :param str env_prefix: Enable environment variable support, prefix of said variables.
+    :param str config_option: Enable config file support, docopt option defining path to config file.
+    :param iter ignore: Options to ignore. Default is --help and --version.
+    :param str config_reader: Only read the program's section of config files: 'stream' or 'mmap'.
+    :param disk_cache: Also cache compiled docstrings across processes in this directory. True for
+        $XDG_CACHE_HOME/docoptcfg (~/.cache/docoptcfg).
+
+    :return: Compiled docstring.
+    :rtype: Spec
+    """
+    key = (doc, env_prefix, config_option, None if ignore is None else tuple(ignore), config_reader)
+    with SPEC_LOCK:
+        entry = SPEC_CACHE.get(key)
+        if entry is not None:
+            SPEC_CACHE[key] = (entry[0], next(SPEC_TICKS))
+            return entry[0]
+
+    if not disk_cache:
+        spec = compile(doc, env_prefix, config_option, ignore, config_reader)
+    else:
+        if disk_cache is True:
+            cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+            disk_cache = os.path.join(cache_home, 'docoptcfg')
+        path = disk_cache_path(disk_cache, key)
+        spec = load_spec(path, key)
+        if spec is None:
+            spec = compile(doc, env_prefix, config_option, ignore, config_reader)
+            save_spec(path, key, spec)
+
+    with SPEC_LOCK:
+        SPEC_CACHE[key] = (spec, next(SPEC_TICKS))
+        while len(SPEC_CACHE) > SPEC_CACHE_SIZE:
+            del SPEC_CACHE[min(SPEC_CACHE, key=lambda k: SPEC_CACHE[k][1])]  # Least recently used.
+    return spec
+
+
+def disk_cache_path(directory, key):
+    """Path to the cached compiled docstring of a get_spec() key.
+
+    Keyed by a hash of the docstring, the other compile() arguments, and the docoptcfg and docopt versions.
+
+    :param str directory: Cache directory.
+    :param tuple key: get_spec() arguments.
+
+    :return: File path.
+    :rtype: str
+    """
+    data = json.dumps([DISK_CACHE_FORMAT, __version__, docopt.__version__] + list(key), sort_keys=True)
+    return os.path.join(directory, hashlib.sha256(data.encode('utf-8')).hexdigest() + '.json')
+
+
+def load_spec(path, key):
+    """Load a compiled docstring saved by save_spec(). Missing, corrupt, or stale files are ignored.
 
-def get_env(key, env_prefix, boolean, repeatable):
+    :param str path: File path from disk_cache_path().
+    :param tuple key: get_spec() arguments the file must match.
+
+    :return: Compiled docstring or None.
+    :rtype: Spec
+    """
+    try:
+        with open(path) as handle:
+            data = json.load(handle)
+        if [data['format'], data['version'], data['docopt']] != [DISK_CACHE_FORMAT, __version__, docopt.__version__]:
+            return None
+        spec = Spec.load(data['spec'])
+    except (IOError, OSError, AssertionError, AttributeError, IndexError, KeyError, TypeError, ValueError):
+        return None
+    if data['key'] != json.loads(json.dumps(key)):
+        return None  # Hash collision or tampered file.
+    return spec
+
+
+def save_spec(path, key, spec):
+    """Save a compiled docstring for load_spec(). Written atomically, errors are ignored.
+
+    :param str path: File path from disk_cache_path().
+    :param tuple key: get_spec() arguments.
+    :param Spec spec: Compiled docstring.
+    """
+    data = dict(format=DISK_CACHE_FORMAT, version=__version__, docopt=docopt.__version__, key=key, spec=spec.dump())
+    directory = os.path.dirname(path)
+    try:
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        handle, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(handle, 'w') as handle:
+            json.dump(data, handle)
+        getattr(os, 'replace', os.rename)(tmp_path, path)
+    except (IOError, OSError):
+        pass
+
+
+class EnvIndex(object):
+    """Environment variables starting with a prefix, indexed in one pass over the environment.
+
+    :ivar dict values: Variable name to value mapping.
+    :ivar dict numbered: Option variable name to values of variables named after it plus an integer, sorted by that
+        integer. Each variable is numbered under one option variable name only.
+    """
+
+    def __init__(self, env_prefix, environ=None, names=()):
+        """Constructor.
+
+        :param str env_prefix: Only index variables starting with this prefix.
+        :param dict environ: Mapping to read variables from instead of os.environ.
+        :param iter names: Variable names of options (e.g. PREFIX_KEY and PREFIX_KEY1). A numbered variable belongs to
+            the longest of these followed only by digits. Without names it belongs to its name without trailing digits.
+        """
+        self.values = dict()
+        numbered = dict()
+        names = set(names)
+        for name, value in (os.environ if environ is None else environ).items():
+            if not name.startswith(env_prefix):
+                continue
+            self.values[name] = value
+            base = name.rstrip(string.digits)
+            if base == name or name in names:
+                continue  # Not numbered or belongs to its own option (PREFIX_KEY1 of --key1, not #1 of --key).
+            if names:  # PREFIX_KEY12 is #2 of --key1 if there is such an option, otherwise #12 of --key.
+                base = next((name[:i] for i in range(len(name) - 1, len(base) - 1, -1) if name[:i] in names), None)
+                if base is None:
+                    continue
+            suffix = name[len(base):]
+            if suffix == '0' or not suffix.startswith('0'):  # Ignore zero padded duplicates.
+                numbered.setdefault(base, list()).append((int(suffix), value))
+        self.numbered = dict((b, [v for _, v in sorted(p)]) for b, p in numbered.items())
+
+
+class CompactList(Sequence):
+    """Read-only list of strings stored as one buffer plus arrays of offsets.
+
+    Used for repeatable options with very many values. Items are only created when read. Equal to lists with the same
+    items.
+
+    With `intern` the buffer only holds unique values (as strings) and an array of indexes, so duplicates share memory
+    and every read of a value returns the same object.
+    """
+
+    LINE_BREAK_RE = re.compile(u'\r\n|[\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]')  # Same as str.splitlines().
+
+    def __init__(self, buffer='', starts=None, ends=None, values=None, indexes=None):
+        """Constructor. Use from_text() or from_values() instead.
+
+        :param str buffer: All values.
+        :param array.array starts: Offset of each value in `buffer`.
+        :param array.array ends: End offset of each value in `buffer`.
+        :param list values: Unique values when interned.
+        :param array.array indexes: Index in `values` of each value when interned.
+        """
+        self._buffer = buffer
+        self._starts = array.array('I') if starts is None else starts
+        self._ends = array.array('I') if ends is None else ends
+        self._values = values
+        self._indexes = indexes
+
+    @staticmethod
+    def offsets(size):
+        """Empty array of offsets, 4 bytes each unless the buffer is larger than 4 GiB.
+
+        :param int size: Buffer length.
+
+        :return: New array.
+        :rtype: array.array
+        """
+        return array.array('I' if size <= 0xFFFFFFFF else 'L')
+
+    @classmethod
+    def from_text(cls, text, intern=False):
+        r"""Split text on line boundaries like text.strip('\n').splitlines() without copying it.
+
+        :param str text: Multi-line value (e.g. from a config file).
+        :param bool intern: Store unique values only.
+
+        :return: New instance.
+        :rtype: CompactList
+        """
+        start, end = 0, len(text)
+        while start < end and text[start] == '\n':
+            start += 1
+        while end > start and text[end - 1] == '\n':
+            end -= 1
+        starts, ends = cls.offsets(len(text)), cls.offsets(len(text))
+        position = start
+        for match in cls.LINE_BREAK_RE.finditer(text, start, end):
+            starts.append(position)
+            ends.append(match.start())
+            position = match.end()
+        if position < end:
+            starts.append(position)
+            ends.append(end)
+        if intern:
+            return cls.interned(text[s:e] for s, e in zip(starts, ends))
+        return cls(text, starts, ends)
+
+    @classmethod
+    def from_values(cls, values, intern=False):
+        """Store existing strings in one buffer.
+
+        :param iter values: Strings.
+        :param bool intern: Store unique values only.
+
+        :return: New instance.
+        :rtype: CompactList
+        """
+        if intern:
+            return cls.interned(values)
+        values = list(values)
+        size = sum(len(v) for v in values)
+        starts, ends, position = cls.offsets(size), cls.offsets(size), 0
+        for value in values:
+            starts.append(position)
+            position += len(value)
+            ends.append(position)
+        return cls(''.join(values), starts, ends)
+
+    @classmethod
+    def interned(cls, values):
+        """Store unique values and an array of indexes.
+
+        :param iter values: Strings.
+
+        :return: New instance.
+        :rtype: CompactList
+        """
+        unique, indexes = dict(), array.array('I')
+        for value in values:
+            indexes.append(unique.setdefault(value, len(unique)))
+        return cls(values=sorted(unique, key=unique.get), indexes=indexes)
+
+    def __getitem__(self, index):
+        """Get one value or a list of values.
+
+        :param index: Integer or slice.
+        """
+        if hasattr(index, 'indices'):  # Slice.
+            return [self[i] for i in range(*index.indices(len(self)))]
+        length = len(self)
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError('CompactList index out of range')
+        if self._indexes is not None:
+            return self._values[self._indexes[index]]
+        return self._buffer[self._starts[index]:self._ends[index]]
+
+    def __len__(self):
+        """Number of values."""
+        return len(self._starts) if self._indexes is None else len(self._indexes)
+
+    def __eq__(self, other):
+        """Compare items with lists and other instances.
+
+        :param other: Other object.
+        """
+        if not hasattr(other, 'append') and not hasattr(other, '_starts'):  # Lists and instances only, not tuples.
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __ne__(self, other):
+        """Inverse of __eq__().
+
+        :param other: Other object.
+        """
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None
+
+    def __repr__(self):
+        """Same as a list."""
+        return repr(list(self))
+
+
+def get_env(env_name, env_index, boolean, repeatable, compact=False):
     """Get one value from environment variable(s).
 
     :raise KeyError: If option not in environment variables.
 
-    :param str key: Option long name (e.g. --config).
-    :param str env_prefix: Variable name prefix from docoptcfg().
+    :param str env_name: Environment variable name of the option (e.g. MYAPP_CONFIG).
+    :param EnvIndex env_index: Indexed environment variables.
     :param bool boolean: Is this a boolean/flag option?
     :param bool repeatable: Is this option repeatable?
+    :param compact: Return repeatable values as a CompactList. 'intern' to also store duplicate values once.
 
     :return: Value to set in the defaults dict. May be int, iter, string, or bool.
     """
-    env_name = '{0}{1}'.format(env_prefix, key[2:].replace('-', '_').upper())
-
     # Handle repeatable non-boolean options (e.g. --file=file1.txt --file=file2.txt).
     if repeatable and not boolean:
         values = list()
-        if env_name in os.environ:  # Optional variable not ending with integer.
-            values.append(os.environ[env_name])
-        for i in range(99):
-            env_name_i = '{0}{1}'.format(env_name, i)  # Loop until variable with integer not found.
-            if env_name_i not in os.environ:
-                break
-            values.append(os.environ[env_name_i])
+        if env_name in env_index.values:  # Optional variable not ending with integer.
+            values.append(env_index.values[env_name])
+        values.extend(env_index.numbered.get(env_name, ()))  # Variables ending with integers, in numeric order.
         if not values:
             raise KeyError(env_name)  # Nothing found.
-        return values
+        return CompactList.from_values(values, compact == 'intern') if compact else values
 
-    if env_name not in os.environ:
+    if env_name not in env_index.values:
         raise KeyError(env_name)
+    return env_value(env_index.values[env_name], boolean, repeatable)
+
+
+def env_value(value, boolean, repeatable):
+    """Convert the value of a non-list environment variable.
+
+    :param str value: Environment variable value.
+    :param bool boolean: Is this a boolean/flag option?
+    :param bool repeatable: Is this option repeatable?
 
+    :return: Value to set in the defaults dict. May be int, string, or bool.
+    """
     # Handle repeatable booleans.
     if repeatable and boolean:
         try:
-            return int(os.environ[env_name])
+            return int(value)
         except (TypeError, ValueError):
             return 0
 
     # Handle the rest.
     if boolean:
-        return os.environ[env_name].strip().lower() in ('true', 'yes', 'on', '1')
-    return os.environ[env_name]
+        return value.strip().lower() in ('true', 'yes', 'on', '1')
+    return value
 
 
-def values_from_env(env_prefix, settable, booleans, repeatable):
+def values_from_env(env_index, env_names, settable, booleans, repeatable, compact=False):
     """Get all values from environment variables.
 
-    :param str env_prefix: Argument from docoptcfg().
-    :param iter settable: Option long names available to set by config file.
+    :param EnvIndex env_index: Indexed environment variables.
+    :param dict env_names: Option long name to environment variable name mapping.
+    :param iter settable: Option long names available to set by environment variables.
     :param iter booleans: Option long names of boolean/flag types.
     :param iter repeatable: Option long names of repeatable options.
+    :param compact: Return repeatable values as a CompactList. 'intern' to also store duplicate values once.
 
     :return: Settable values.
     :rtype: dict
@@ -137,48 +1213,604 @@ def values_from_env(env_prefix, settable, booleans, repeatable):
     defaults_env = dict()
     for key in settable:
         try:
-            defaults_env[key] = get_env(key, env_prefix, key in booleans, key in repeatable)
+            defaults_env[key] = get_env(env_names[key], env_index, key in booleans, key in repeatable, compact)
         except KeyError:
             pass
     return defaults_env
 
 
-def get_opt(key, config, section, booleans, repeatable):
-    """Get one value from config file.
+def load_config(lines, source):
+    """Parse config file lines.
 
-    :raise DocoptcfgFileError: If an option is the wrong type.
+    :raise ConfigParser.Error: If lines can't be parsed.
 
-    :param str key: Option long name (e.g. --config).
-    :param ConfigParser config: ConfigParser instance with config file data already loaded.
-    :param str section: Section in config file to focus on.
-    :param iter booleans: Option long names of boolean/flag types.
-    :param iter repeatable: Option long names of repeatable options.
+    :param iter lines: Config file lines (with line endings).
+    :param str source: Path to config file, used in error messages.
 
-    :return: Value to set in the defaults dict.
+    :return: ConfigParser instance with config file data loaded.
+    :rtype: ConfigParser
+    """
+    config = ConfigParser()
+    if hasattr(config, 'read_file'):
+        config.read_file(lines, source)
+    else:
+        getattr(config, 'readfp')(StringIO(''.join(lines)), source)
+    return config
+
+
+def read_config(path, stats=None):
+    """Read and parse a config file.
+
+    :raise ConfigParser.Error: If file can't be parsed.
+    :raise IOError: If file can't be read.
+
+    :param str path: Path to config file.
+    :param Stats stats: Count files opened and bytes read in this instance.
+
+    :return: ConfigParser instance with config file data loaded.
+    :rtype: ConfigParser
+    """
+    stats = stats or NULL_STATS
+    with open(path) as handle:
+        stats.incr('files_opened')
+        stats.incr('bytes_read', os.fstat(handle.fileno()).st_size)
+        return load_config(handle, path)
+
+
+def read_config_data(data, source=None, stats=None):
+    """Parse config file contents already in memory.
+
+    :raise ConfigParser.Error: If contents can't be parsed.
+    :raise IOError: If a file object can't be read.
+
+    :param data: Contents as bytes or str, a file object (text or binary) to read them from, or a ConfigParser
+        instance which is returned as-is.
+    :param str source: Name used in error messages. The file object's name or '<config>' if None.
+    :param Stats stats: Count bytes read in this instance.
+
+    :return: ConfigParser instance with config file data loaded.
+    :rtype: ConfigParser
+    """
+    if hasattr(data, 'has_section'):
+        return data
+    if source is None:
+        source = getattr(data, 'name', '<config>')
+    if hasattr(data, 'read'):
+        data = data.read()
+    if bytes is not str and hasattr(data, 'decode'):
+        data = data.decode(ENCODING)
+    (stats or NULL_STATS).incr('bytes_read', len(data))
+    # Lines end like they do when reading a file in text mode, not on every str.splitlines() boundary (e.g. \x0c).
+    return load_config(StringIO(data.replace('\r\n', '\n').replace('\r', '\n')), str(source))
+
+
+def read_config_section(path, section, stats=None):
+    """Stream a config file line by line and only parse one section and its subcommand sections.
+
+    Only [prog] and sections like [prog run] are parsed. Other sections are skipped without being parsed.
+
+    Lines before the first section header are kept so files without any section headers still fail to parse. Section
+    headers must not be indented.
+
+    :raise ConfigParser.Error: If the section (or lines before the first section) can't be parsed.
+    :raise IOError: If file can't be read.
+
+    :param str path: Path to config file.
+    :param str section: Section to read.
+    :param Stats stats: Count files opened and bytes read in this instance.
+
+    :return: ConfigParser instance with only `section` (and its subcommand sections) loaded.
+    :rtype: ConfigParser
+    """
+    stats = stats or NULL_STATS
+    words = section.split()
+    lines, keep = list(), True
+    with open(path) as handle:
+        stats.incr('files_opened')
+        stats.incr('bytes_read', os.fstat(handle.fileno()).st_size)
+        for line in handle:
+            if line.startswith('['):
+                match = ConfigParser.SECTCRE.match(line.rstrip())
+                if match:
+                    keep = match.group('header').split()[:len(words)] == words
+            if keep:
+                lines.append(line)
+    return load_config(lines, path)
+
+
+class SectionIndex(object):
+    """Byte offsets of every section in a config file found by scanning a memory map for section headers.
+
+    :ivar list prefix: (start, end) offsets of everything before the first section header.
+    :ivar dict sections: Section name to list of (start, end) offsets, one per occurrence of the header.
+    """
+
+    HEADER_RE = re.compile(br'^\[(.+)\]', re.MULTILINE)
+
+    def __init__(self, data):
+        """Constructor.
+
+        :param data: Memory map or bytes of the whole config file.
+        """
+        self.sections = dict()
+        starts = list()
+        for match in self.HEADER_RE.finditer(data):
+            starts.append((match.start(), match.group(1)))
+        self.prefix = [(0, starts[0][0] if starts else len(data))]
+        for i, (start, name) in enumerate(starts):
+            end = starts[i + 1][0] if i + 1 < len(starts) else len(data)
+            self.sections.setdefault(name, list()).append((start, end))
+
+    def ranges(self, section):
+        """Offsets of all bytes needed to parse one section and its subcommand sections ([prog] and [prog run]).
+
+        :param str section: Section name.
+
+        :return: List of (start, end) offsets in file order.
+        :rtype: list
+        """
+        words = (section if bytes is str else section.encode(ENCODING)).split()
+        ranges = [r for n, o in self.sections.items() if n.split()[:len(words)] == words for r in o]
+        return self.prefix + sorted(ranges)
+
+
+def read_config_section_mmap(path, section, stats=None):
+    """Memory map a config file, index section header offsets, and only decode and parse one section.
+
+    Subcommand sections of that section (e.g. [prog run]) are decoded and parsed too.
+
+    :raise ConfigParser.Error: If the section (or bytes before the first section) can't be parsed.
+    :raise IOError: If file can't be read.
+
+    :param str path: Path to config file.
+    :param str section: Section to read.
+    :param Stats stats: Count files opened and bytes read (only bytes of the section are counted) in this instance.
+
+    :return: ConfigParser instance with only `section` (and its subcommand sections) loaded.
+    :rtype: ConfigParser
+    """
+    stats = stats or NULL_STATS
+    with open(path, 'rb') as handle:
+        stats.incr('files_opened')
+        if not os.fstat(handle.fileno()).st_size:
+            return load_config([], path)  # Empty files can't be memory mapped.
+        data = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            chunks = [data[s:e] for s, e in SectionIndex(data).ranges(section)]
+        finally:
+            data.close()
+    text = b''.join(chunks)
+    stats.incr('bytes_read', len(text))
+    if bytes is not str:
+        text = text.decode(ENCODING)
+    # Lines end like they do when reading a file in text mode, not on every str.splitlines() boundary (e.g. \x0c).
+    return load_config(StringIO(text.replace('\r\n', '\n').replace('\r', '\n')), path)
+
+
+CONFIG_READERS = {'mmap': read_config_section_mmap, 'stream': read_config_section}
+
+
+class ConfigCache(object):
+    """Bounded LRU cache of parsed config files, invalidated when the file's os.stat() fingerprint changes.
+
+    :ivar int maxsize: Maximum number of config files to keep.
+    :ivar int hits: Number of lookups served from the cache.
+    :ivar int misses: Number of lookups that read and parsed the file.
+    """
+
+    def __init__(self, maxsize=32):
+        """Constructor.
+
+        :param int maxsize: Maximum number of config files to keep.
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = dict()  # Absolute path to (fingerprint, config, last used tick).
+        self._lock = threading.Lock()
+        self._ticks = itertools.count()
+
+    def __len__(self):
+        """Number of cached config files."""
+        return len(self._entries)
+
+    @staticmethod
+    def fingerprint(path):
+        """Cheap signature of a file that changes when the file is modified or replaced.
+
+        :raise OSError: If file can't be stat'ed.
+
+        :param str path: Path to config file.
+
+        :return: Device, inode, size, mtime, and ctime.
+        :rtype: tuple
+        """
+        stat = os.stat(path)
+        return (
+            stat.st_dev,
+            stat.st_ino,
+            stat.st_size,
+            getattr(stat, 'st_mtime_ns', stat.st_mtime),
+            getattr(stat, 'st_ctime_ns', stat.st_ctime),
+        )
+
+    def get(self, path, reader=None, section=None, stats=None):
+        """Get parsed config file from cache, reading and parsing it on a miss.
+
+        :raise ConfigParser.Error: If file can't be parsed.
+        :raise IOError: If file can't be read.
+        :raise OSError: If file can't be stat'ed.
+
+        :param str path: Path to config file.
+        :param str reader: Name of a section-only reader in CONFIG_READERS. None to read the whole file.
+        :param str section: Section to read when `reader` is set.
+        :param Stats stats: Count cache hits/misses, files opened, and bytes read in this instance.
+
+        :return: ConfigParser instance with config file data loaded. Must not be modified.
+        :rtype: ConfigParser
+        """
+        stats = stats or NULL_STATS
+        path = os.path.abspath(path)
+        key = path if reader is None else (path, reader, section)
+        fingerprint = self.fingerprint(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == fingerprint:
+                self.hits += 1
+                self._entries[key] = (fingerprint, entry[1], next(self._ticks))
+                stats.incr('cache_hits')
+                return entry[1]
+            self.misses += 1
+        stats.incr('cache_misses')
+        config = read_config(path, stats) if reader is None else CONFIG_READERS[reader](path, section, stats)
+        with self._lock:
+            self._entries[key] = (fingerprint, config, next(self._ticks))
+            while len(self._entries) > self.maxsize:
+                del self._entries[min(self._entries, key=lambda k: self._entries[k][2])]  # Least recently used.
+        return config
+
+    def clear(self):
+        """Remove all entries and reset counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+
+CONFIG_CACHE = ConfigCache()
+
+
+class ResultCache(object):
+    """Bounded LRU cache of resolved docoptcfg() dictionaries keyed by a fingerprint of their inputs.
+
+    Inputs are the compiled docstring's arguments, argv, the remaining docopt arguments, and environment variables
+    starting with env_prefix. The config file used (if any) is validated on every hit: first by its os.stat()
+    fingerprint, then by a hash of its contents if that changed.
+
+    :ivar int maxsize: Maximum number of results to keep in memory.
+    :ivar str directory: Also keep results in this directory as JSON files so they survive across processes.
+    :ivar int hits: Number of lookups served from the cache.
+    :ivar int misses: Number of lookups that had to be resolved.
+    """
+
+    def __init__(self, maxsize=128, directory=None):
+        """Constructor.
+
+        :param int maxsize: Maximum number of results to keep in memory.
+        :param str directory: Also keep results in this directory as JSON files so they survive across processes.
+        """
+        self.maxsize = maxsize
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._entries = dict()  # Key to (entry dict, last used tick).
+        self._lock = threading.Lock()
+        self._ticks = itertools.count()
+
+    def __len__(self):
+        """Number of results cached in memory."""
+        return len(self._entries)
+
+    @staticmethod
+    def key(spec_key, argv, args, kwargs, env_prefix, environ=None):
+        """Fingerprint everything a resolved dictionary depends on except the config file.
+
+        :param tuple spec_key: get_spec() arguments.
+        :param list argv: CLI arguments.
+        :param iter args: Additional positional arguments passed to docopt.
+        :param dict kwargs: Additional keyword arguments passed to docopt.
+        :param str env_prefix: Environment variable prefix, None if disabled.
+        :param dict environ: Mapping to read environment variables from instead of os.environ.
+
+        :return: Hex digest.
+        :rtype: str
+        """
+        env = list()
+        if env_prefix is not None:
+            env = sorted(i for i in (os.environ if environ is None else environ).items() if i[0].startswith(env_prefix))
+        cwd = None if spec_key[2] is None else os.getcwd()  # Relative config file paths.
+        data = [__version__, docopt.__version__, list(spec_key), list(argv), list(args), sorted(kwargs.items()), env,
+                cwd]
+        return hashlib.sha256(json.dumps(data, default=repr).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def file_hash(path):
+        """Hash a file's contents.
+
+        :raise IOError: If file can't be read.
+
+        :param str path: File path.
+
+        :return: Hex digest.
+        :rtype: str
+        """
+        digest = hashlib.sha256()
+        with open(path, 'rb') as handle:
+            for chunk in iter(lambda: handle.read(65536), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _load(self, key):
+        """Get an entry from memory, falling back to the directory.
+
+        :param str key: Output of key().
+
+        :return: Entry dict or None.
+        :rtype: dict
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None or self.directory is None:
+            return None if entry is None else entry[0]
+        try:
+            with open(os.path.join(self.directory, key + '.json')) as handle:
+                entry = json.load(handle)
+            entry['result'] = docopt.Dict(entry['result'])
+            entry['stat'] = None if entry['stat'] is None else tuple(entry['stat'])
+        except (IOError, OSError, AttributeError, KeyError, TypeError, ValueError):
+            return None
+        return entry
+
+    def _store(self, key, entry, write=True):
+        """Save an entry in memory and optionally in the directory.
+
+        :param str key: Output of key().
+        :param dict entry: Result, config file path, stat fingerprint, and content hash.
+        :param bool write: Also write to the directory (if set).
+        """
+        with self._lock:
+            self._entries[key] = (entry, next(self._ticks))
+            while len(self._entries) > self.maxsize:
+                del self._entries[min(self._entries, key=lambda k: self._entries[k][1])]  # Least recently used.
+        if not write or self.directory is None:
+            return
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            handle, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(handle, 'w') as handle:
+                json.dump(entry, handle)
+            getattr(os, 'replace', os.rename)(tmp_path, os.path.join(self.directory, key + '.json'))
+        except (IOError, OSError):
+            pass
+
+    def get(self, key):
+        """Get a resolved dictionary if its config file (if any) hasn't changed.
+
+        :param str key: Output of key().
+
+        :return: Copy of the cached dictionary, or None on a miss.
+        :rtype: dict
+        """
+        entry = self._load(key)
+        valid = entry is not None
+        if valid and entry['path'] is not None:
+            try:
+                stat = ConfigCache.fingerprint(entry['path'])
+            except OSError:
+                stat = None
+            if stat != entry['stat']:
+                try:
+                    valid = stat is not None and self.file_hash(entry['path']) == entry['hash']
+                except (IOError, OSError):
+                    valid = False
+                if valid:
+                    entry = dict(entry, stat=stat)  # Touched but not modified.
+                    self._store(key, entry)
+        with self._lock:
+            if not valid:
+                self.misses += 1
+                return None
+            self.hits += 1
+        self._store(key, entry, write=False)
+        return docopt.Dict((k, list(v) if hasattr(v, 'append') else v) for k, v in entry['result'].items())
+
+    def put(self, key, result, path=None):
+        """Cache a resolved dictionary.
+
+        :param str key: Output of key().
+        :param dict result: Dictionary constructed by docopt and updated by docoptcfg.
+        :param str path: Config file the result was resolved with, None if none.
+        """
+        entry = dict(path=None, stat=None, hash=None)
+        if path is not None:
+            path = os.path.abspath(path)
+            try:
+                entry.update(path=path, stat=ConfigCache.fingerprint(path), hash=self.file_hash(path))
+            except (IOError, OSError):
+                entry['path'] = path  # Config file wasn't needed. Only valid while it still doesn't exist.
+        entry['result'] = docopt.Dict((k, list(v) if hasattr(v, 'append') else v) for k, v in result.items())
+        self._store(key, entry)
+
+    def clear(self):
+        """Remove all entries from memory and reset counters. Files in the directory are kept."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+
+RESULT_CACHE = ResultCache()
+
+
+def clear_cache():
+    """Clear process-wide caches of compiled docstrings, parsed config files, and resolved results."""
+    with SPEC_LOCK:
+        SPEC_CACHE.clear()
+    CONFIG_CACHE.clear()
+    RESULT_CACHE.clear()
+
+
+def get_opt(key, config, section, booleans, repeatable, path='', compact=False):
+    """Get one value from config file.
+
+    :raise DocoptcfgFileError: If an option is the wrong type.
+
+    :param str key: Option long name (e.g. --config).
+    :param ConfigParser config: ConfigParser instance with config file data already loaded.
+    :param str section: Section in config file to focus on.
+    :param iter booleans: Option long names of boolean/flag types.
+    :param iter repeatable: Option long names of repeatable options.
+    :param str path: Path to config file, for error messages.
+    :param compact: Return repeatable values as a CompactList. 'intern' to also store duplicate values once.
+
+    :return: Value to set in the defaults dict.
+    """
+    return text_value(key, config.get(section, key[2:]), booleans, repeatable, path, compact)
+
+
+def text_value(key, value, booleans, repeatable, path='', compact=False):
+    """Convert one config file (or other text based source) value the way ConfigParser does.
+
+    :raise DocoptcfgFileError: If an option is the wrong type.
+
+    :param str key: Option long name (e.g. --config).
+    :param str value: Raw value.
+    :param iter booleans: Option long names of boolean/flag types.
+    :param iter repeatable: Option long names of repeatable options.
+    :param str path: Path to config file (or URL), for error messages.
+    :param compact: Return repeatable values as a CompactList. 'intern' to also store duplicate values once.
+
+    :return: Value to set in the defaults dict.
     """
     # Handle repeatable non-boolean options (e.g. --file=file1.txt --file=file2.txt).
     if key in repeatable and key not in booleans:
-        return config.get(section, key[2:]).strip('\n').splitlines()
+        if compact:
+            return CompactList.from_text(value, compact == 'intern')
+        return value.strip('\n').splitlines()
 
     # Handle repeatable booleans.
     if key in repeatable and key in booleans:
         try:
-            return config.getint(section, key[2:])
+            return int(value)
         except ValueError as exc:
-            raise DocoptcfgFileError('Repeatable boolean option "{0}" invalid.'.format(key[2:]), str(exc))
+            raise DocoptcfgFileError('Repeatable boolean option "{0}" invalid.'.format(key[2:]), str(exc), path)
 
     # Handle non-repeatable booleans.
     if key in booleans:
-        try:
-            return config.getboolean(section, key[2:])
-        except ValueError as exc:
-            raise DocoptcfgFileError('Boolean option "{0}" invalid.'.format(key[2:]), str(exc))
+        states = getattr(ConfigParser, 'BOOLEAN_STATES', None) or getattr(ConfigParser, '_boolean_states')
+        if value.lower() not in states:
+            raise DocoptcfgFileError('Boolean option "{0}" invalid.'.format(key[2:]), 'Not a boolean: ' + value, path)
+        return states[value.lower()]
 
     # Handle the rest.
-    return str(config.get(section, key[2:]))
+    return str(value)
+
+
+def section_index(config):
+    """Map every section of a parsed config file to its name split into words.
+
+    [prog sync remote] is found with ('prog', 'sync', 'remote'). Kept until the ConfigParser instance is garbage
+    collected and rebuilt if sections are added or removed (e.g. a caller-owned ConfigParser given to IniSource).
+
+    :param ConfigParser config: ConfigParser instance with config file data already loaded.
+
+    :return: Tuple of words to section name.
+    :rtype: dict
+    """
+    key, sections = id(config), tuple(config.sections())
+    entry = SECTION_INDEXES.get(key)
+    if entry is not None and entry[0]() is config and entry[1] == sections:
+        return entry[2]
+    index = dict()
+    for name in sections:
+        index.setdefault(tuple(name.split()), name)
+    SECTION_INDEXES[key] = (weakref.ref(config, lambda _: SECTION_INDEXES.pop(key, None)), sections, index)
+    return index
 
 
-def values_from_file(docopt_dict, config_option, settable, booleans, repeatable):
+def section_chain(config, section, commands=()):
+    """Sections applying to the matched commands, least specific first: [prog], [prog sync], [prog sync remote].
+
+    :param ConfigParser config: ConfigParser instance with config file data already loaded.
+    :param str section: Program's section name.
+    :param tuple commands: Command names matched by argv in argv order (Spec.subcommands()).
+
+    :return: Names of sections in the config file.
+    :rtype: list
+    """
+    index, words = section_index(config), tuple(section.split())
+    chain = list()
+    for i in range(len(commands) + 1):
+        name = index.get(words + commands[:i])
+        if name is not None:
+            chain.append(name)
+    return chain
+
+
+def values_from_config(config, section, commands, keys, booleans, repeatable, path='', compact=False):
+    """Read values from the sections of a parsed config file applying to the matched commands.
+
+    More specific sections override less specific ones: [prog sync] overrides [prog].
+
+    :raise DocoptcfgFileError: If none of the sections are in the config file or an option is the wrong type.
+
+    :param ConfigParser config: ConfigParser instance with config file data already loaded.
+    :param str section: Program's section name.
+    :param tuple commands: Command names matched by argv in argv order (Spec.subcommands()).
+    :param iter keys: Option long names to read.
+    :param iter booleans: Option long names of boolean/flag types.
+    :param iter repeatable: Option long names of repeatable options.
+    :param str path: Path to config file, for error messages.
+    :param compact: Return repeatable values as a CompactList. 'intern' to also store duplicate values once.
+
+    :return: Values found.
+    :rtype: dict
+    """
+    chain = section_chain(config, section, commands)
+    if not chain:
+        raise DocoptcfgFileError('Section [{0}] not in config file.'.format(section), file_path=path)
+    defaults = dict()
+    for name in reversed(chain):
+        for key in keys:
+            if key not in defaults and config.has_option(name, key[2:]):
+                defaults[key] = get_opt(key, config, name, booleans, repeatable, path, compact)
+    return defaults
+
+
+def open_config(path, section, reader=None, get_config=None, stats=None):
+    """Get a parsed config file.
+
+    :raise DocoptcfgFileError: On any error while trying to read and parse config file.
+
+    :param str path: Path to config file.
+    :param str section: Section in config file to focus on.
+    :param str reader: Name of a section-only reader in CONFIG_READERS. None to read the whole file.
+    :param get_config: Function with the same signature as ConfigCache.get(). CONFIG_CACHE.get if None.
+    :param Stats stats: Collect counters in this instance.
+
+    :return: ConfigParser instance with config file data loaded. Must not be modified.
+    :rtype: ConfigParser
+    """
+    try:
+        config = (get_config or CONFIG_CACHE.get)(path, reader, section, stats)
+    except Error as exc:
+        raise DocoptcfgFileError('Unable to parse config file.', str(exc), path)
+    except (IOError, OSError) as exc:
+        raise DocoptcfgFileError('Unable to read config file.', str(exc), path)
+    return config
+
+
+def values_from_file(docopt_dict, config_option, settable, booleans, repeatable, section, reader=None,
+                     get_config=None, stats=None, compact=False, commands=()):
     """Parse config file and read settable values.
 
     Can be overridden by both command line arguments and environment variables.
@@ -191,89 +1823,1710 @@ def values_from_file(docopt_dict, config_option, settable, booleans, repeatable)
     :param iter settable: Option long names available to set by config file.
     :param iter booleans: Option long names of boolean/flag types.
     :param iter repeatable: Option long names of repeatable options.
+    :param str section: Section in config file to focus on.
+    :param str reader: Name of a section-only reader in CONFIG_READERS. None to read the whole file.
+    :param get_config: Function with the same signature as ConfigCache.get(). CONFIG_CACHE.get if None.
+    :param Stats stats: Collect counters in this instance.
+    :param compact: Return repeatable values as a CompactList. 'intern' to also store duplicate values once.
+    :param tuple commands: Command names matched by argv in argv order, selecting subcommand sections.
 
     :return: Settable values.
     :rtype: dict
     """
-    section = docopt.DocoptExit.usage.split()[1]
     settable = set(o for o in settable if o != config_option)
-    config = ConfigParser()
     defaults = dict()
 
     # Sanity checks.
     if config_option not in docopt_dict:
         raise DocoptcfgError
-    if docopt_dict[config_option] is None or not settable:
+    if not settable or docopt_dict[config_option] is None:
         return defaults
 
     # Read config file.
-    path = DocoptcfgFileError.FILE_PATH = docopt_dict[config_option]
-    try:
-        with open(path) as handle:
-            if hasattr(config, 'read_file'):
-                config.read_file(handle)
-            else:
-                getattr(config, 'readfp')(handle)
-    except Error as exc:
-        raise DocoptcfgFileError('Unable to parse config file.', str(exc))
-    except IOError as exc:
-        raise DocoptcfgFileError('Unable to read config file.', str(exc))
-
-    # Make sure section is in config file.
-    if not config.has_section(section):
-        raise DocoptcfgFileError('Section [{0}] not in config file.'.format(section))
+    path = docopt_dict[config_option]
+    config = open_config(path, section, reader, get_config, stats)
 
     # Parse config file.
-    for key in settable:
-        if config.has_option(section, key[2:]):
-            defaults[key] = get_opt(key, config, section, booleans, repeatable)
+    return values_from_config(config, section, commands, settable, booleans, repeatable, path, compact)
 
-    return defaults
 
+class Source(object):
+    """Base class of value sources.
 
-def docoptcfg(doc, argv=None, env_prefix=None, config_option=None, ignore=None, *args, **kwargs):
-    """Pass most args/kwargs to docopt. Handle `env_prefix` and `config_option`.
+    Spec.resolve() asks each source, in priority order, only for options not yet resolved by argv or by an earlier
+    source, and stops as soon as nothing is left.
 
-    :raise DocoptcfgError: If `config_option` isn't found in docstring.
-    :raise DocoptcfgFileError: On any error while trying to read and parse config file (if enabled).
+    Subclasses implement values(). PHASE names the Stats timing phase and COUNTER the Stats counter of values found.
+    """
 
-    :param str doc: Docstring passed to docopt.
-    :param iter argv: sys.argv[1:] passed to docopt.
-    :param str env_prefix: Enable environment variable support, prefix of said variables.
-    :param str config_option: Enable config file support, docopt option defining path to config file.
-    :param iter ignore: Options to ignore. Default is --help and --version.
-    :param iter args: Additional positional arguments passed to docopt.
-    :param dict kwargs: Additional keyword arguments passed to docopt.
+    PHASE = 'source'
+    COUNTER = 'from_source'
 
-    :return: Dictionary constructed by docopt and updated by docoptcfg.
-    :rtype: dict
+    def values(self, spec, keys, docopt_dict, stats=None):
+        """Get values of the options this source has.
+
+        :raise DocoptcfgFileError: On any error while trying to read the source (subclasses).
+
+        :param Spec spec: Compiled docstring.
+        :param iter keys: Option long names still unresolved. Never empty.
+        :param dict docopt_dict: Values resolved so far (argv, earlier sources, and docopt defaults).
+        :param Stats stats: Collect counters in this instance.
+
+        :return: Option long name to value for the subset of `keys` this source has.
+        :rtype: dict
+        """
+        raise NotImplementedError
+
+
+class EnvSource(Source):
+    """Environment variables. Uses the Spec's env_prefix unless given one.
+
+    Variables of non-repeatable options are looked up directly. Variables of repeatable options need all numbered
+    variables so the environment is indexed once, on first use, and the index is kept for later calls.
     """
-    docopt_dict = docopt.docopt(doc, argv, *args, **kwargs)
-    if env_prefix is None and config_option is None:
-        return docopt_dict  # Nothing to do.
-    if argv is None:
-        argv = sys.argv[1:]
-    if ignore is None:
-        ignore = ('--help', '--version')
-    settable, booleans, repeatable, short_map = settable_options(doc, argv, ignore, kwargs.get('options_first', False))
-    if not settable:
-        return docopt_dict  # Nothing to do.
-
-    # Handle environment variables defaults.
-    if env_prefix is not None:
-        defaults = values_from_env(env_prefix, settable, booleans, repeatable)
-        settable -= set(defaults.keys())  # No longer settable by values_from_file().
-        docopt_dict.update(defaults)
-
-    # Handle config file defaults.
-    if config_option is not None:
-        defaults = values_from_file(
-            docopt_dict,
-            short_map.get(config_option, config_option),
-            settable,
-            booleans,
-            repeatable,
-        )
-        docopt_dict.update(defaults)
 
-    return docopt_dict
+    PHASE = 'env'
+    COUNTER = 'from_env'
+
+    def __init__(self, env_prefix=None, environ=None, env_index=None, compact=False):
+        """Constructor.
+
+        :param str env_prefix: Prefix of environment variables. The Spec's env_prefix if None.
+        :param dict environ: Mapping to read environment variables from instead of os.environ.
+        :param EnvIndex env_index: Already indexed environment variables. Built from `environ` when needed if None.
+        :param compact: Return repeatable values as a CompactList. 'intern' to also store duplicate values once.
+        """
+        self.env_prefix = env_prefix
+        self.environ = environ
+        self.env_index = env_index
+        self.compact = compact
+
+    def values(self, spec, keys, docopt_dict, stats=None):
+        """Get values from environment variables.
+
+        :param Spec spec: Compiled docstring.
+        :param iter keys: Option long names still unresolved.
+        :param dict docopt_dict: Values resolved so far.
+        :param Stats stats: Collect counters in this instance.
+
+        :return: Values found.
+        :rtype: dict
+        """
+        env_prefix = spec.env_prefix if self.env_prefix is None else self.env_prefix
+        if env_prefix is None:
+            return dict()
+        env_names = spec.env_names
+        if env_prefix != spec.env_prefix or not env_names:
+            env_names = dict((k, '{0}{1}'.format(env_prefix, k[2:].replace('-', '_').upper())) for k in spec.candidates)
+        (stats or NULL_STATS).incr('env_lookups', len(keys))
+
+        if self.env_index is None and any(k in spec.repeatable and k not in spec.booleans for k in keys):
+            self.env_index = EnvIndex(env_prefix, self.environ, env_names.values())  # Only list values need a scan.
+        if self.env_index is not None:
+            return values_from_env(self.env_index, env_names, keys, spec.booleans, spec.repeatable, self.compact)
+
+        environ = os.environ if self.environ is None else self.environ
+        defaults = dict()
+        for key in keys:
+            if env_names[key] in environ:
+                defaults[key] = env_value(environ[env_names[key]], key in spec.booleans, key in spec.repeatable)
+        return defaults
+
+
+class IniSource(Source):
+    """INI config file.
+
+    Either the path given by the Spec's config_option (e.g. --config), a fixed path, or contents already in memory.
+
+    In memory contents (bytes, str, or a file object read right away) are parsed on first use and the ConfigParser is
+    kept, so one instance can be shared by many calls without touching the disk.
+    """
+
+    PHASE = 'config'
+    COUNTER = 'from_file'
+
+    def __init__(self, path=None, config_option=None, section=None, reader=None, get_config=None, optional=False,
+                 compact=False, config=None):
+        """Constructor.
+
+        :param str path: Fixed path to config file. If None then the value of `config_option` is used.
+        :param str config_option: Config option long name with file path as its value. The Spec's if None.
+        :param str section: Section in config file to focus on. The Spec's (program name) if None.
+        :param str reader: Name of a section-only reader in CONFIG_READERS. The Spec's config_reader if None.
+        :param get_config: Function with the same signature as ConfigCache.get(). CONFIG_CACHE.get if None.
+        :param bool optional: Skip a fixed `path` that doesn't exist instead of raising DocoptcfgFileError.
+        :param compact: Return repeatable values as a CompactList. 'intern' to also store duplicate values once.
+        :param config: Config file contents as bytes or str, a file object, or a ConfigParser instance. Used instead
+            of `path` and `config_option`.
+        """
+        self.path = path
+        self.config_option = config_option
+        self.section = section
+        self.reader = reader
+        self.get_config = get_config
+        self.optional = optional
+        self.compact = compact
+        self.name = getattr(config, 'name', '<config>')
+        self.config = config
+        if hasattr(config, 'read') and not hasattr(config, 'has_section'):
+            self.config = config.read()  # File objects can only be read once.
+
+    def parsed(self, stats=None):
+        """Parse in memory contents once and keep the ConfigParser instance.
+
+        :raise DocoptcfgFileError: If contents can't be parsed.
+
+        :param Stats stats: Collect counters in this instance.
+
+        :return: ConfigParser instance with config file data loaded. Must not be modified.
+        :rtype: ConfigParser
+        """
+        if not hasattr(self.config, 'has_section'):
+            try:
+                self.config = read_config_data(self.config, self.name, stats)
+            except Error as exc:
+                raise DocoptcfgFileError('Unable to parse config file.', str(exc), self.name)
+        return self.config
+
+    def values(self, spec, keys, docopt_dict, stats=None):
+        """Get values from the config file.
+
+        :raise DocoptcfgError: If the config option isn't found in docstring.
+        :raise DocoptcfgFileError: On any error while trying to read and parse config file.
+
+        :param Spec spec: Compiled docstring.
+        :param iter keys: Option long names still unresolved.
+        :param dict docopt_dict: Values resolved so far. The config option's value is read from here.
+        :param Stats stats: Collect counters in this instance.
+
+        :return: Values found.
+        :rtype: dict
+        """
+        section = spec.section if self.section is None else self.section
+        commands = spec.subcommands(docopt_dict)
+        if self.config is not None:
+            return values_from_config(self.parsed(stats), section, commands, keys, spec.booleans, spec.repeatable,
+                                      self.name, self.compact)
+
+        reader = spec.config_reader if self.reader is None else self.reader
+        if self.path is None:
+            config_option = spec.config_option if self.config_option is None else self.config_option
+            if config_option is None:
+                return dict()
+            return values_from_file(docopt_dict, config_option, keys, spec.booleans, spec.repeatable, section,
+                                    reader, self.get_config, stats, self.compact, commands)
+
+        if self.optional and not os.path.exists(self.path):
+            return dict()
+        config = open_config(self.path, section, reader, self.get_config, stats)
+        return values_from_config(config, section, commands, keys, spec.booleans, spec.repeatable, self.path,
+                                  self.compact)
+
+
+class DictSource(Source):
+    """Mapping of option long names (e.g. --threads) to values. Values are used as-is."""
+
+    PHASE = 'dict'
+    COUNTER = 'from_dict'
+
+    def __init__(self, mapping):
+        """Constructor.
+
+        :param dict mapping: Option long names to values.
+        """
+        self.mapping = mapping
+
+    def values(self, spec, keys, docopt_dict, stats=None):
+        """Get values from the mapping.
+
+        :param Spec spec: Compiled docstring.
+        :param iter keys: Option long names still unresolved.
+        :param dict docopt_dict: Values resolved so far.
+        :param Stats stats: Collect counters in this instance.
+
+        :return: Values found.
+        :rtype: dict
+        """
+        return dict((k, self.mapping[k]) for k in keys if k in self.mapping)
+
+
+class LayeredSource(Source):
+    """Layered INI config files, e.g. /etc/prog.ini, /etc/prog.d/*.ini, then ~/.prog.ini.
+
+    Later layers override earlier ones. Missing files are skipped and so are files without the program's section.
+
+    Paths may be glob patterns (expanded in sorted order) and start with ~. An ``include`` option in the program's
+    section lists more paths or patterns (relative to the including file) layered right after the including file.
+
+    Files are stat'ed and parsed concurrently in a thread pool (created on first use and reused by every lookup), a
+    file reachable through several paths (same inode) is parsed and layered once (first occurrence), parsed files are
+    kept until they change, and the merged sections are memoized until any layer changes.
+    """
+
+    PHASE = 'config'
+    COUNTER = 'from_file'
+
+    def __init__(self, paths, section=None, include='include', reader=None, max_workers=8, compact=False):
+        """Constructor.
+
+        :param iter paths: Config file paths or glob patterns, lowest precedence first.
+        :param str section: Section in config files to focus on. The Spec's (program name) if None.
+        :param str include: Option in the section listing more paths to layer. None to disable.
+        :param str reader: Name of a section-only reader in CONFIG_READERS. The Spec's config_reader if None.
+        :param int max_workers: Maximum number of threads reading files concurrently. 1 to read sequentially.
+        :param compact: Return repeatable values as a CompactList. 'intern' to also store duplicate values once.
+        """
+        self.paths = list(paths)
+        self.section = section
+        self.include = include
+        self.reader = reader
+        self.max_workers = max_workers
+        self.compact = compact
+        self._configs = dict()  # Absolute path to (fingerprint, ConfigParser).
+        self._merged = dict()  # (section, reader, commands) to layers key and merged sections.
+        self._pool = None  # ThreadPoolExecutor shared by every map() call.
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def expand(pattern, base=''):
+        """Expand ~ and glob patterns.
+
+        :param str pattern: Path or glob pattern.
+        :param str base: Directory relative paths are relative to.
+
+        :return: Absolute paths.
+        :rtype: list
+        """
+        pattern = os.path.join(base, os.path.expanduser(pattern))
+        if glob.has_magic(pattern):
+            return [os.path.abspath(p) for p in sorted(glob.glob(pattern))]
+        return [os.path.abspath(pattern)]
+
+    def map(self, function, items):
+        """Call a function for each item, concurrently if there are several.
+
+        :param function: Function with one argument.
+        :param list items: Arguments.
+
+        :return: Results in order.
+        :rtype: list
+        """
+        if ThreadPoolExecutor is None or self.max_workers < 2 or len(items) < 2:
+            return [function(i) for i in items]
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(self.max_workers)
+        return list(self._pool.map(function, items))
+
+    def load(self, path, fingerprint, section, reader, stats):
+        """Parse one config file, or reuse it if it didn't change.
+
+        :raise DocoptcfgFileError: On any error while trying to read and parse config file.
+
+        :param str path: Absolute path to config file.
+        :param tuple fingerprint: ConfigCache.fingerprint() of the file.
+        :param str section: Section to read when `reader` is set.
+        :param str reader: Name of a section-only reader in CONFIG_READERS. None to read the whole file.
+        :param Stats stats: Count cache hits/misses, files opened, and bytes read in this instance.
+
+        :return: ConfigParser instance with config file data loaded.
+        :rtype: ConfigParser
+        """
+        stats = stats or NULL_STATS
+        entry = self._configs.get(path)
+        if entry is not None and entry[0] == fingerprint:
+            stats.incr('cache_hits')
+            return entry[1]
+        stats.incr('cache_misses')
+        try:
+            config = read_config(path, stats) if reader is None else CONFIG_READERS[reader](path, section, stats)
+        except Error as exc:
+            raise DocoptcfgFileError('Unable to parse config file.', str(exc), path)
+        except (IOError, OSError) as exc:
+            raise DocoptcfgFileError('Unable to read config file.', str(exc), path)
+        with self._lock:
+            self._configs[path] = (fingerprint, config)
+        return config
+
+    def layers(self, section, reader, stats=None):
+        """Find, stat, and parse every layer including included files.
+
+        :raise DocoptcfgFileError: On any error while trying to read and parse config files.
+
+        :param str section: Section in config files to focus on.
+        :param str reader: Name of a section-only reader in CONFIG_READERS. None to read whole files.
+        :param Stats stats: Collect counters in this instance.
+
+        :return: (path, fingerprint, ConfigParser) tuples, lowest precedence first.
+        :rtype: list
+        """
+        seen = set()
+
+        def fingerprint(path):
+            """Fingerprint of a file from ConfigCache, None if it doesn't exist."""
+            try:
+                return ConfigCache.fingerprint(path)
+            except OSError:
+                return None
+
+        def walk(patterns, base):
+            """Read one level of paths concurrently, then their includes."""
+            paths = [p for pattern in patterns for p in self.expand(pattern, base)]
+            found = list()
+            for path, stat in zip(paths, self.map(fingerprint, paths)):
+                if stat is not None and stat[:2] not in seen:  # Device and inode.
+                    seen.add(stat[:2])
+                    found.append((path, stat))
+            configs = self.map(lambda i: self.load(i[0], i[1], section, reader, stats), found)
+            result = list()
+            for (path, stat), config in zip(found, configs):
+                result.append((path, stat, config))
+                if self.include is not None and config.has_option(section, self.include):
+                    result.extend(walk(config.get(section, self.include).split(), os.path.dirname(path)))
+            return result
+
+        return walk(self.paths, '')
+
+    def merged(self, section, reader, stats=None, commands=()):
+        """Merge the sections of every layer. Memoized until a layer changes.
+
+        Within each layer subcommand sections override less specific ones ([prog run] over [prog]), then later layers
+        override earlier ones.
+
+        :raise DocoptcfgFileError: On any error while trying to read and parse config files.
+
+        :param str section: Section in config files to focus on.
+        :param str reader: Name of a section-only reader in CONFIG_READERS. None to read whole files.
+        :param Stats stats: Collect counters in this instance.
+        :param tuple commands: Command names matched by argv in argv order (Spec.subcommands()).
+
+        :return: Option name to (raw value, path of the file it came from).
+        :rtype: dict
+        """
+        layers = self.layers(section, reader, stats)
+        key = tuple((p, s) for p, s, _ in layers)
+        entry = self._merged.get((section, reader, commands))
+        if entry is not None and entry[0] == key:
+            return entry[1]
+        merged = dict()
+        for path, _, config in layers:
+            for name in section_chain(config, section, commands):
+                for option in config.options(name):
+                    if option != self.include:
+                        merged[option] = (config.get(name, option), path)
+        self._merged[(section, reader, commands)] = (key, merged)
+        return merged
+
+    def values(self, spec, keys, docopt_dict, stats=None):
+        """Get values from the merged layers.
+
+        :raise DocoptcfgFileError: On any error while trying to read and parse config files or values of the wrong type.
+
+        :param Spec spec: Compiled docstring.
+        :param iter keys: Option long names still unresolved.
+        :param dict docopt_dict: Values resolved so far.
+        :param Stats stats: Collect counters in this instance.
+
+        :return: Values found.
+        :rtype: dict
+        """
+        section = spec.section if self.section is None else self.section
+        reader = spec.config_reader if self.reader is None else self.reader
+        merged = self.merged(section, reader, stats, spec.subcommands(docopt_dict))
+        defaults = dict()
+        for key in keys:
+            if key[2:] in merged:
+                value, path = merged[key[2:]]
+                defaults[key] = text_value(key, value, spec.booleans, spec.repeatable, path, self.compact)
+        return defaults
+
+
+class DirSource(Source):
+    """Directory with one file per option (e.g. mounted secrets or ConfigMaps): /etc/prog/threads, /etc/prog/mac-addr.
+
+    File names are option long names without dashes, like config files. The directory is listed once and only files
+    of still unresolved options are read. Values are converted like config file values after removing the trailing
+    newline. Repeatable options have one value per line.
+    """
+
+    PHASE = 'dir'
+    COUNTER = 'from_dir'
+
+    def __init__(self, path, optional=False, compact=False):
+        """Constructor.
+
+        :param str path: Directory path.
+        :param bool optional: Skip the directory if it doesn't exist instead of raising DocoptcfgFileError.
+        :param compact: Return repeatable values as a CompactList. 'intern' to also store duplicate values once.
+        """
+        self.path = path
+        self.optional = optional
+        self.compact = compact
+
+    def listdir(self):
+        """List regular files (or symlinks to them) in the directory.
+
+        :raise OSError: If the directory can't be listed.
+
+        :return: File names to paths.
+        :rtype: dict
+        """
+        scandir = getattr(os, 'scandir', None)
+        if scandir is None:
+            paths = ((n, os.path.join(self.path, n)) for n in os.listdir(self.path))
+            return dict((n, p) for n, p in paths if os.path.isfile(p))
+        return dict((e.name, e.path) for e in scandir(self.path) if e.is_file())
+
+    def values(self, spec, keys, docopt_dict, stats=None):
+        """Get values from files in the directory.
+
+        :raise DocoptcfgFileError: If the directory or a file can't be read, or on values of the wrong type.
+
+        :param Spec spec: Compiled docstring.
+        :param iter keys: Option long names still unresolved.
+        :param dict docopt_dict: Values resolved so far.
+        :param Stats stats: Collect counters in this instance.
+
+        :return: Values found.
+        :rtype: dict
+        """
+        stats = stats or NULL_STATS
+        try:
+            files = self.listdir()
+        except OSError as exc:
+            if self.optional and not os.path.exists(self.path):
+                return dict()
+            raise DocoptcfgFileError('Unable to read config directory.', str(exc), self.path)
+
+        defaults = dict()
+        for key in keys:
+            path = files.get(key[2:])
+            if path is None:
+                continue
+            try:
+                with open(path) as handle:
+                    stats.incr('files_opened')
+                    value = handle.read()
+            except (IOError, OSError) as exc:
+                raise DocoptcfgFileError('Unable to read config file.', str(exc), path)
+            stats.incr('bytes_read', len(value))
+            defaults[key] = text_value(key, value.rstrip('\r\n'), spec.booleans, spec.repeatable, path, self.compact)
+        return defaults
+
+
+class HttpSource(Source):
+    """Remote HTTP key-value store. All of a Spec's settable options are fetched in one batched request.
+
+    The request is ``POST <url>`` with the JSON body ``{"keys": ["<prefix>threads", ...]}`` (option long names without
+    dashes, like config files). The response is a JSON object of the keys the store has. String values are converted
+    like config file values, lists are accepted for repeatable options. Subclass and override fetch() for other APIs.
+
+    Connections are kept alive and reused across requests and threads. Responses are cached for `ttl` seconds. For
+    `stale` more seconds the cached response is still returned while one background request refreshes it.
+
+    :ivar int requests: Number of requests sent.
+    """
+
+    PHASE = 'remote'
+    COUNTER = 'from_remote'
+
+    def __init__(self, url, prefix='', ttl=60, stale=300, timeout=5, maxsize=4, headers=None, compact=False):
+        """Constructor.
+
+        :param str url: URL of the batch endpoint (http or https).
+        :param str prefix: Prepended to every key name (e.g. "myapp/").
+        :param float ttl: Seconds a response is fresh.
+        :param float stale: Seconds after `ttl` a response is returned while being refreshed in the background.
+        :param float timeout: Socket timeout in seconds.
+        :param int maxsize: Maximum number of idle connections kept open.
+        :param dict headers: Additional request headers (e.g. Authorization).
+        :param compact: Return repeatable values as a CompactList. 'intern' to also store duplicate values once.
+        """
+        parts = urlsplit(url)
+        self.url = url
+        self.prefix = prefix
+        self.ttl = ttl
+        self.stale = stale
+        self.timeout = timeout
+        self.maxsize = maxsize
+        self.headers = dict(headers or {}, **{'Content-Type': 'application/json', 'Connection': 'keep-alive'})
+        self.requests = 0
+        self.compact = compact
+        self._connection_class = HTTPSConnection if parts.scheme == 'https' else HTTPConnection
+        self._netloc = parts.netloc
+        self._path = (parts.path or '/') + ('?' + parts.query if parts.query else '')
+        self._cache = dict()  # Tuple of key names to (fetched at, response).
+        self._idle = list()
+        self._lock = threading.Lock()
+        self._refreshing = dict()  # Tuple of key names to background thread.
+
+    def close(self):
+        """Close idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, list()
+        for connection in idle:
+            connection.close()
+
+    def request(self, body):
+        """Send one POST request over a pooled keep-alive connection. Retries once if a reused connection was closed.
+
+        :raise DocoptcfgFileError: On connection errors or non-200 responses.
+
+        :param bytes body: Request body.
+
+        :return: Response body.
+        :rtype: bytes
+        """
+        for attempt in range(2):
+            with self._lock:
+                reused = bool(self._idle)
+                connection = self._idle.pop() if reused else self._connection_class(self._netloc, timeout=self.timeout)
+                self.requests += 1
+            try:
+                connection.request('POST', self._path, body, self.headers)
+                response = connection.getresponse()
+                data = response.read()
+            except (HTTPException, IOError, OSError) as exc:
+                connection.close()
+                if reused and not attempt:
+                    continue  # Server closed an idle connection.
+                raise DocoptcfgFileError('Unable to fetch remote config.', str(exc), self.url)
+            if response.will_close:
+                connection.close()
+            else:
+                with self._lock:
+                    if len(self._idle) < self.maxsize:
+                        self._idle.append(connection)
+                        connection = None
+                if connection is not None:
+                    connection.close()
+            if response.status != 200:
+                raise DocoptcfgFileError('Unable to fetch remote config.', 'HTTP {0}'.format(response.status), self.url)
+            return data
+
+    def fetch(self, names):
+        """Fetch values from the store in one request.
+
+        :raise DocoptcfgFileError: On connection errors, non-200 responses, or invalid JSON.
+
+        :param iter names: Key names (with prefix).
+
+        :return: Key names to values, only for keys the store has.
+        :rtype: dict
+        """
+        data = self.request(json.dumps({'keys': list(names)}).encode('utf-8'))
+        try:
+            response = json.loads(data.decode('utf-8'))
+        except ValueError as exc:
+            raise DocoptcfgFileError('Unable to parse remote config.', str(exc), self.url)
+        if not hasattr(response, 'items'):
+            raise DocoptcfgFileError('Unable to parse remote config.', 'Not a JSON object.', self.url)
+        return response
+
+    def _refresh(self, names):
+        """Fetch and cache a response, ignoring errors. Runs in a background thread.
+
+        :param tuple names: Key names (with prefix).
+        """
+        try:
+            self._cache[names] = (TIMER(), self.fetch(names))
+        except DocoptcfgFileError:
+            pass  # Keep serving the stale response until it expires.
+        finally:
+            with self._lock:
+                self._refreshing.pop(names, None)
+
+    def cached(self, names, stats=None):
+        """Get a response from the cache, fetching or refreshing it when needed.
+
+        :raise DocoptcfgFileError: When a response has to be fetched and can't be.
+
+        :param tuple names: Key names (with prefix).
+        :param Stats stats: Count cache hits/misses and requests in this instance.
+
+        :return: Key names to values.
+        :rtype: dict
+        """
+        stats = stats or NULL_STATS
+        entry = self._cache.get(names)
+        age = None if entry is None else TIMER() - entry[0]
+        if age is not None and age < self.ttl + self.stale:
+            stats.incr('cache_hits')
+            if age >= self.ttl:
+                with self._lock:
+                    if names not in self._refreshing:
+                        thread = threading.Thread(target=self._refresh, args=(names,))
+                        thread.daemon = True
+                        self._refreshing[names] = thread
+                        thread.start()
+            return entry[1]
+        stats.incr('cache_misses')
+        stats.incr('remote_requests')
+        response = self.fetch(names)
+        self._cache[names] = (TIMER(), response)
+        return response
+
+    def values(self, spec, keys, docopt_dict, stats=None):
+        """Get values from the store.
+
+        All of the Spec's settable options are fetched so one cached response serves every argv.
+
+        :raise DocoptcfgFileError: On fetch errors or values of the wrong type.
+
+        :param Spec spec: Compiled docstring.
+        :param iter keys: Option long names still unresolved.
+        :param dict docopt_dict: Values resolved so far.
+        :param Stats stats: Collect counters in this instance.
+
+        :return: Values found.
+        :rtype: dict
+        """
+        names = tuple(sorted(self.prefix + k[2:] for k in spec.candidates))
+        response = self.cached(names, stats)
+        defaults = dict()
+        for key in keys:
+            value = response.get(self.prefix + key[2:])
+            if value is None:
+                continue
+            if hasattr(value, 'append'):
+                value = '\n'.join(str(v) for v in value)
+            elif value is True or value is False:
+                value = 'true' if value else 'false'
+            defaults[key] = text_value(key, str(value), spec.booleans, spec.repeatable, self.url, self.compact)
+        return defaults
+
+
+class LazyResult(Mapping):
+    """Read-only mapping returned by docoptcfg(lazy=True).
+
+    Values from argv are available right away, environment variables and the config file are only looked up when an
+    option is first read. Lookups are memoized.
+
+    Iterating or converting with dict() reads every option and gives the same result as docoptcfg() without lazy.
+    Config file errors are raised by the first read that needs the config file.
+    """
+
+    def __init__(self, spec, docopt_dict, overridden, environ=None, get_config=None, sources=None, compact=False):
+        """Constructor.
+
+        :param Spec spec: Compiled docstring.
+        :param dict docopt_dict: Dictionary constructed by docopt.
+        :param set overridden: Option long names overridden by argv.
+        :param dict environ: Mapping to read environment variables from instead of os.environ.
+        :param get_config: Function with the same signature as ConfigCache.get(). CONFIG_CACHE.get if None.
+        :param iter sources: Value sources in priority order. Environment variables then config file if None.
+        :param compact: Return repeatable values of the default sources as a CompactList. 'intern' to also store
+            duplicate values once.
+        """
+        self._spec = spec
+        self._values = docopt_dict
+        if sources is None:
+            sources = spec.default_sources(environ, get_config=get_config, compact=compact)
+        self._sources = list(sources)
+        self._pending = spec.candidates - overridden if self._sources else set()
+
+    def __getitem__(self, key):
+        """Get one option's value, resolving it first if needed.
+
+        :raise DocoptcfgFileError: On any error while trying to read and parse config file (if needed).
+
+        :param str key: Option, argument, or command name.
+        """
+        if key in self._pending:
+            self._values[key] = self._resolve(key)
+            self._pending.discard(key)
+        return self._values[key]
+
+    def __contains__(self, key):
+        """Check names without resolving values.
+
+        :param str key: Option, argument, or command name.
+        """
+        return key in self._values
+
+    def __iter__(self):
+        """Iterate over all names."""
+        return iter(self._values)
+
+    def __len__(self):
+        """Number of names."""
+        return len(self._values)
+
+    def __repr__(self):
+        """Same as docopt.Dict after reading every option."""
+        return repr(docopt.Dict(self))
+
+    def _resolve(self, key):
+        """Ask each source in priority order for one option.
+
+        :param str key: Option long name.
+
+        :return: New value or the docopt default.
+        """
+        for source in self._sources:
+            defaults = source.values(self._spec, set([key]), self)  # Sources may read other options (e.g. --config).
+            if key in defaults:
+                return defaults[key]
+        return self._values[key]
+
+
+def docoptcfg(doc, argv=None, env_prefix=None, config_option=None, ignore=None, *args, **kwargs):
+    """Pass most args/kwargs to docopt. Handle `env_prefix` and `config_option`.
+
+    :raise DocoptcfgError: If `config_option` isn't found in docstring.
+    :raise DocoptcfgFileError: On any error while trying to read and parse config file (if enabled).
+
+    :param str doc: Docstring passed to docopt.
+    :param iter argv: sys.argv[1:] passed to docopt.
+    :param str env_prefix: Enable environment variable support, prefix of said variables.
+    :param str config_option: Enable config file support, docopt option defining path to config file.
+    :param iter ignore: Options to ignore. Default is --help and --version.
+    :param iter args: Additional positional arguments passed to docopt.
+    :param dict kwargs: Additional keyword arguments passed to docopt. Except for:
+        compact (bool): Return repeatable values from env vars/config files as memory compact CompactList sequences.
+            'intern' to also store duplicate values once.
+        config: Config file contents (bytes, str, file object, or ConfigParser) used instead of reading the file
+            given by `config_option`.
+        config_reader (str): Only read the program's section of config files: 'stream' or 'mmap'.
+        disk_cache (str): Cache the compiled docstring in this directory across processes. True for the default.
+        environ (dict): Mapping to read environment variables from instead of os.environ.
+        lazy (bool): Return a LazyResult mapping that only reads environment variables/config files when needed.
+        response_files (bool): Replace @path arguments with the lines of that file (one argument per line).
+        result_cache (ResultCache): Return cached results for identical inputs. True for the process-wide cache.
+            Ignored when `compact`, `config`, `sources`, or `response_files` is given.
+        sources (list): Value sources (Source instances) in priority order, replacing environment variables then
+            config file. See EnvSource, IniSource, and DictSource.
+        stats (Stats): Collect per-phase timings and counters in this instance.
+
+    :return: Dictionary constructed by docopt and updated by docoptcfg.
+    :rtype: dict
+    """
+    config = kwargs.pop('config', None)
+    config_reader = kwargs.pop('config_reader', None)
+    disk_cache = kwargs.pop('disk_cache', None)
+    environ = kwargs.pop('environ', None)
+    result_cache = kwargs.pop('result_cache', None)
+    stats = kwargs.pop('stats', None)
+    profile = os.environ.get('DOCOPTCFG_PROFILE', '').strip().lower() not in ('', '0', 'false', 'no', 'off')
+    if profile and stats is None:
+        stats = Stats()
+    if result_cache is not None and result_cache is not False and kwargs.get('sources') is None and config is None \
+            and not kwargs.get('response_files') and not kwargs.get('compact'):
+        kwargs.pop('lazy', None)  # Cached results are already resolved.
+        section = docopt.printable_usage(doc).split()[1] if profile else None  # Without compiling on cache hits.
+        try:
+            return cached_docoptcfg(RESULT_CACHE if result_cache is True else result_cache, doc, argv, env_prefix,
+                                    config_option, ignore, args, dict(kwargs, config_reader=config_reader,
+                                                                      disk_cache=disk_cache, environ=environ,
+                                                                      stats=stats))
+        finally:
+            if profile:
+                sys.stderr.write(stats.report(section) + '\n')
+    if stats is None:
+        spec = get_spec(doc, env_prefix, config_option, ignore, config_reader, disk_cache)
+        if config is not None and kwargs.get('sources') is None:
+            kwargs['sources'] = spec.default_sources(environ, compact=kwargs.get('compact', False), config=config)
+        return spec.parse(argv, *args, environ=environ, **kwargs)
+
+    with stats.phase('compile'):
+        spec = get_spec(doc, env_prefix, config_option, ignore, config_reader, disk_cache)
+    if config is not None and kwargs.get('sources') is None:
+        kwargs['sources'] = spec.default_sources(environ, compact=kwargs.get('compact', False), config=config)
+    try:
+        return spec.parse(argv, *args, environ=environ, stats=stats, **kwargs)
+    finally:
+        if profile:
+            sys.stderr.write(stats.report(spec.section) + '\n')
+
+
+def cached_docoptcfg(cache, doc, argv, env_prefix, config_option, ignore, args, kwargs):
+    """docoptcfg() through a ResultCache. Only successful results are cached.
+
+    Lookups are timed in the result_cache phase and counted in the result_cache_hits/result_cache_misses counters.
+
+    :param ResultCache cache: Cache to use.
+    :param str doc: Docstring passed to docopt.
+    :param list argv: CLI arguments. If None then sys.argv[1:] is used.
+    :param str env_prefix: Enable environment variable support, prefix of said variables.
+    :param str config_option: Enable config file support, docopt option defining path to config file.
+    :param iter ignore: Options to ignore. Default is --help and --version.
+    :param iter args: Additional positional arguments passed to docopt.
+    :param dict kwargs: Additional keyword arguments passed to docoptcfg().
+
+    :return: Dictionary constructed by docopt and updated by docoptcfg.
+    :rtype: dict
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    disk_cache, environ, stats = kwargs.pop('disk_cache'), kwargs.pop('environ'), kwargs.pop('stats') or NULL_STATS
+    spec_key = (doc, env_prefix, config_option, None if ignore is None else tuple(ignore), kwargs['config_reader'])
+    with stats.phase('result_cache'):
+        key = cache.key(spec_key, argv, args, kwargs, env_prefix, environ)
+        result = cache.get(key)
+    if result is not None:
+        stats.incr('result_cache_hits')
+        return result
+    stats.incr('result_cache_misses')
+
+    with stats.phase('compile'):
+        spec = get_spec(doc, env_prefix, config_option, ignore, kwargs.pop('config_reader'), disk_cache)
+    result = spec.parse(argv, *args, environ=environ, stats=stats, **kwargs)
+    cache.put(key, result, None if spec.config_option is None else result.get(spec.config_option))
+    return result
+
+
+def iter_resolve(spec, argv_iter, env_index, args, kwargs, return_exceptions=False, sources=None, compact=False):
+    """Resolve argv lists with one compiled docstring. Each config file is only looked up once.
+
+    :param Spec spec: Compiled docstring.
+    :param iter argv_iter: Iterable of CLI arguments lists.
+    :param EnvIndex env_index: Already indexed environment variables, None if disabled.
+    :param iter args: Additional positional arguments passed to docopt.
+    :param dict kwargs: Additional keyword arguments passed to docopt.
+    :param bool return_exceptions: Yield DocoptExit and DocoptcfgFileError exceptions instead of raising them.
+    :param list sources: Value sources in priority order. Environment variables then config file if None.
+    :param compact: Return repeatable values as a CompactList. 'intern' to also store duplicate values once.
+
+    :return: Yields one dictionary (or exception) per argv.
+    :rtype: iter
+    """
+    configs = dict()
+
+    def get_config(path, reader, section, stats=None):
+        """Memoized CONFIG_CACHE.get() for this batch.
+
+        :param str path: Path to config file.
+        :param str reader: Name of a section-only reader in CONFIG_READERS. None to read the whole file.
+        :param str section: Section to read when `reader` is set.
+        :param Stats stats: Passed to CONFIG_CACHE.get().
+
+        :return: ConfigParser instance with config file data loaded. Must not be modified.
+        :rtype: ConfigParser
+        """
+        key = (path, reader, section)
+        if key not in configs:
+            configs[key] = CONFIG_CACHE.get(path, reader, section, stats)
+        return configs[key]
+
+    for argv in argv_iter:
+        try:
+            docopt_dict, overridden = spec.parse_argv(argv, *args, **kwargs)
+            yield spec.resolve(docopt_dict, overridden, env_index=env_index, get_config=get_config, sources=sources,
+                               compact=compact)
+        except (docopt.DocoptExit, DocoptcfgFileError) as exc:
+            if not return_exceptions:
+                raise
+            yield exc
+
+
+def resolve_many(spec, argv_list, env_index, args, kwargs, return_exceptions=False, sources=None, compact=False):
+    """Resolve a chunk of argv lists. Module level function so it can be sent to process pools.
+
+    :param Spec spec: Compiled docstring.
+    :param list argv_list: List of CLI arguments lists.
+    :param EnvIndex env_index: Already indexed environment variables, None if disabled.
+    :param iter args: Additional positional arguments passed to docopt.
+    :param dict kwargs: Additional keyword arguments passed to docopt.
+    :param bool return_exceptions: Return DocoptExit and DocoptcfgFileError exceptions instead of raising them.
+    :param list sources: Value sources in priority order. Environment variables then config file if None.
+    :param compact: Return repeatable values as a CompactList. 'intern' to also store duplicate values once.
+
+    :return: One dictionary (or exception) per argv.
+    :rtype: list
+    """
+    return list(iter_resolve(spec, argv_list, env_index, args, kwargs, return_exceptions, sources, compact))
+
+
+def docoptcfg_many(doc, argv_iter, env_prefix=None, config_option=None, ignore=None, *args, **kwargs):
+    """Resolve many argv lists against one docstring. Generator yielding one dictionary per argv, in order.
+
+    The docstring is compiled once, environment variables are read once, and each config file is read once (once per
+    chunk with `executor`). argv_iter is consumed lazily so results don't have to be held in memory all at once.
+
+    :raise DocoptcfgError: If `config_option` isn't found in docstring.
+    :raise DocoptcfgFileError: On any error while trying to read and parse config file (if enabled).
+
+    :param str doc: Docstring passed to docopt.
+    :param iter argv_iter: Iterable of CLI arguments lists.
+    :param str env_prefix: Enable environment variable support, prefix of said variables.
+    :param str config_option: Enable config file support, docopt option defining path to config file.
+    :param iter ignore: Options to ignore. Default is --help and --version.
+    :param iter args: Additional positional arguments passed to docopt.
+    :param dict kwargs: Additional keyword arguments passed to docopt. Except for:
+        compact (bool): Return repeatable values from env vars/config files as memory compact CompactList sequences.
+            'intern' to also store duplicate values once.
+        config: Config file contents (bytes, str, file object, or ConfigParser) used instead of reading the file
+            given by `config_option`. Parsed once for all argv lists.
+        config_reader (str): Only read the program's section of config files: 'stream' or 'mmap'.
+        disk_cache (str): Cache the compiled docstring in this directory across processes. True for the default.
+        environ (dict): Mapping to read environment variables from instead of os.environ.
+        executor (concurrent.futures.Executor): Resolve chunks in this thread or process pool.
+        chunksize (int): Number of argv lists per chunk. Default is 256.
+        prefetch (int): Maximum number of chunks submitted to `executor` ahead of the one being yielded. Default is 16.
+        response_files (bool): Replace @path arguments with the lines of that file (one argument per line).
+        return_exceptions (bool): Yield DocoptExit/DocoptcfgFileError exceptions instead of raising them.
+        sources (list): Value sources (Source instances) in priority order, replacing environment variables then
+            config file.
+
+    :return: Dictionaries constructed by docopt and updated by docoptcfg (or exceptions).
+    :rtype: iter
+    """
+    config_reader = kwargs.pop('config_reader', None)
+    disk_cache = kwargs.pop('disk_cache', None)
+    environ = kwargs.pop('environ', None)
+    executor = kwargs.pop('executor', None)
+    chunksize = kwargs.pop('chunksize', 256)
+    prefetch = kwargs.pop('prefetch', 16)
+    return_exceptions = kwargs.pop('return_exceptions', False)
+    sources = kwargs.pop('sources', None)
+    compact = kwargs.pop('compact', False)
+    config = kwargs.pop('config', None)
+
+    spec = get_spec(doc, env_prefix, config_option, ignore, config_reader, disk_cache)
+    env_index = None
+    if spec.env_prefix is not None and sources is None:
+        env_index = EnvIndex(spec.env_prefix, environ, spec.env_names.values())
+    if config is not None and sources is None:
+        sources = spec.default_sources(env_index=env_index, compact=compact, config=config)
+        sources[-1].parsed()  # Once, before chunks are sent to executor workers.
+
+    if executor is None:
+        for result in iter_resolve(spec, argv_iter, env_index, args, kwargs, return_exceptions, sources, compact):
+            yield result
+        return
+
+    argv_iter = iter(argv_iter)
+    chunks = iter(lambda: list(itertools.islice(argv_iter, chunksize)), [])
+    pending = deque()
+    for chunk in chunks:
+        pending.append(executor.submit(resolve_many, spec, chunk, env_index, args, kwargs, return_exceptions,
+                                       sources, compact))
+        if len(pending) > prefetch:
+            for result in pending.popleft().result():
+                yield result
+    while pending:
+        for result in pending.popleft().result():
+            yield result
+
+
+class Inotify(object):
+    """Minimal Linux inotify binding (ctypes) watching the directory of a file for changes to its name.
+
+    The directory is watched instead of the file so atomic replacements (write then rename) are noticed too. If the
+    path is a symlink the directory of its target is watched as well, so edits of the target are noticed.
+
+    :raise OSError: If inotify isn't available (not Linux) or the directory can't be watched.
+    """
+
+    # IN_MODIFY, IN_ATTRIB, IN_CLOSE_WRITE, IN_MOVED_FROM, IN_MOVED_TO, IN_CREATE, IN_DELETE.
+    MASK = 0x2 | 0x4 | 0x8 | 0x40 | 0x80 | 0x100 | 0x200
+    IN_Q_OVERFLOW = 0x4000
+    EVENT = struct.Struct('iIII')
+
+    def __init__(self, path):
+        """Constructor.
+
+        :param str path: File to watch.
+        """
+        import ctypes  # Optional, not available on every platform.
+        import ctypes.util
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            init, add_watch = libc.inotify_init1, libc.inotify_add_watch
+        except AttributeError:
+            raise OSError('inotify not available.')
+        paths = [os.path.abspath(path)]
+        if os.path.realpath(path) != paths[0]:
+            paths.append(os.path.realpath(path))
+        self.names = set(os.path.basename(p).encode(ENCODING) for p in paths)
+        self.fd = init(os.O_NONBLOCK | getattr(os, 'O_CLOEXEC', 0))
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1() failed.')
+        for directory in set(os.path.dirname(p) for p in paths):
+            if add_watch(self.fd, directory.encode(ENCODING), self.MASK) < 0:
+                errno = ctypes.get_errno()
+                os.close(self.fd)
+                raise OSError(errno, 'inotify_add_watch() failed.', directory)
+
+    def close(self):
+        """Stop watching."""
+        os.close(self.fd)
+
+    def wait(self, timeout):
+        """Wait for events.
+
+        :param float timeout: Maximum seconds to wait.
+
+        :return: If the file (may have) changed.
+        :rtype: bool
+        """
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return False
+        changed = False
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except (IOError, OSError):
+                break  # Drained (EAGAIN).
+            offset = 0
+            while offset < len(data):
+                _, mask, _, length = self.EVENT.unpack_from(data, offset)
+                offset += self.EVENT.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+                changed = changed or name in self.names or bool(mask & self.IN_Q_OVERFLOW)
+        return changed
+
+
+class Watcher(object):
+    """Resolve options once and then re-resolve them when the config file changes, for long running daemons.
+
+    Changes are noticed with inotify where available, else by polling os.stat(). With inotify the file is also stat'ed
+    every `interval` seconds since not every change is reported (e.g. swapped symlinks of Kubernetes ConfigMaps). Only
+    the config file is re-read and only options it can set are recomputed: options from argv and environment variables
+    keep their values. Options removed from the config file go back to their docopt defaults.
+
+    :ivar dict result: Current dictionary. Replaced (not modified) on every change.
+    :ivar str path: Watched config file path. None if there's nothing to watch.
+    :ivar Exception error: DocoptcfgFileError of the last failed reload (previous values are kept). None on success.
+    """
+
+    def __init__(self, spec, argv, environ=None, callback=None, interval=1.0, inotify=None, **kwargs):
+        """Constructor. Resolves options right away.
+
+        :raise DocoptcfgError: If `config_option` isn't found in docstring.
+        :raise DocoptcfgFileError: On any error while trying to read and parse config file (initial resolve only).
+
+        :param Spec spec: Compiled docstring.
+        :param iter argv: CLI arguments. sys.argv[1:] if None.
+        :param dict environ: Mapping to read environment variables from instead of os.environ.
+        :param callback: Called with a dict of option long names to (old, new) values after each change.
+        :param float interval: Seconds between stat() polls, or maximum seconds between inotify waits.
+        :param bool inotify: Use inotify. False to always poll. None to use it when available.
+        :param dict kwargs: Additional keyword arguments passed to Spec.parse_argv().
+        """
+        self.spec = spec
+        self.callback = callback
+        self.interval = interval
+        self.error = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+        docopt_dict, overridden = spec.parse_argv(sys.argv[1:] if argv is None else argv, **kwargs)
+        self._defaults = dict(docopt_dict)
+        settable = spec.candidates - overridden
+        if spec.env_prefix is not None and settable:
+            env_index = EnvIndex(spec.env_prefix, environ, spec.env_names.values())
+            defaults = values_from_env(env_index, spec.env_names, settable, spec.booleans, spec.repeatable)
+            settable -= set(defaults)
+            docopt_dict.update(defaults)
+        self._file_keys = settable  # Only these are recomputed.
+
+        self.path = None
+        if spec.config_option is not None:
+            if spec.config_option not in docopt_dict:
+                raise DocoptcfgError
+            self.path = docopt_dict[spec.config_option]
+        self._fingerprint = self.fingerprint()
+        docopt_dict.update(self.values_from_file(docopt_dict))
+        self.result = docopt_dict
+
+        self._inotify = None
+        if self.path is not None and inotify is not False:
+            try:
+                self._inotify = Inotify(self.path)
+            except OSError:
+                if inotify:
+                    raise
+
+    def fingerprint(self):
+        """Cheap signature of the config file.
+
+        :return: ConfigCache.fingerprint() or None if there's no file.
+        :rtype: tuple
+        """
+        if self.path is None:
+            return None
+        try:
+            return ConfigCache.fingerprint(self.path)
+        except OSError:
+            return None
+
+    def values_from_file(self, docopt_dict):
+        """Read the options the config file may set.
+
+        :raise DocoptcfgFileError: On any error while trying to read and parse config file.
+
+        :param dict docopt_dict: Current values.
+
+        :return: Values from the config file.
+        :rtype: dict
+        """
+        spec = self.spec
+        if self.path is None or not self._file_keys:
+            return dict()
+        return values_from_file(docopt_dict, spec.config_option, self._file_keys, spec.booleans, spec.repeatable,
+                                spec.section, spec.config_reader, commands=spec.subcommands(docopt_dict))
+
+    def check(self):
+        """Re-resolve if the config file changed since the last check. Calls the callback on changes.
+
+        :return: Option long names to (old, new) values. Empty if nothing changed.
+        :rtype: dict
+        """
+        with self._lock:
+            fingerprint = self.fingerprint()
+            if fingerprint == self._fingerprint:
+                return dict()
+            self._fingerprint = fingerprint
+            try:
+                values = self.values_from_file(self.result)
+            except DocoptcfgFileError as exc:
+                self.error = exc  # Probably mid-write. Keep previous values and retry on the next change.
+                return dict()
+            self.error = None
+            diff = dict()
+            for key in self._file_keys - set([self.spec.config_option]):
+                new = values.get(key, self._defaults[key])
+                if new != self.result[key]:
+                    diff[key] = (self.result[key], new)
+            if not diff:
+                return diff
+            result = self.result.__class__(self.result)
+            result.update((k, v[1]) for k, v in diff.items())
+            self.result = result
+        if self.callback is not None:
+            self.callback(diff)
+        return diff
+
+    def wait(self, timeout):
+        """Block until the config file may have changed or `timeout` seconds passed.
+
+        :param float timeout: Maximum seconds to wait.
+
+        :return: If the file may have changed (always True when polling).
+        :rtype: bool
+        """
+        if self._inotify is None:
+            return not self._stop.wait(timeout)
+        return self._inotify.wait(timeout)
+
+    def run(self):
+        """Check for changes until stop() is called. Also checks (one stat()) when waiting timed out."""
+        while not self._stop.is_set():
+            self.wait(self.interval)
+            if not self._stop.is_set():
+                self.check()
+
+    def start(self):
+        """Check for changes in a daemon thread.
+
+        :return: self
+        :rtype: Watcher
+        """
+        if self.path is not None and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run)
+            self._thread.daemon = True
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the thread started by start() and release inotify."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+
+def watch(doc, argv=None, env_prefix=None, config_option=None, ignore=None, callback=None, **kwargs):
+    """Resolve options like docoptcfg() and return a Watcher re-resolving them when the config file changes.
+
+    Call start() on the returned Watcher to check in a background thread, or check() from your own event loop.
+
+    :raise DocoptcfgError: If `config_option` isn't found in docstring.
+    :raise DocoptcfgFileError: On any error while trying to read and parse config file (if enabled).
+
+    :param str doc: Docstring passed to docopt.
+    :param iter argv: sys.argv[1:] passed to docopt.
+    :param str env_prefix: Enable environment variable support, prefix of said variables.
+    :param str config_option: Enable config file support, docopt option defining path to config file.
+    :param iter ignore: Options to ignore. Default is --help and --version.
+    :param callback: Called with a dict of option long names to (old, new) values after each change.
+    :param dict kwargs: Additional keyword arguments passed to docopt. Except for:
+        config_reader (str): Only read the program's section of config files: 'stream' or 'mmap'.
+        disk_cache (str): Cache the compiled docstring in this directory across processes. True for the default.
+        environ (dict): Mapping to read environment variables from instead of os.environ.
+        interval (float): Seconds between stat() polls, or maximum seconds between inotify waits. Default is 1.
+        inotify (bool): Use inotify. False to always poll. None (default) to use it when available.
+        response_files (bool): Replace @path arguments with the lines of that file (one argument per line).
+
+    :return: Watcher with the resolved dictionary in its `result` attribute.
+    :rtype: Watcher
+    """
+    config_reader = kwargs.pop('config_reader', None)
+    disk_cache = kwargs.pop('disk_cache', None)
+    spec = get_spec(doc, env_prefix, config_option, ignore, config_reader, disk_cache)
+    return Watcher(spec, argv, callback=callback, **kwargs)
+
+
+CLI_DOC = """\
+Generate a standalone command line parser module from a program's docstring.
+
+Usage:
+    docoptcfg compile [options] [--ignore=OPT]... SOURCE
+    docoptcfg -h | --help
+
+Options:
+    -c OPT --config-option=OPT      Enable config file support, option defining path to config file.
+    -e PREFIX --env-prefix=PREFIX   Enable environment variable support, prefix of said variables.
+    -h --help                       Show this screen.
+    -i OPT --ignore=OPT             Options to ignore. Default is --help and --version.
+    -o FILE --output=FILE           Write module to this file instead of stdout.
+    -v NAME --variable=NAME         Module-level variable holding the docstring instead of the module docstring.
+"""
+GENERATED_TEMPLATE = string.Template('''\
+"""Command line parser generated by docoptcfg $version from $source. Do not edit.
+
+Regenerate with: python -m docoptcfg compile $source -o $output
+
+Same results as docoptcfg() without importing docopt or docoptcfg. Call parse().
+"""
+
+import os
+import sys
+
+try:
+    from ConfigParser import ConfigParser, Error
+except ImportError:
+    from configparser import ConfigParser, Error
+
+DOC = $doc
+USAGE = $usage
+SECTION = $section
+COMMANDS = $commands
+COMMAND_ORDERS = $command_orders
+ENV_PREFIX = $env_prefix
+CONFIG_OPTION = $config_option
+OPTIONS = $options
+DEFAULTS = $defaults
+ENV_NAMES = $env_names
+KINDS = $kinds
+
+
+class Dict(dict):
+    """Same repr as docopt.Dict."""
+
+    def __repr__(self):
+        """Sorted, one item per line."""
+        return '{%s}' % ',\\n '.join('%r: %r' % i for i in sorted(self.items()))
+
+
+class DocoptExit(SystemExit):
+    """CLI arguments don't match the usage pattern."""
+
+    def __init__(self, message=''):
+        """Constructor."""
+        SystemExit.__init__(self, (message + '\\n' + USAGE).strip())
+
+
+class DocoptcfgFileError(Exception):
+    """Error while reading or parsing config file."""
+
+    def __init__(self, message, original_error=None, file_path=''):
+        """Constructor."""
+        self.message = message
+        self.original_error = original_error
+        self.FILE_PATH = file_path  # pylint: disable=invalid-name
+        super(DocoptcfgFileError, self).__init__(message, file_path, original_error)
+
+
+def _parse_long(tokens, options):
+    """Parse one --long option. Tokens are [type, name, value, long name] lists."""
+    long_, eq, value = tokens.pop(0).partition('=')
+    value = None if eq == value == '' else value
+    similar = [o for o in options if o[1] == long_]
+    if not similar:
+        similar = [o for o in options if o[1] and o[1].startswith(long_)]
+    if len(similar) > 1:
+        raise DocoptExit('%s is not a unique prefix: %s?' % (long_, ', '.join(o[1] for o in similar)))
+    if not similar:
+        argcount = 1 if eq == '=' else 0
+        options.append((None, long_, argcount, None if argcount else False))
+        return [['o', long_, value if argcount else True, long_]]
+    long_, argcount = similar[0][1], similar[0][2]
+    if argcount == 0:
+        if value is not None:
+            raise DocoptExit('%s must not have an argument' % long_)
+    elif value is None:
+        if not tokens:
+            raise DocoptExit('%s requires argument' % long_)
+        value = tokens.pop(0)
+    return [['o', long_, True if value is None else value, long_]]
+
+
+def _parse_shorts(tokens, options):
+    """Parse one -abc token."""
+    left = tokens.pop(0).lstrip('-')
+    parsed = []
+    while left != '':
+        short, left = '-' + left[0], left[1:]
+        similar = [o for o in options if o[0] == short]
+        if len(similar) > 1:
+            raise DocoptExit('%s is specified ambiguously %d times' % (short, len(similar)))
+        if not similar:
+            options.append((short, None, 0, False))
+            parsed.append(['o', short, True, None])
+            continue
+        long_, argcount, value = similar[0][1], similar[0][2], None
+        if argcount != 0:
+            if left == '':
+                if not tokens:
+                    raise DocoptExit('%s requires argument' % short)
+                value = tokens.pop(0)
+            else:
+                value, left = left, ''
+        parsed.append(['o', long_ or short, True if value is None else value, long_])
+    return parsed
+
+
+def _parse_argv(tokens, options, options_first):
+    """Tokenize argv like docopt.parse_argv()."""
+    parsed = []
+    while tokens:
+        if tokens[0] == '--':
+            return parsed + [['a', None, v, None] for v in tokens]
+        elif tokens[0].startswith('--'):
+            parsed += _parse_long(tokens, options)
+        elif tokens[0].startswith('-') and tokens[0] != '-':
+            parsed += _parse_shorts(tokens, options)
+        elif options_first:
+            return parsed + [['a', None, v, None] for v in tokens]
+        else:
+            parsed.append(['a', None, tokens.pop(0), None])
+    return parsed
+
+
+def _leaf(kind, name, counter):
+    """Build the matcher of one usage pattern leaf."""
+    def match(left, collected):
+        """Match one token like docopt.ChildPattern.match()."""
+        for pos, token in enumerate(left):
+            if kind == 'o':
+                if token[1] == name:
+                    found = token
+                    break
+            elif token[0] == 'a':
+                if kind == 'a':
+                    found = ['a', name, token[2], None]
+                    break
+                if token[2] == name:
+                    found = ['a', name, True, None]
+                    break
+                return False, left, collected
+        else:
+            return False, left, collected
+        left_ = left[:pos] + left[pos + 1:]
+        if counter is None:
+            return True, left_, collected + [found]
+        increment = 1 if counter is int else (found[2] if hasattr(found[2], 'append') else [found[2]])
+        same_name = [a for a in collected if a[1] == name]
+        if not same_name:
+            found[2] = increment
+            return True, left_, collected + [found]
+        same_name[0][2] += increment
+        return True, left_, collected
+    return match
+
+
+def _one_or_more(child, left, collected):
+    """Match like docopt.OneOrMore.match()."""
+    left_, collected_, previous, matched, times = left, collected, None, True, 0
+    while matched:
+        matched, left_, collected_ = child(left_, collected_)
+        times += 1 if matched else 0
+        if previous == left_:
+            break
+        previous = left_
+    if times >= 1:
+        return True, left_, collected_
+    return False, left, collected
+
+
+def _either(children, left, collected):
+    """Match like docopt.Either.match()."""
+    outcomes = [o for o in (c(left, collected) for c in children) if o[0]]
+    if outcomes:
+        return min(outcomes, key=lambda o: len(o[1]))
+    return False, left, collected
+
+
+$matchers
+
+
+def _from_env(settable, environ):
+    """Get settable values from environment variables."""
+    values, numbered, names = dict(), dict(), set(ENV_NAMES.values())
+    for name, value in (os.environ if environ is None else environ).items():
+        if not name.startswith(ENV_PREFIX):
+            continue
+        values[name] = value
+        base = name.rstrip('0123456789')
+        if base == name or name in names:
+            continue  # Not numbered or belongs to its own option.
+        # Longest option variable name followed only by digits.
+        base = next((name[:i] for i in range(len(name) - 1, len(base) - 1, -1) if name[:i] in names), None)
+        if base is not None and (name[len(base):] == '0' or not name[len(base):].startswith('0')):
+            numbered.setdefault(base, list()).append((int(name[len(base):]), value))
+    defaults = dict()
+    for key in settable:
+        name, kind = ENV_NAMES[key], KINDS[key]
+        if kind == 'list':
+            found = ([values[name]] if name in values else []) + [v for _, v in sorted(numbered.get(name, ()))]
+            if found:
+                defaults[key] = found
+        elif name not in values:
+            continue
+        elif kind == 'count':
+            try:
+                defaults[key] = int(values[name])
+            except (TypeError, ValueError):
+                defaults[key] = 0
+        elif kind == 'bool':
+            defaults[key] = values[name].strip().lower() in ('true', 'yes', 'on', '1')
+        else:
+            defaults[key] = values[name]
+    return defaults
+
+
+def _commands(result):
+    """Commands matched by argv, in argv order. Taken from the first usage case with exactly the matched commands."""
+    matched = set(c for c in COMMANDS if result[c])
+    for order in COMMAND_ORDERS:
+        commands = tuple(c for c in order if c in matched)
+        if len(commands) == len(matched):
+            return commands
+    return tuple(c for c in COMMANDS if c in matched)
+
+
+def _from_file(path, settable, commands):
+    """Get settable values from the config file. [prog run] overrides [prog] when the run command matched."""
+    config = ConfigParser()
+    try:
+        with open(path) as handle:
+            if hasattr(config, 'read_file'):
+                config.read_file(handle, path)
+            else:
+                getattr(config, 'readfp')(handle, path)
+    except Error as exc:
+        raise DocoptcfgFileError('Unable to parse config file.', str(exc), path)
+    except (IOError, OSError) as exc:
+        raise DocoptcfgFileError('Unable to read config file.', str(exc), path)
+    index = dict((tuple(n.split()), n) for n in reversed(config.sections()))
+    words = tuple(SECTION.split())
+    chain = [index[words + commands[:i]] for i in range(len(commands) + 1) if words + commands[:i] in index]
+    if not chain:
+        raise DocoptcfgFileError('Section [{0}] not in config file.'.format(SECTION), file_path=path)
+    defaults = dict()
+    for section in reversed(chain):
+        for key in settable:
+            if key in defaults or not config.has_option(section, key[2:]):
+                continue
+            kind = KINDS[key]
+            if kind == 'list':
+                defaults[key] = config.get(section, key[2:]).strip('\\n').splitlines()
+            elif kind == 'count':
+                try:
+                    defaults[key] = config.getint(section, key[2:])
+                except ValueError as exc:
+                    message = 'Repeatable boolean option "{0}" invalid.'.format(key[2:])
+                    raise DocoptcfgFileError(message, str(exc), path)
+            elif kind == 'bool':
+                try:
+                    defaults[key] = config.getboolean(section, key[2:])
+                except ValueError as exc:
+                    raise DocoptcfgFileError('Boolean option "{0}" invalid.'.format(key[2:]), str(exc), path)
+            else:
+                defaults[key] = str(config.get(section, key[2:]))
+    return defaults
+
+
+def parse(argv=None, help=True, version=None, options_first=False, environ=None):  # pylint: disable=W0622
+    """Parse argv and apply environment variable and config file defaults. Same arguments as docoptcfg().
+
+    :raise DocoptcfgFileError: On any error while trying to read and parse config file (if enabled).
+
+    :param iter argv: CLI arguments. sys.argv[1:] if None.
+    :param bool help: Handle -h/--help.
+    :param version: Printed on --version if not None.
+    :param bool options_first: Options must come before positional arguments.
+    :param dict environ: Mapping to read environment variables from instead of os.environ.
+
+    :return: Same dictionary as docoptcfg().
+    :rtype: dict
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    parsed = _parse_argv(argv.split() if hasattr(argv, 'split') else list(argv), list(OPTIONS), options_first)
+    overridden = set(t[3] for t in parsed if t[0] == 'o')
+    if help and any(t[1] in ('-h', '--help') and t[2] for t in parsed):
+        print(DOC.strip('\\n'))
+        sys.exit()
+    if version and any(t[1] == '--version' and t[2] for t in parsed):
+        print(version)
+        sys.exit()
+    matched, left, collected = _match(parsed, [])
+    if not matched or left:
+        raise DocoptExit()
+    result = Dict((k, list(v) if hasattr(v, 'append') else v) for k, v in DEFAULTS.items())
+    result.update((t[1], t[2]) for t in collected)
+
+    settable = set(KINDS) - overridden
+    if ENV_PREFIX is not None and settable:
+        defaults = _from_env(settable, environ)
+        settable -= set(defaults)
+        result.update(defaults)
+    settable.discard(CONFIG_OPTION)
+    if CONFIG_OPTION is not None and settable and result[CONFIG_OPTION] is not None:
+        result.update(_from_file(result[CONFIG_OPTION], settable, _commands(result)))
+    return result
+''')
+
+
+def generate(doc, env_prefix=None, config_option=None, ignore=None, source='', output=''):
+    """Generate the source code of a standalone module that parses argv the same way docoptcfg() would.
+
+    The usage pattern is turned into one matching function per pattern node, and the option table, environment
+    variable names, and config file value types are precomputed. The module doesn't import docopt or docoptcfg.
+
+    :raise DocoptcfgError: If `config_option` isn't found in docstring.
+
+    :param str doc: Docstring passed to docopt.
+    :param str env_prefix: Enable environment variable support, prefix of said variables.
+    :param str config_option: Enable config file support, docopt option defining path to config file.
+    :param iter ignore: Options to ignore. Default is --help and --version.
+    :param str source: Program the docstring came from, mentioned in the generated module's docstring.
+    :param str output: Generated module's file path, mentioned in its docstring.
+
+    :return: Python source code.
+    :rtype: str
+    """
+    spec = Spec(doc, env_prefix, config_option, ignore)
+    defaults = dict((leaf.name, leaf.value) for leaf in spec.leaves)
+    if spec.config_option is not None and spec.config_option not in defaults:
+        raise DocoptcfgError('Config option {0} not found in docstring.'.format(spec.config_option))
+
+    # One function per pattern node. Leaves shared by pattern.fix() share their function.
+    leaves, parents, names = list(), list(), dict()
+
+    def emit(node):
+        """Generate the matcher of a pattern node and its children, return its function name."""
+        if id(node) in names:
+            return names[id(node)]
+        children = [emit(c) for c in getattr(node, 'children', ())]
+        name = names[id(node)] = '_m{0}'.format(len(names))
+        kind = node.__class__.__name__
+        if not hasattr(node, 'children'):
+            # Counted (0, not False) or collected ([]) when repeatable, like Spec.repeatable.
+            counter = None
+            if hasattr(node.value, 'append'):
+                counter = 'list'
+            elif node.value is not False and node.value == 0:
+                counter = 'int'
+            leaves.append('{0} = _leaf({1!r}, {2!r}, {3})'.format(name, kind[0].lower(), node.name, counter))
+            return name
+        lines = ['', '', 'def {0}(left, collected):'.format(name)]
+        if kind in ('Optional', 'AnyOptions'):
+            lines.extend('    _, left, collected = {0}(left, collected)'.format(c) for c in children)
+            lines.append('    return True, left, collected')
+        elif kind == 'OneOrMore':
+            lines.append('    return _one_or_more({0}, left, collected)'.format(children[0]))
+        elif kind == 'Either':
+            lines.append('    return _either(({0},), left, collected)'.format(', '.join(children)))
+        else:  # Required.
+            lines.append('    left_, collected_ = left, collected')
+            for child in children:
+                lines.append('    matched, left_, collected_ = {0}(left_, collected_)'.format(child))
+                lines.append('    if not matched:')
+                lines.append('        return False, left, collected')
+            lines.append('    return True, left_, collected_')
+        parents.append('\n'.join(lines))
+        return name
+
+    parents.append('\n\n_match = {0}'.format(emit(spec.pattern)))
+
+    kinds = dict()
+    for key in spec.candidates:
+        if key in spec.repeatable:
+            kinds[key] = 'count' if key in spec.booleans else 'list'
+        else:
+            kinds[key] = 'bool' if key in spec.booleans else 'str'
+
+    return GENERATED_TEMPLATE.substitute(
+        command_orders=pprint.pformat(spec.command_orders, width=120),
+        commands=repr(spec.commands),
+        config_option=repr(spec.config_option),
+        defaults=pprint.pformat(defaults, width=120),
+        doc=pprint.pformat(doc, width=120),
+        env_names=pprint.pformat(spec.env_names, width=120),
+        env_prefix=repr(env_prefix),
+        kinds=pprint.pformat(kinds, width=120),
+        matchers='\n'.join(leaves) + '\n' + '\n'.join(parents),
+        options=pprint.pformat([(o.short, o.long, o.argcount, o.value) for o in spec.argv_options], width=120),
+        output=output or '<module>',
+        section=repr(spec.section),
+        source=source or '<docstring>',
+        usage=pprint.pformat(spec.usage, width=120),
+        version=__version__,
+    )
+
+
+def read_docstring(path, variable=None):
+    """Get a program's docstring without importing or running it.
+
+    :raise DocoptcfgError: If the docstring isn't found.
+
+    :param str path: Python source file.
+    :param str variable: Module-level variable holding the docstring. Module docstring if None.
+
+    :return: Docstring.
+    :rtype: str
+    """
+    with open(path) as handle:
+        tree = ast.parse(handle.read(), path)
+    if variable is None:
+        doc = ast.get_docstring(tree, clean=False)
+    else:
+        doc = None
+        for node in tree.body:
+            if node.__class__ is ast.Assign and [getattr(t, 'id', None) for t in node.targets] == [variable]:
+                doc = ast.literal_eval(node.value)
+    if doc is None:
+        raise DocoptcfgError('Docstring not found in {0}.'.format(path))
+    return doc
+
+
+def main(argv=None):
+    """Command line interface. Run with: python -m docoptcfg.
+
+    :param iter argv: CLI arguments. sys.argv[1:] if None.
+    """
+    args = docoptcfg(CLI_DOC, argv)
+    try:
+        doc = read_docstring(args['SOURCE'], args['--variable'])
+        code = generate(doc, args['--env-prefix'], args['--config-option'], args['--ignore'] or None,
+                        args['SOURCE'], args['--output'] or '')
+    except (DocoptcfgError, IOError, SyntaxError, ValueError) as exc:
+        raise SystemExit('ERROR: {0}'.format(exc))
+    if not args['--output']:
+        sys.stdout.write(code)
+        return
+    with open(args['--output'], 'w') as handle:
+        handle.write(code)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,7 @@
 """Importable objects shared by test modules."""
 
+import os
+
 
 DOCSTRING_FAM = """\
 Sync FLAC music to your car's head unit using a FlashAir WiFi SD card.
@@ -67,3 +69,15 @@ EXPECTED_NOT_MULTI = {
     '--key': None,
     '<pos>': '1',
 }
+
+
+def write(path, contents, age=0):
+    """Write a file and give it a distinct mtime.
+
+    :param path: py.path.local instance.
+    :param str contents: File contents.
+    :param int age: Seconds to add to the current mtime.
+    """
+    path.write(contents)
+    stat = path.stat()
+    os.utime(str(path), (stat.atime, stat.mtime + age))
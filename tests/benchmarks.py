@@ -0,0 +1,239 @@
+"""Benchmark docoptcfg scaling with the number of options, environment size, and config file size.
+
+Timings of each code path are saved to a baseline JSON file. Later runs compare against it and exit non-zero when a
+code path got slower than the threshold. With --linear only compile() is timed, exiting non-zero when its time per
+option grew by more than the threshold from the smallest to the largest size.
+
+Usage:
+    benchmarks [options] [--size=NUM]...
+
+Options:
+    -b FILE --baseline=FILE     Baseline JSON file [default: tests/benchmarks_baseline.json].
+    -h --help                   Show this screen.
+    -l --linear                 Check compile() scales linearly. Default sizes are 1000, 2500, 5000, and 10000.
+    -n NUM --size=NUM           Number of options in the generated docstring. Default is 10 to 10000.
+    -s --save                   Save results as the new baseline instead of comparing.
+    -t NUM --threshold=NUM      Fail if slower than baseline by this factor [default: 1.5].
+"""
+
+from __future__ import print_function
+
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import timeit
+
+import docoptcfg
+
+SCENARIOS = ('compile', 'args_only', 'env', 'config', 'all_sources')
+LINEAR_SIZES = (1000, 2500, 5000, 10000)
+SIZES = (10, 100, 1000, 5000, 10000)
+
+
+def make_docstring(size):
+    """Generate a docstring. One in ten options are flags and one in ten are repeatable.
+
+    :param int size: Number of options.
+
+    :return: Docstring.
+    :rtype: str
+    """
+    repeatable = ['[--rep{0}=VAL]...'.format(i) for i in range(0, size, 10)]
+    lines = ['Generated benchmark program.', '', 'Usage:', '    bench [options] <pos>... ' + ' '.join(repeatable), '',
+             'Options:', '    -c FILE --config=FILE   Config file.']
+    for i in range(size):
+        if i % 10 == 0:
+            lines.append('    --rep{0}=VAL   Repeatable option.'.format(i))
+        elif i % 10 == 1:
+            lines.append('    --flag{0}   Flag option.'.format(i))
+        else:
+            lines.append('    --opt{0}=VAL   Option [default: {0}].'.format(i))
+    return '\n'.join(lines) + '\n'
+
+
+def option_names(size):
+    """Long option names without leading dashes, in the order of make_docstring().
+
+    :param int size: Number of options.
+
+    :return: Names.
+    :rtype: list
+    """
+    return [('rep{0}', 'flag{0}', 'opt{0}')[min(i % 10, 2)].format(i) for i in range(size)]
+
+
+def make_environ(size):
+    """Generate a large environment with half of the options set (in groups of ten) and many unrelated variables.
+
+    :param int size: Number of options.
+
+    :return: Environment mapping.
+    :rtype: dict
+    """
+    environ = dict(('UNRELATED_VARIABLE_{0}'.format(i), 'x' * 64) for i in range(max(1000, size * 2)))
+    for i, name in enumerate(option_names(size)):
+        if (i // 10) % 2:
+            continue
+        env_name = 'BENCH_' + name.upper()
+        if name.startswith('rep'):
+            environ.update((env_name + str(j), 'value{0}'.format(j)) for j in range(20))
+        elif name.startswith('flag'):
+            environ[env_name] = 'true'
+        else:
+            environ[env_name] = 'env{0}'.format(i)
+    return environ
+
+
+def make_config(path, size):
+    """Write a config file with many sections and long multi-line values.
+
+    :param str path: Write to this file.
+    :param int size: Number of options.
+    """
+    with open(path, 'w') as handle:
+        for i in range(200):
+            handle.write('[other{0}]\nkey =\n{1}\n'.format(i, '\n'.join('    line{0}'.format(j) for j in range(50))))
+        handle.write('[bench]\n')
+        for name in option_names(size):
+            if name.startswith('rep'):
+                handle.write('{0} =\n{1}\n'.format(name, '\n'.join('    file{0}'.format(j) for j in range(200))))
+            elif name.startswith('flag'):
+                handle.write('{0} = yes\n'.format(name))
+            else:
+                handle.write('{0} = file\n'.format(name))
+
+
+def best_of(func, repeat=3):
+    """Time a function call.
+
+    :param func: Function to call.
+    :param int repeat: Number of timing runs, fastest one wins.
+
+    :return: Seconds per call.
+    :rtype: float
+    """
+    timer = timeit.Timer(func)
+    number = 1
+    while timer.timeit(number) < 0.2 and number < 100000:
+        number *= 10
+    return min(timer.repeat(repeat, number)) / number
+
+
+def run(size, tmpdir):
+    """Time every scenario for one docstring size.
+
+    :param int size: Number of options.
+    :param str tmpdir: Directory for config files.
+
+    :return: Scenario name to seconds per call.
+    :rtype: dict
+    """
+    doc = make_docstring(size)
+    environ = make_environ(size)
+    config = os.path.join(tmpdir, 'bench{0}.ini'.format(size))
+    make_config(config, size)
+    argv = ['1', '2', '--rep0=a', '--rep0=b']
+    argv_config = argv + ['--config', config]
+
+    def compile_cold():
+        """Compile without the cache."""
+        docoptcfg.compile(doc, 'BENCH_', '--config')
+
+    calls = dict(
+        compile=compile_cold,
+        args_only=lambda: docoptcfg.docoptcfg(doc, argv),
+        env=lambda: docoptcfg.docoptcfg(doc, argv, env_prefix='BENCH_', environ=environ),
+        config=lambda: docoptcfg.docoptcfg(doc, argv_config, config_option='--config'),
+        all_sources=lambda: docoptcfg.docoptcfg(doc, argv_config, 'BENCH_', '--config', environ=environ),
+    )
+    results = dict()
+    for scenario in SCENARIOS:
+        calls[scenario]()  # Warm up caches.
+        results[scenario] = best_of(calls[scenario], repeat=1 if scenario == 'compile' else 3)
+    return results
+
+
+def linear(sizes, threshold):
+    """Time compile() per option for each size.
+
+    :param iter sizes: Numbers of options.
+    :param float threshold: Allowed growth factor of the time per option.
+
+    :return: Size to microseconds per option, and a description of the failure (empty string if linear).
+    :rtype: tuple
+    """
+    per_option = dict()
+    for size in sizes:
+        doc = make_docstring(size)
+        per_option[size] = best_of(lambda: docoptcfg.compile(doc, 'BENCH_', '--config')) / size * 1000000
+    smallest, largest = min(per_option), max(per_option)
+    growth = per_option[largest] / per_option[smallest]
+    if growth <= threshold:
+        return per_option, ''
+    return per_option, 'size={0}->{1}: {2:.2f}us -> {3:.2f}us per option ({4:.1f}x)'.format(
+        smallest, largest, per_option[smallest], per_option[largest], growth)
+
+
+def compare(results, baseline, threshold):
+    """Compare results to baseline.
+
+    :param dict results: Size to scenario to seconds.
+    :param dict baseline: Same structure as results.
+    :param float threshold: Allowed slowdown factor.
+
+    :return: Regression descriptions.
+    :rtype: list
+    """
+    regressions = list()
+    for size, scenarios in sorted(results.items(), key=lambda i: int(i[0])):
+        for scenario, seconds in sorted(scenarios.items()):
+            before = baseline.get(size, dict()).get(scenario)
+            if before and seconds > before * threshold:
+                regressions.append('{0} size={1}: {2:.6f}s -> {3:.6f}s ({4:.1f}x)'.format(
+                    scenario, size, before, seconds, seconds / before))
+    return regressions
+
+
+def main():
+    """Main function."""
+    args = docoptcfg.docoptcfg(__doc__, env_prefix='BENCHMARKS_')
+    if args['--linear']:
+        per_option, failure = linear([int(s) for s in args['--size']] or LINEAR_SIZES, float(args['--threshold']))
+        for size, micros in sorted(per_option.items()):
+            print('size={0:<6} compile={1:.2f}us per option'.format(size, micros))
+        if failure:
+            print('NOT LINEAR ' + failure)
+            sys.exit(1)
+        return
+
+    sizes = [int(s) for s in args['--size']] or SIZES
+    tmpdir = tempfile.mkdtemp()
+    results = dict()
+    try:
+        for size in sizes:
+            results[str(size)] = run(size, tmpdir)
+            timings = ' '.join('{0}={1:.6f}s'.format(s, results[str(size)][s]) for s in SCENARIOS)
+            print('size={0:<6} {1}'.format(size, timings))
+    finally:
+        shutil.rmtree(tmpdir)
+
+    if args['--save']:
+        with open(args['--baseline'], 'w') as handle:
+            json.dump(dict(python=platform.python_version(), results=results), handle, indent=2, sort_keys=True)
+            handle.write('\n')
+        return
+
+    with open(args['--baseline']) as handle:
+        baseline = json.load(handle)['results']
+    regressions = compare(results, baseline, float(args['--threshold']))
+    for regression in regressions:
+        print('REGRESSION ' + regression)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
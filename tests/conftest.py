@@ -0,0 +1,11 @@
+"""Fixtures shared by all tests."""
+
+import pytest
+
+from docoptcfg import clear_cache
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    """Start every test with empty process-wide caches."""
+    clear_cache()
@@ -0,0 +1,64 @@
+"""Make sure the benchmark suite keeps working. Doesn't measure anything meaningful."""
+
+import json
+
+import pytest
+
+from docoptcfg import docoptcfg
+from tests import benchmarks
+
+
+def test_generated_inputs(tmpdir):
+    """Test generated docstring, environment, and config file resolve as expected.
+
+    :param tmpdir: pytest fixture.
+    """
+    doc = benchmarks.make_docstring(20)
+    environ = benchmarks.make_environ(20)
+    config = str(tmpdir.join('bench.ini'))
+    benchmarks.make_config(config, 20)
+
+    actual = docoptcfg(doc, ['1', '--config', config], 'BENCH_', '--config', environ=environ)
+    assert actual['--rep0'] == ['value{0}'.format(i) for i in range(20)]  # Env.
+    assert actual['--flag1'] is True
+    assert actual['--opt2'] == 'env2'
+    assert actual['--rep10'] == ['file{0}'.format(i) for i in range(200)]  # Config.
+    assert actual['--flag11'] is True
+    assert actual['--opt12'] == 'file'
+
+
+def test_run(monkeypatch, tmpdir):
+    """Test saving and comparing against a baseline.
+
+    :param monkeypatch: pytest fixture.
+    :param tmpdir: pytest fixture.
+    """
+    baseline = tmpdir.join('baseline.json')
+    monkeypatch.setattr(benchmarks, 'best_of', lambda func, repeat=3: 1.0)
+    monkeypatch.setattr('sys.argv', ['benchmarks', '-n', '10', '-b', str(baseline), '--save'])
+    benchmarks.main()
+    results = json.loads(baseline.read())['results']
+    assert sorted(results['10']) == sorted(benchmarks.SCENARIOS)
+
+    monkeypatch.setattr('sys.argv', ['benchmarks', '-n', '10', '-b', str(baseline)])
+    benchmarks.main()  # No regressions.
+    assert benchmarks.compare({'10': {'env': 2.0}}, results, 1.5) == ['env size=10: 1.000000s -> 2.000000s (2.0x)']
+
+
+def test_linear(monkeypatch, capsys):
+    """Test the scaling check.
+
+    :param monkeypatch: pytest fixture.
+    :param capsys: pytest fixture.
+    """
+    monkeypatch.setattr(benchmarks, 'best_of', lambda func, repeat=3: 1.0)
+    per_option, failure = benchmarks.linear([10, 20], 1.5)
+    assert per_option == {10: 100000.0, 20: 50000.0}
+    assert failure == ''
+
+    seconds = iter([1.0, 100.0])  # Quadratic.
+    monkeypatch.setattr(benchmarks, 'best_of', lambda func, repeat=3: next(seconds))
+    monkeypatch.setattr('sys.argv', ['benchmarks', '--linear', '-n', '10', '-n', '100'])
+    with pytest.raises(SystemExit):
+        benchmarks.main()
+    assert 'NOT LINEAR size=10->100: 100000.00us -> 1000000.00us per option (10.0x)' in capsys.readouterr()[0]
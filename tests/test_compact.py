@@ -0,0 +1,117 @@
+"""Test memory compact sequences for repeatable options."""
+
+import pickle
+
+import pytest
+
+from docoptcfg import CompactList, docoptcfg, docoptcfg_many, text_value
+from tests import DOCSTRING_MULTI, EXPECTED_MULTI
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+@pytest.mark.parametrize('text', [
+    '',
+    '\n\n',
+    'a',
+    '\na\nb\n',
+    'a\r\nb\rc\x0bd\x0ce\x1cf g\n\nh  \n',
+    '\n\n  spaced  \n\n\n',
+])
+@pytest.mark.parametrize('intern', [False, True])
+def test_from_text(text, intern):
+    """Test splitting is the same as strip('\\n').splitlines().
+
+    :param str text: Value.
+    :param bool intern: Store unique values only.
+    """
+    expected = text.strip('\n').splitlines()
+    actual = CompactList.from_text(text, intern)
+    assert list(actual) == expected
+    assert len(actual) == len(expected)
+    assert actual == expected
+    assert expected == actual
+    assert not actual != expected
+    assert repr(actual) == repr(expected)
+    assert [actual[i] for i in range(-len(expected), len(expected))] == expected * 2
+    assert actual[1:] == expected[1:]
+    assert actual[::-2] == expected[::-2]
+    assert pickle.loads(pickle.dumps(actual)) == expected
+
+
+def test_sequence():
+    """Test sequence behavior."""
+    values = ['a', 'bb', '', 'a', 'c']
+    plain, interned = CompactList.from_values(values), CompactList.from_values(iter(values), intern=True)
+    assert plain == interned == values
+    assert plain != values[:-1]
+    assert plain != ['a', 'bb', '', 'a', 'd']
+    assert plain != tuple(values)
+    assert (plain.index('a'), plain.count('a'), 'bb' in plain, 'x' in plain) == (0, 2, True, False)
+    assert interned[0] is interned[3]
+    with pytest.raises(IndexError):
+        plain[5]
+    with pytest.raises(IndexError):
+        interned[-6]
+    with pytest.raises(TypeError):
+        hash(plain)
+    assert CompactList() == []
+
+
+@pytest.mark.parametrize('compact', [True, 'intern'])
+def test_docoptcfg(monkeypatch, tmpdir, compact):
+    """Test repeatable values from environment variables and config files.
+
+    :param monkeypatch: pytest fixture.
+    :param tmpdir: pytest fixture.
+    :param compact: docoptcfg() argument.
+    """
+    config_file = tmpdir.join('config.ini')
+    config_file.write('[my_script]\nflag = 2\nkey = a\n    b\n    a\n')
+    argv = ['1', '--config', str(config_file)]
+
+    actual = docoptcfg(DOCSTRING_MULTI, argv, config_option='--config', compact=compact, result_cache=True)
+    expected = dict(EXPECTED_MULTI, **{'--config': str(config_file), '--flag': 2, '--key': ['a', 'b', 'a']})
+    assert actual == expected
+    assert actual['--key'].__class__ is CompactList
+    assert actual['<pos>'].__class__ is list  # From argv.
+
+    monkeypatch.setenv('MULTI_KEY', 'e')
+    monkeypatch.setenv('MULTI_KEY2', 'e2')
+    actual = docoptcfg(DOCSTRING_MULTI, argv, 'MULTI_', '--config', compact=compact)
+    assert actual == dict(expected, **{'--key': ['e', 'e2']})
+    assert actual['--key'].__class__ is CompactList
+    assert docoptcfg(DOCSTRING_MULTI, argv, 'MULTI_', '--config', compact=compact, lazy=True)['--key'] == ['e', 'e2']
+
+    actual = list(docoptcfg_many(DOCSTRING_MULTI, [argv, ['2']], config_option='--config', compact=compact))
+    assert actual == [expected, dict(EXPECTED_MULTI, **{'<pos>': ['2']})]
+    assert actual[0]['--key'].__class__ is CompactList
+
+
+@pytest.mark.skipif(tracemalloc is None, reason='Requires tracemalloc.')
+def test_memory():
+    """Test peak memory is close to the size of the data."""
+    value = '\n' + '\n'.join('/music/album{0}/track{1}.flac'.format(i // 10, i % 10) for i in range(100000))
+
+    def peak(compact):
+        """Peak bytes allocated converting the value.
+
+        :param compact: text_value() argument.
+
+        :return: Result and peak.
+        :rtype: tuple
+        """
+        tracemalloc.start()
+        try:
+            result = text_value('--file', value, set(), set(['--file']), compact=compact)
+            return result, tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    expected, list_peak = peak(False)
+    actual, compact_peak = peak(True)
+    assert actual == expected
+    assert compact_peak < len(value) < list_peak / 3
@@ -0,0 +1,60 @@
+"""Test process-wide config file cache."""
+
+import os
+
+from docoptcfg import clear_cache, ConfigCache, CONFIG_CACHE, docoptcfg
+from tests import DOCSTRING_FAM, EXPECTED_FAM
+
+
+def test_hits(tmpdir):
+    """Test repeat calls skip reading the file until it changes.
+
+    :param tmpdir: pytest fixture.
+    """
+    config_file = tmpdir.join('config.ini')
+    config_file.write('[FlashAirMusic]\nthreads = 2\n')
+    argv = ['run', '-c', str(config_file)]
+    expected = EXPECTED_FAM.copy()
+    expected['--config'] = str(config_file)
+    expected['--threads'] = '2'
+
+    assert docoptcfg(DOCSTRING_FAM, argv, config_option='-c') == expected
+    assert (CONFIG_CACHE.hits, CONFIG_CACHE.misses) == (0, 1)
+    assert docoptcfg(DOCSTRING_FAM, argv, config_option='-c') == expected
+    assert (CONFIG_CACHE.hits, CONFIG_CACHE.misses) == (1, 1)
+
+    # Modify file.
+    config_file.write('[FlashAirMusic]\nthreads = 30\n')
+    stat = config_file.stat()
+    os.utime(str(config_file), (stat.atime, stat.mtime + 10))
+    expected['--threads'] = '30'
+    assert docoptcfg(DOCSTRING_FAM, argv, config_option='-c') == expected
+    assert (CONFIG_CACHE.hits, CONFIG_CACHE.misses) == (1, 2)
+    assert len(CONFIG_CACHE) == 1
+
+    clear_cache()
+    assert (CONFIG_CACHE.hits, CONFIG_CACHE.misses, len(CONFIG_CACHE)) == (0, 0, 0)
+
+
+def test_lru(tmpdir):
+    """Test least recently used entries are evicted.
+
+    :param tmpdir: pytest fixture.
+    """
+    cache = ConfigCache(maxsize=2)
+    paths = list()
+    for name in ('a', 'b', 'c'):
+        config_file = tmpdir.join('{0}.ini'.format(name))
+        config_file.write('[{0}]\n'.format(name))
+        paths.append(str(config_file))
+
+    cache.get(paths[0])
+    cache.get(paths[1])
+    cache.get(paths[0])  # b is now least recently used.
+    cache.get(paths[2])
+    assert len(cache) == 2
+    assert (cache.hits, cache.misses) == (1, 3)
+
+    assert cache.get(paths[0]).has_section('a')
+    assert cache.get(paths[1]).has_section('b')
+    assert (cache.hits, cache.misses) == (2, 4)
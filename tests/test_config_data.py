@@ -0,0 +1,99 @@
+"""Test config file contents already in memory."""
+
+import io
+
+import pytest
+
+from docoptcfg import ConfigParser, docoptcfg, docoptcfg_many, DocoptcfgFileError, IniSource, read_config_data, Stats
+from tests import DOCSTRING_FAM, DOCSTRING_MULTI, EXPECTED_FAM, EXPECTED_MULTI
+
+CONTENTS = '[FlashAirMusic]\r\nthreads = 4\nlog = /mem.log\nverbose = true\n'
+
+
+def parser():
+    """ConfigParser instance with CONTENTS loaded.
+
+    :return: ConfigParser instance.
+    :rtype: ConfigParser
+    """
+    config = ConfigParser()
+    config.read_string(CONTENTS)
+    return config
+
+
+@pytest.mark.parametrize('config', [
+    lambda: CONTENTS,
+    lambda: CONTENTS.encode('utf-8'),
+    lambda: io.StringIO(CONTENTS),
+    lambda: io.BytesIO(CONTENTS.encode('utf-8')),
+    parser,
+])
+def test_types(config):
+    """Test every kind of in memory config.
+
+    :param config: Function returning docoptcfg() argument.
+    """
+    stats = Stats()
+    actual = docoptcfg(DOCSTRING_FAM, ['run', '-l', '/argv.log'], 'FAM_', '--config', config=config(),
+                       environ={'FAM_THREADS': '8'}, stats=stats)
+    assert actual == dict(EXPECTED_FAM, **{'--log': '/argv.log', '--threads': '8', '--verbose': True})
+    assert stats.counters['files_opened'] == 0
+
+    # Used instead of --config.
+    actual = docoptcfg(DOCSTRING_FAM, ['run', '-c', '/missing.ini'], config_option='--config', config=config())
+    assert actual == dict(EXPECTED_FAM, **{'--config': '/missing.ini', '--log': '/mem.log', '--threads': '4',
+                                           '--verbose': True})
+
+    # Without config_option.
+    actual = docoptcfg(DOCSTRING_FAM, ['run'], config=config(), lazy=True)
+    assert actual['--threads'] == '4'
+
+
+def test_shared():
+    """Test contents are parsed once per IniSource and reused."""
+    source = IniSource(config=io.StringIO(u'[my_script]\nflag = 2\nkey = a\n    b\n'))
+    assert source.parsed() is source.parsed()
+    argv_iter = [['1'], ['2', '--flag']]
+    actual = [docoptcfg(DOCSTRING_MULTI, argv, sources=[source]) for argv in argv_iter]
+    assert actual == [dict(EXPECTED_MULTI, **{'--flag': 2, '--key': ['a', 'b']}),
+                      dict(EXPECTED_MULTI, **{'<pos>': ['2'], '--flag': 1, '--key': ['a', 'b']})]
+    assert list(docoptcfg_many(DOCSTRING_MULTI, argv_iter, config=b'[my_script]\nflag = 2\nkey = a\n    b\n')) == actual
+
+
+def test_errors():
+    """Test parse errors, missing section, and values of the wrong type."""
+    with pytest.raises(DocoptcfgFileError) as exc:
+        docoptcfg(DOCSTRING_MULTI, ['1'], config='no section\n')
+    assert (exc.value.message, exc.value.FILE_PATH) == ('Unable to parse config file.', '<config>')
+
+    handle = io.StringIO(u'[other]\nflag = 1\n')
+    handle.name = 'bundle/app.ini'
+    with pytest.raises(DocoptcfgFileError) as exc:
+        docoptcfg(DOCSTRING_MULTI, ['1'], config=handle)
+    assert (exc.value.message, exc.value.FILE_PATH) == ('Section [my_script] not in config file.', 'bundle/app.ini')
+
+    with pytest.raises(DocoptcfgFileError) as exc:
+        docoptcfg(DOCSTRING_MULTI, ['1'], config='[my_script]\nflag = maybe\n')
+    assert exc.value.message == 'Repeatable boolean option "flag" invalid.'
+
+    # ConfigParser instances pass through unchanged.
+    config = parser()
+    assert read_config_data(config) is config
+
+
+@pytest.mark.parametrize('encode', [False, True])
+def test_line_breaks(tmpdir, encode):
+    """Test only newlines end lines, the same as reading the file from disk.
+
+    :param tmpdir: pytest fixture.
+    :param bool encode: Pass bytes instead of str.
+    """
+    contents = u'[FlashAirMusic]\nmac-addr = a\x0bb\x0cc\x1cd\r\nthreads = 2\rquiet = true\n'
+    config_file = tmpdir.join('config.ini')
+    config_file.write_binary(contents.encode('utf-8'))
+    expected = docoptcfg(DOCSTRING_FAM, ['run', '-c', str(config_file)], config_option='-c')
+    assert (expected['--mac-addr'], expected['--threads'], expected['--quiet']) == ('a\x0bb\x0cc\x1cd', '2', True)
+
+    actual = docoptcfg(DOCSTRING_FAM, ['run', '-c', str(config_file)], config_option='-c',
+                       config=contents.encode('utf-8') if encode else contents)
+    assert actual == expected
@@ -242,3 +242,67 @@ def test_multi(monkeypatch, tmpdir, multi):
 
     actual = docoptcfg(docstring, config_option='--config')
     assert actual == expected
+
+
+@pytest.mark.parametrize('reader', [None, 'stream', 'mmap'])
+@pytest.mark.parametrize('newline', ['\n', '\r\n'])
+def test_section_readers(tmpdir, reader, newline):
+    """Test reading only the program's section gives the same results as parsing the whole file.
+
+    :param tmpdir: pytest fixture.
+    :param str reader: config_reader argument.
+    :param str newline: Line endings in the config file.
+    """
+    config_file = tmpdir.join('config.ini')
+    config_file.write_binary(newline.join([
+        '# Comment.',
+        '[other]',
+        'threads = 1',
+        '[FlashAirMusic]',
+        'ffmpeg-bin = ffmpeg',
+        '    continued [not a header]',
+        '[other2]',
+        'this is not = valid [ini',
+        '[FlashAirMusic2]',
+        'threads = 9',
+        'mac-addr = ',
+        '',
+    ]).encode('ascii'))
+    argv = ['run', '-c', str(config_file)]
+
+    actual = docoptcfg(DOCSTRING_FAM, argv, config_option='-c', config_reader=reader)
+    expected = EXPECTED_FAM.copy()
+    expected['--config'] = str(config_file)
+    expected['--ffmpeg-bin'] = 'ffmpeg\ncontinued [not a header]'
+    assert actual == expected
+
+    # Only newlines end lines, not every str.splitlines() boundary.
+    config_file.write_binary(b'[FlashAirMusic]\nmac-addr = a\x0bb\x0cc\x1cd\r\nthreads = 2\rquiet = true\n')
+    actual = docoptcfg(DOCSTRING_FAM, argv, config_option='-c', config_reader=reader)
+    assert (actual['--mac-addr'], actual['--threads'], actual['--quiet']) == ('a\x0bb\x0cc\x1cd', '2', True)
+
+    # Duplicate section.
+    config_file.write('[FlashAirMusic]\nthreads = 1\n[other]\n[FlashAirMusic]\nquiet = true\n')
+    with pytest.raises(DocoptcfgFileError) as exc:
+        docoptcfg(DOCSTRING_FAM, argv, config_option='-c', config_reader=reader)
+    assert exc.value.message == 'Unable to parse config file.'
+
+    # Missing section.
+    config_file.write('[other]\nthreads = 1\n')
+    with pytest.raises(DocoptcfgFileError) as exc:
+        docoptcfg(DOCSTRING_FAM, argv, config_option='-c', config_reader=reader)
+    assert exc.value.message == 'Section [FlashAirMusic] not in config file.'
+
+    # No section headers.
+    for contents in ('threads = 1\n[FlashAirMusic]\n', '\x00\x00\x00\x00'):
+        config_file.write(contents)
+        with pytest.raises(DocoptcfgFileError) as exc:
+            docoptcfg(DOCSTRING_FAM, argv, config_option='-c', config_reader=reader)
+        assert exc.value.message == 'Unable to parse config file.'
+        assert 'File contains no section headers.' in exc.value.original_error
+
+
+def test_section_reader_invalid():
+    """Test invalid config_reader value."""
+    with pytest.raises(DocoptcfgError):
+        docoptcfg(DOCSTRING_FAM, ['run'], config_option='-c', config_reader='invalid')
@@ -0,0 +1,66 @@
+"""Test the directory-per-option source."""
+
+import os
+
+import pytest
+
+from docoptcfg import DirSource, docoptcfg, DocoptcfgFileError, EnvSource, Stats
+from tests import DOCSTRING_FAM, DOCSTRING_MULTI, DOCSTRING_NOT_MULTI, EXPECTED_FAM, EXPECTED_MULTI
+
+
+def test_values(tmpdir):
+    """Test file names map to options and only unresolved options are read.
+
+    :param tmpdir: pytest fixture.
+    """
+    tmpdir.join('threads').write('4\n')
+    tmpdir.join('mac-addr').write('AA:BB')
+    tmpdir.join('verbose').write('yes\n')
+    tmpdir.join('log').write('/dir.log\n')
+    tmpdir.join('help').write('true')  # Ignored option.
+    tmpdir.join('unrelated').write('x')
+    tmpdir.mkdir('quiet')  # Not a file.
+    os.symlink(str(tmpdir.join('log')), str(tmpdir.join('working-dir')))
+
+    stats = Stats()
+    sources = [EnvSource('FAM_', {'FAM_LOG': '/env.log'}), DirSource(str(tmpdir))]
+    actual = docoptcfg(DOCSTRING_FAM, ['run', '-v'], sources=sources, stats=stats)
+    expected = dict(EXPECTED_FAM, **{
+        '--log': '/env.log',
+        '--mac-addr': 'AA:BB',
+        '--threads': '4',
+        '--verbose': True,
+        '--working-dir': '/dir.log',
+    })
+    assert actual == expected
+    assert (stats.counters['files_opened'], stats.counters['from_dir']) == (3, 3)
+
+
+def test_repeatable(tmpdir):
+    """Test repeatable options and booleans.
+
+    :param tmpdir: pytest fixture.
+    """
+    tmpdir.join('flag').write('3\n')
+    tmpdir.join('key').write('a\nb\n')
+    assert docoptcfg(DOCSTRING_MULTI, ['1'], sources=[DirSource(str(tmpdir))]) == dict(EXPECTED_MULTI, **{
+        '--flag': 3,
+        '--key': ['a', 'b'],
+    })
+
+    with pytest.raises(DocoptcfgFileError) as exc:
+        docoptcfg(DOCSTRING_NOT_MULTI, ['1'], sources=[DirSource(str(tmpdir))])
+    assert exc.value.message == 'Boolean option "flag" invalid.'
+    assert exc.value.FILE_PATH == str(tmpdir.join('flag'))
+
+
+def test_missing(tmpdir):
+    """Test missing directories.
+
+    :param tmpdir: pytest fixture.
+    """
+    path = str(tmpdir.join('missing'))
+    assert docoptcfg(DOCSTRING_MULTI, ['1'], sources=[DirSource(path, optional=True)]) == EXPECTED_MULTI
+    with pytest.raises(DocoptcfgFileError) as exc:
+        docoptcfg(DOCSTRING_MULTI, ['1'], sources=[DirSource(path)])
+    assert exc.value.message == 'Unable to read config directory.'
@@ -0,0 +1,113 @@
+"""Test caching compiled docstrings on disk."""
+
+import json
+import os
+
+import pytest
+
+import docoptcfg as module
+from docoptcfg import docoptcfg
+from tests import DOCSTRING_FAM, DOCSTRING_MULTI, EXPECTED_FAM, EXPECTED_MULTI
+
+
+@pytest.fixture(autouse=True)
+def spec_cache(monkeypatch):
+    """Start each test with an empty in-memory cache so the disk cache is used.
+
+    :param monkeypatch: pytest fixture.
+    """
+    monkeypatch.setattr(module, 'SPEC_CACHE', dict())
+
+
+def test_round_trip(tmpdir):
+    """Test loaded Spec instances behave like freshly compiled ones.
+
+    :param tmpdir: pytest fixture.
+    """
+    cache = str(tmpdir.join('cache'))
+    expected = EXPECTED_MULTI.copy()
+    expected['<pos>'] = ['1', '2']
+    expected['--flag'] = 2
+    expected['--key'] = ['a', 'b']
+    argv = ['1', '2', '--key=a', '--key=b', '--flag', '--flag']
+
+    assert docoptcfg(DOCSTRING_MULTI, argv, env_prefix='MULTI_', disk_cache=cache) == expected
+    assert len(os.listdir(cache)) == 1
+
+    module.SPEC_CACHE.clear()
+    spec = module.get_spec(DOCSTRING_MULTI, 'MULTI_', disk_cache=cache)
+    compiled = module.compile(DOCSTRING_MULTI, 'MULTI_')
+    assert spec.dump() == compiled.dump()
+    assert spec.parse(argv) == expected
+    with pytest.raises(SystemExit):
+        spec.parse(['--flag'])
+
+    # Leaves shared by fix() must stay shared.
+    doc = 'Usage:\n    prog (--key=VAL | <pos>) --key=VAL\n'
+    spec = module.Spec.load(json.loads(json.dumps(module.compile(doc).dump())))
+    leaves = spec.pattern.flat()
+    assert len(leaves) == 3
+    assert len(set(id(l) for l in leaves)) == 2
+    assert spec.parse(['--key=a', '--key=b']) == {'--key': ['a', 'b'], '<pos>': None}
+
+
+def test_short_options(tmpdir):
+    """Test short options and config_option mapping survive the round trip.
+
+    :param tmpdir: pytest fixture.
+    """
+    cache = str(tmpdir)
+    config = tmpdir.join('config.ini')
+    config.write('[FlashAirMusic]\nthreads = 2\n')
+    expected = dict(EXPECTED_FAM, **{'--config': str(config), '--threads': '2', '--verbose': True})
+
+    for _ in range(2):
+        module.SPEC_CACHE.clear()
+        assert docoptcfg(DOCSTRING_FAM, ['run', '-vc', str(config)], config_option='-c', disk_cache=cache) == expected
+
+
+def test_default_directory(monkeypatch, tmpdir):
+    """Test disk_cache=True uses $XDG_CACHE_HOME.
+
+    :param monkeypatch: pytest fixture.
+    :param tmpdir: pytest fixture.
+    """
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir))
+    assert docoptcfg(DOCSTRING_FAM, ['run'], disk_cache=True) == EXPECTED_FAM
+    assert len(tmpdir.join('docoptcfg').listdir()) == 1
+
+
+@pytest.mark.parametrize('mode', ['corrupt', 'stale', 'tampered'])
+def test_invalid(tmpdir, mode):
+    """Test bad cache files are ignored and replaced.
+
+    :param tmpdir: pytest fixture.
+    :param str mode: How to break the cache file.
+    """
+    cache = str(tmpdir)
+    module.get_spec(DOCSTRING_FAM, disk_cache=cache)
+    path = tmpdir.listdir()[0]
+    if mode == 'corrupt':
+        path.write('{"format": ')
+    else:
+        data = json.loads(path.read())
+        if mode == 'stale':
+            data['version'] = '0.0.0'
+        else:
+            data['key'][0] = 'Usage: other'
+        path.write(json.dumps(data))
+
+    module.SPEC_CACHE.clear()
+    assert module.load_spec(str(path), (DOCSTRING_FAM, None, None, None, None)) is None
+    assert docoptcfg(DOCSTRING_FAM, ['run'], disk_cache=cache) == EXPECTED_FAM
+    assert module.load_spec(str(path), (DOCSTRING_FAM, None, None, None, None)) is not None
+
+
+def test_unwritable(tmpdir):
+    """Test write errors don't break parsing.
+
+    :param tmpdir: pytest fixture.
+    """
+    cache = tmpdir.join('file')
+    cache.write('')
+    assert docoptcfg(DOCSTRING_FAM, ['run'], disk_cache=str(cache.join('sub'))) == EXPECTED_FAM
@@ -4,8 +4,14 @@ import os
 
 import pytest
 
-from docoptcfg import docoptcfg
+try:
+    from collections import ChainMap
+except ImportError:
+    ChainMap = None
+
+from docoptcfg import docoptcfg, docoptcfg_many, generate
 from tests import DOCSTRING_FAM, DOCSTRING_MULTI, DOCSTRING_NOT_MULTI, EXPECTED_FAM, EXPECTED_MULTI, EXPECTED_NOT_MULTI
+from tests.test_generate import load
 
 
 @pytest.mark.parametrize('set_config,set_verbose', [
@@ -174,14 +180,14 @@ def test_multi(monkeypatch, multi, set_key, set_key0, set_key1):
     elif set_keys == (False, False, False):
         expected['--key'] = []
     elif set_keys == (False, False, True):
-        expected['--key'] = []
+        expected['--key'] = [set_key1]
     elif set_keys == (False, True, True):
         expected['--key'] = [set_key0, set_key1]
 
     elif set_keys == (False, True, False):
         expected['--key'] = [set_key0]
     elif set_keys == (True, False, True):
-        expected['--key'] = [set_key]
+        expected['--key'] = [set_key, set_key1]
 
     else:
         raise NotImplementedError
@@ -191,17 +197,66 @@ def test_multi(monkeypatch, multi, set_key, set_key0, set_key1):
 
 
 def test_multi_a_lot(monkeypatch):
-    """Test setting >99 env variables. For branch coverage.
+    """Test setting >99 and sparse env variables.
 
     :param monkeypatch: pytest fixture.
     """
     expected = EXPECTED_MULTI.copy()
+    expected['--key'] = list()
     monkeypatch.setenv('MULTI_FLAG', '1')  # Ignore.
-    for i in range(100):
+    for i in list(range(100)) + [150, 1000]:
         monkeypatch.setenv('MULTI_KEY{0}'.format(i), str(i))
-        if i < 99:
-            expected['--key'].append(str(i))
+        expected['--key'].append(str(i))
+    monkeypatch.setenv('MULTI_KEY007', 'ignored')  # Zero padded.
     actual = docoptcfg(DOCSTRING_MULTI, ['1'], ignore=('-h', '-V', '--flag'), env_prefix='MULTI_')
     assert actual == expected
-    assert 'MULTI_KEY99' in os.environ
-    assert '99' not in actual['--key']
+
+
+def test_environ(monkeypatch):
+    """Test reading env variables from a mapping instead of os.environ.
+
+    :param monkeypatch: pytest fixture.
+    """
+    monkeypatch.setenv('FAM_VERBOSE', 'true')  # Ignored.
+    environ = {'FAM_THREADS': '3', 'FAM_QUIET': 'yes', 'OTHER_LOG': 'ignored.log'}
+    expected = EXPECTED_FAM.copy()
+    expected['--threads'] = '3'
+    expected['--quiet'] = True
+    assert docoptcfg(DOCSTRING_FAM, ['run'], env_prefix='FAM_', environ=environ) == expected
+
+
+@pytest.mark.skipif(ChainMap is None, reason='Python 3.3+ only.')
+def test_environ_overlay(monkeypatch):
+    """Test reading env variables from a ChainMap overlay on top of os.environ.
+
+    :param monkeypatch: pytest fixture.
+    """
+    monkeypatch.setenv('FAM_VERBOSE', 'true')
+    monkeypatch.setenv('FAM_THREADS', '3')
+    expected = EXPECTED_FAM.copy()
+    expected['--threads'] = '5'
+    expected['--verbose'] = True
+    environ = ChainMap({'FAM_THREADS': '5'}, os.environ)
+    assert docoptcfg(DOCSTRING_FAM, ['run'], env_prefix='FAM_', environ=environ) == expected
+
+
+def test_multi_digits(monkeypatch):
+    """Test repeatable option names ending with digits.
+
+    :param monkeypatch: pytest fixture.
+    """
+    for name, value in (('PROG_KEY1', 'a'), ('PROG_KEY10', 'b'), ('PROG_KEY12', 'c'), ('PROG_KEY100', 'd'),
+                        ('PROG_KEY', 'e'), ('PROG_KEY7', 'f')):
+        monkeypatch.setenv(name, value)
+    doc = 'Usage:\n    prog [--key1=VAL]... [--key=VAL]...\n\nOptions:\n    --key1=VAL  Key1.\n    --key=VAL  Key.\n'
+    actual = docoptcfg(doc, [], env_prefix='PROG_')
+    # Each variable feeds one option. PROG_KEY1x belongs to --key1 (PROG_KEY100 is zero padded), PROG_KEY7 to --key.
+    assert actual == {'--key1': ['a', 'b', 'c'], '--key': ['e', 'f']}
+    assert load(generate(doc, env_prefix='PROG_'))['parse']([]) == actual
+
+    # Exact variable of --key1 only.
+    doc = 'Usage:\n    prog [--key=VAL]... [--key1=VAL]\n\nOptions:\n    --key=VAL  Key.\n    --key1=VAL  Key1.\n'
+    actual = docoptcfg(doc, [], env_prefix='PROG_', environ={'PROG_KEY1': 'only-for-key1'})
+    assert actual == {'--key': [], '--key1': 'only-for-key1'}
+    actual = list(docoptcfg_many(doc, [[]], env_prefix='PROG_', environ={'PROG_KEY1': 'only-for-key1'}))
+    assert actual == [{'--key': [], '--key1': 'only-for-key1'}]
@@ -0,0 +1,158 @@
+"""Test generated standalone parser modules against docoptcfg()."""
+
+import pytest
+
+import docoptcfg as module
+from docoptcfg import docoptcfg, DocoptcfgError, generate
+from tests import benchmarks, DOCSTRING_FAM, DOCSTRING_MULTI, DOCSTRING_NOT_MULTI
+
+DOCSTRINGS = [
+    DOCSTRING_FAM,
+    DOCSTRING_MULTI,
+    DOCSTRING_NOT_MULTI,
+    benchmarks.__doc__,
+    benchmarks.make_docstring(20),
+    module.CLI_DOC,
+    'Usage:\n    prog [options] <pos>...\n\nOptions:\n    --flag  Flag.\n    --key=VAL  Key.\n',
+    'Usage:\n    prog [--key1=VAL]... [--key=VAL]...\n\nOptions:\n    --key1=VAL  Key1.\n    --key=VAL  Key.\n',
+    'Usage:\n    prog (--key=VAL | <pos>) --key=VAL\n',
+    'Usage:\n    prog go [-v]... <x> [<y>]\n    prog (stop | halt) [--all] [--config=FILE]\n    prog -h\n\nOptions:\n'
+    '    -c FILE --config=FILE  Config.\n    -h --help  Help.\n',
+]
+ARGVS = [
+    [],
+    ['1'],
+    ['1', '2', '--key=a', '--key', 'b', '--flag', '--flag'],
+    ['1', '--flag=x'],
+    ['1', '--', '--flag'],
+    ['--flag'],
+    ['run'],
+    ['run', '-vq', '-t4', '-f/tmp/ffmpeg'],
+    ['run', '--thr=3', '--verb'],
+    ['run', '-c'],
+    ['--unknown'],
+    ['-x', '1'],
+    ['-n', '10', '-n', '20', '-s'],
+    ['1', '--rep0=a', '--rep0', 'b', '--flag1', '--opt2=x', '--flag11'],
+    ['compile', 'x.py', '-i', '--a', '--ignore=--b', '-oout.py'],
+    ['go', '-vv', 'x'],
+    ['halt', '--all', '--config', 'FILE'],
+    ['stop', 'extra'],
+    ['-h'],
+    ['--help'],
+]
+
+
+def outcome(func, *args, **kwargs):
+    """Call a parser, turning exceptions into comparable values.
+
+    :param func: docoptcfg() or generated parse().
+    :param iter args: Positional arguments.
+    :param dict kwargs: Keyword arguments.
+
+    :return: Result dictionary or exception details.
+    """
+    try:
+        return func(*args, **kwargs)
+    except SystemExit as exc:
+        return 'exit', exc.code
+    except Exception as exc:  # pylint: disable=broad-except
+        if exc.__class__.__name__ != 'DocoptcfgFileError':
+            raise
+        return 'file', exc.args
+
+
+def load(code):
+    """Execute generated source code.
+
+    :param str code: Output of generate().
+
+    :return: Module namespace.
+    :rtype: dict
+    """
+    namespace = dict(__name__='generated')
+    exec(code, namespace)  # pylint: disable=exec-used
+    return namespace
+
+
+@pytest.mark.parametrize('doc', DOCSTRINGS, ids=[str(i) for i in range(len(DOCSTRINGS))])
+@pytest.mark.parametrize('env_prefix,config', [(None, False), ('P_', False), (None, True), ('P_', True)])
+def test_docstrings(capsys, tmpdir, doc, env_prefix, config):
+    """Test every test docstring gives the same results with docoptcfg() and its generated module.
+
+    :param capsys: pytest fixture.
+    :param tmpdir: pytest fixture.
+    :param str doc: Docstring.
+    :param str env_prefix: Enable environment variables.
+    :param bool config: Enable config files.
+    """
+    config_option = '--config' if config and '--config=' in doc else None
+    config_file = tmpdir.join('config.ini')
+    lines = ['[{0}]'.format(s) for s in ('FlashAirMusic', 'my_script', 'prog', 'bench', 'docoptcfg')]
+    values = 'flag = true\nkey = f1\n    f2\nverbose = 2\nthreads = 16\nkey1 = k\nrep0 = r\nflag1 = yes\nopt2 = o\n'
+    config_file.write(''.join(l + '\n' + values for l in lines))
+    environ = {
+        'P_CONFIG': str(config_file),
+        'P_FLAG': 'yes',
+        'P_KEY': 'e',
+        'P_KEY2': 'e2',
+        'P_KEY12': 'e12',
+        'P_MUSIC_SOURCE': '/music',
+        'P_QUIET': 'true',
+        'P_REP1': 'r1',
+        'P_VERBOSE': '1',
+    }
+
+    namespace = load(generate(doc, env_prefix, config_option))
+    assert 'docopt' not in namespace
+    assert 'docoptcfg' not in namespace
+    parse = namespace['parse']
+    for argv in ARGVS + [['run', '-c', str(config_file)], ['1', '--config', str(tmpdir.join('missing.ini'))]]:
+        expected = outcome(docoptcfg, doc, list(argv), env_prefix, config_option, environ=environ)
+        expected_output = capsys.readouterr()
+        actual = outcome(parse, list(argv), environ=environ)
+        assert actual == expected, argv
+        assert capsys.readouterr() == expected_output
+    assert parse.__module__ == 'generated'
+
+
+def test_config_errors(tmpdir):
+    """Test config file errors match.
+
+    :param tmpdir: pytest fixture.
+    """
+    parse = load(generate(DOCSTRING_MULTI, config_option='--config'))['parse']
+    config_file = tmpdir.join('config.ini')
+    for contents in ('', 'x', '[my_script]\nflag = maybe\n', '[my_script]\nflag = 1\n', '[other]\n'):
+        config_file.write(contents)
+        argv = ['1', '--config', str(config_file)]
+        expected = outcome(docoptcfg, DOCSTRING_MULTI, argv, config_option='--config')
+        assert outcome(parse, argv) == expected
+        config_file.write(contents.replace('[my_script]\nflag', '[my_script]\nkey'))
+        expected = outcome(docoptcfg, DOCSTRING_NOT_MULTI, argv, config_option='--config')
+        assert outcome(load(generate(DOCSTRING_NOT_MULTI, config_option='--config'))['parse'], argv) == expected
+
+
+def test_cli(capsys, tmpdir):
+    """Test python -m docoptcfg compile.
+
+    :param capsys: pytest fixture.
+    :param tmpdir: pytest fixture.
+    """
+    source = tmpdir.join('prog.py')
+    source.write('#!/usr/bin/env python\n"""{0}"""\nOTHER = {1!r}\n'.format(DOCSTRING_FAM, DOCSTRING_MULTI))
+    output = tmpdir.join('_prog_cli.py')
+
+    module.main(['compile', str(source), '-e', 'FAM_', '-c', '--config', '-o', str(output)])
+    assert output.read() == generate(DOCSTRING_FAM, 'FAM_', '--config', None, str(source), str(output))
+    assert load(output.read())['parse'](['run'], environ=dict()) == docoptcfg(DOCSTRING_FAM, ['run'])
+
+    module.main(['compile', '--variable', 'OTHER', str(source)])
+    assert capsys.readouterr()[0] == generate(DOCSTRING_MULTI, source=str(source))
+
+    with pytest.raises(SystemExit) as exc:
+        module.main(['compile', '-v', 'MISSING', str(source)])
+    assert str(exc.value.code) == 'ERROR: Docstring not found in {0}.'.format(source)
+
+    with pytest.raises(DocoptcfgError):
+        generate(DOCSTRING_FAM, config_option='--missing')
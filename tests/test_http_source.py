@@ -0,0 +1,183 @@
+"""Test the remote HTTP key-value store source against a local server."""
+
+import json
+import threading
+
+import pytest
+
+import docoptcfg as module
+from docoptcfg import docoptcfg, DocoptcfgFileError, EnvSource, HttpSource, Stats
+from tests import DOCSTRING_FAM, DOCSTRING_MULTI, EXPECTED_FAM, EXPECTED_MULTI
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Key-value store batch endpoint."""
+
+    protocol_version = 'HTTP/1.1'  # Keep-alive.
+    timeout = 5
+
+    def setup(self):
+        """Count connections."""
+        BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        """Return requested keys the store has."""
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])).decode('utf-8'))
+        self.server.requests.append(body['keys'])
+        if self.server.status == 200:
+            data = json.dumps(dict((k, v) for k, v in self.server.store.items() if k in body['keys']))
+        else:
+            data = 'error'
+        data = data.encode('utf-8')
+        self.send_response(self.server.status)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *_):
+        """Quiet."""
+
+
+class Server(ThreadingMixIn, HTTPServer):
+    """One thread per connection so idle keep-alive connections don't block others."""
+
+    daemon_threads = True
+
+
+@pytest.fixture
+def server():
+    """In-process HTTP server.
+
+    :return: Server instance with store, status, requests, and connections attributes, and url.
+    """
+    httpd = Server(('127.0.0.1', 0), Handler)
+    httpd.store, httpd.status, httpd.requests, httpd.connections = dict(), 200, list(), 0
+    httpd.url = 'http://127.0.0.1:{0}/v1/batch'.format(httpd.server_address[1])
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_values(server):
+    """Test one batched request for all settable options and value conversion.
+
+    :param server: Local HTTP server.
+    """
+    server.store.update({'fam/threads': 4, 'fam/verbose': 'yes', 'fam/quiet': True, 'fam/log': '/remote.log',
+                         'fam/help': 'true', 'my_script/flag': '2', 'my_script/key': ['a', 'b']})
+    source = HttpSource(server.url, prefix='fam/')
+    stats = Stats()
+    actual = docoptcfg(DOCSTRING_FAM, ['run', '-l', '/argv.log'], sources=[source], stats=stats)
+    assert actual == dict(EXPECTED_FAM, **{'--log': '/argv.log', '--quiet': True, '--threads': '4', '--verbose': True})
+    assert len(server.requests) == 1
+    expected = ['fam/' + k[2:] for k in EXPECTED_FAM if k.startswith('--') and k not in ('--help', '--version')]
+    assert sorted(server.requests[0]) == sorted(expected)
+    assert (stats.counters['from_remote'], stats.counters['remote_requests']) == (3, 1)
+
+    source = HttpSource(server.url, prefix='my_script/')
+    actual = docoptcfg(DOCSTRING_MULTI, ['1'], sources=[source])
+    assert actual == dict(EXPECTED_MULTI, **{'--flag': 2, '--key': ['a', 'b']})
+
+    # Environment variables first.
+    actual = docoptcfg(DOCSTRING_MULTI, ['1'], sources=[EnvSource('MULTI_', {'MULTI_FLAG': '1'}), source])
+    assert actual == dict(EXPECTED_MULTI, **{'--flag': 1, '--key': ['a', 'b']})
+
+
+def test_keep_alive(server):
+    """Test requests reuse one connection.
+
+    :param server: Local HTTP server.
+    """
+    source = HttpSource(server.url, ttl=0, stale=0)
+    for _ in range(3):
+        assert docoptcfg(DOCSTRING_MULTI, ['1'], sources=[source]) == EXPECTED_MULTI
+    assert (len(server.requests), server.connections, source.requests) == (3, 1, 3)
+
+    # Server closed idle connection.
+    source.close()
+    assert docoptcfg(DOCSTRING_MULTI, ['1'], sources=[source]) == EXPECTED_MULTI
+    assert server.connections == 2
+
+
+def test_ttl(monkeypatch, server):
+    """Test fresh, stale, and expired responses.
+
+    :param monkeypatch: pytest fixture.
+    :param server: Local HTTP server.
+    """
+    now = [100.0]
+    monkeypatch.setattr(module, 'TIMER', lambda: now[0])
+    server.store['threads'] = '1'
+    source = HttpSource(server.url, ttl=10, stale=20)
+
+    assert docoptcfg(DOCSTRING_FAM, ['run'], sources=[source])['--threads'] == '1'
+    server.store['threads'] = '2'
+    now[0] = 109
+    assert docoptcfg(DOCSTRING_FAM, ['run'], sources=[source])['--threads'] == '1'  # Fresh.
+    assert len(server.requests) == 1
+
+    now[0] = 115
+    stats = Stats()
+    assert docoptcfg(DOCSTRING_FAM, ['run'], sources=[source], stats=stats)['--threads'] == '1'  # Stale.
+    assert (stats.counters['cache_hits'], stats.counters['cache_misses']) == (1, 0)
+    for thread in list(source._refreshing.values()):  # pylint: disable=protected-access
+        thread.join()
+    assert len(server.requests) == 2
+    assert docoptcfg(DOCSTRING_FAM, ['run'], sources=[source])['--threads'] == '2'  # Refreshed.
+
+    server.store['threads'] = '3'
+    now[0] = 200
+    assert docoptcfg(DOCSTRING_FAM, ['run'], sources=[source])['--threads'] == '3'  # Expired.
+    assert len(server.requests) == 3
+
+    # Failed refresh keeps the stale response until it expires.
+    server.status = 500
+    now[0] = 215
+    assert docoptcfg(DOCSTRING_FAM, ['run'], sources=[source])['--threads'] == '3'
+    for thread in list(source._refreshing.values()):  # pylint: disable=protected-access
+        thread.join()
+    now[0] = 230
+    with pytest.raises(DocoptcfgFileError):
+        docoptcfg(DOCSTRING_FAM, ['run'], sources=[source])
+
+
+def test_errors(server):
+    """Test error responses, invalid values, and connection errors.
+
+    :param server: Local HTTP server.
+    """
+    server.status = 500
+    with pytest.raises(DocoptcfgFileError) as exc:
+        docoptcfg(DOCSTRING_MULTI, ['1'], sources=[HttpSource(server.url)])
+    assert (exc.value.message, exc.value.original_error, exc.value.FILE_PATH) == (
+        'Unable to fetch remote config.', 'HTTP 500', server.url)
+
+    server.status = 200
+    server.store['flag'] = 'maybe'
+    with pytest.raises(DocoptcfgFileError) as exc:
+        docoptcfg(DOCSTRING_MULTI, ['1'], sources=[HttpSource(server.url)])
+    assert exc.value.message == 'Repeatable boolean option "flag" invalid.'
+
+    server.store['flag'] = 2
+    with pytest.raises(DocoptcfgFileError) as exc:
+        docoptcfg(DOCSTRING_MULTI.replace('...', ''), ['1'], sources=[HttpSource(server.url)])
+    assert exc.value.message == 'Boolean option "flag" invalid.'
+    assert docoptcfg(DOCSTRING_MULTI, ['1'], sources=[HttpSource(server.url)])['--flag'] == 2
+
+    url = server.url
+    server.shutdown()
+    server.server_close()
+    with pytest.raises(DocoptcfgFileError) as exc:
+        docoptcfg(DOCSTRING_MULTI, ['1'], sources=[HttpSource(url)])
+    assert exc.value.message == 'Unable to fetch remote config.'
@@ -0,0 +1,169 @@
+"""Test layered config files with includes and conf.d directories."""
+
+import os
+import threading
+
+import pytest
+
+import docoptcfg as module
+from docoptcfg import docoptcfg, DocoptcfgFileError, EnvSource, IniSource, LayeredSource, Stats
+from tests import DOCSTRING_FAM, DOCSTRING_MULTI, EXPECTED_FAM, EXPECTED_MULTI, write
+
+
+@pytest.fixture
+def layers(tmpdir):
+    """System file, conf.d directory, and user file.
+
+    :param tmpdir: pytest fixture.
+
+    :return: LayeredSource paths.
+    :rtype: list
+    """
+    etc = tmpdir.mkdir('etc')
+    write(etc.join('prog.ini'), '[FlashAirMusic]\nthreads = 1\nlog = /system.log\nquiet = true\nverbose = true\n')
+    conf_d = etc.mkdir('prog.d')
+    write(conf_d.join('10-threads.ini'), '[FlashAirMusic]\nthreads = 2\n')
+    write(conf_d.join('20-threads.ini'), '[FlashAirMusic]\nthreads = 3\nmac-addr = AA\n')
+    write(conf_d.join('30-other.ini'), '[other]\nthreads = 99\n')
+    write(conf_d.join('README'), 'Not a config file.')
+    write(tmpdir.join('user.ini'), '[FlashAirMusic]\nquiet = false\n')
+    return [str(etc.join('prog.ini')), str(conf_d.join('*.ini')), str(tmpdir.join('user.ini')),
+            str(tmpdir.join('missing.ini'))]
+
+
+@pytest.mark.parametrize('max_workers', [1, 8])
+def test_precedence(layers, max_workers):
+    """Test later layers override earlier ones.
+
+    :param list layers: LayeredSource paths.
+    :param int max_workers: LayeredSource argument.
+    """
+    sources = [EnvSource('FAM_', {'FAM_VERBOSE': 'false'}), LayeredSource(layers, max_workers=max_workers)]
+    actual = docoptcfg(DOCSTRING_FAM, ['run', '-l', '/argv.log'], sources=sources)
+    assert actual == dict(EXPECTED_FAM, **{'--log': '/argv.log', '--mac-addr': 'AA', '--threads': '3'})
+
+    # Reversed.
+    actual = docoptcfg(DOCSTRING_FAM, ['run'], sources=[LayeredSource(layers[::-1], max_workers=max_workers)])
+    assert actual == dict(EXPECTED_FAM, **{'--log': '/system.log', '--mac-addr': 'AA', '--quiet': True,
+                                           '--threads': '1', '--verbose': True})
+
+
+def test_include(tmpdir):
+    """Test include directives, relative paths, and include loops.
+
+    :param tmpdir: pytest fixture.
+    """
+    write(tmpdir.join('main.ini'), '[my_script]\ninclude = conf.d/*.ini\n    extra.ini\nflag = 1\nkey = main\n')
+    conf_d = tmpdir.mkdir('conf.d')
+    write(conf_d.join('a.ini'), '[my_script]\nflag = 2\ninclude = ../main.ini\n')  # Loop.
+    write(tmpdir.join('extra.ini'), '[my_script]\nkey = x\n    y\n')
+    os.symlink(str(tmpdir.join('extra.ini')), str(conf_d.join('b.ini')))  # Same inode as extra.ini.
+
+    source = LayeredSource([str(tmpdir.join('main.ini'))])
+    actual = docoptcfg(DOCSTRING_MULTI, ['1'], sources=[source])
+    assert actual == dict(EXPECTED_MULTI, **{'--flag': 2, '--key': ['x', 'y']})
+    layers = [p for p, _, _ in source.layers('my_script', None)]
+    assert layers == [str(tmpdir.join(p)) for p in ('main.ini', 'conf.d/a.ini', 'conf.d/b.ini')]
+
+    # Disabled.
+    actual = docoptcfg(DOCSTRING_MULTI, ['1'], sources=[LayeredSource([str(tmpdir.join('main.ini'))], include=None)])
+    assert actual == dict(EXPECTED_MULTI, **{'--flag': 1, '--key': ['main']})
+
+
+def test_memoized(tmpdir, layers):
+    """Test unchanged files aren't parsed again and the merged section is reused.
+
+    :param tmpdir: pytest fixture.
+    :param list layers: LayeredSource paths.
+    """
+    source = LayeredSource(layers)
+    stats = Stats()
+    assert docoptcfg(DOCSTRING_FAM, ['run'], sources=[source], stats=stats)['--threads'] == '3'
+    assert (stats.counters['files_opened'], stats.counters['cache_misses']) == (5, 5)
+    merged = source.merged('FlashAirMusic', None)
+
+    stats = Stats()
+    assert docoptcfg(DOCSTRING_FAM, ['run'], sources=[source], stats=stats)['--threads'] == '3'
+    assert (stats.counters['files_opened'], stats.counters['cache_hits']) == (0, 5)
+    assert source.merged('FlashAirMusic', None) is merged
+
+    write(tmpdir.join('etc', 'prog.d', '40-threads.ini'), '[FlashAirMusic]\nthreads = 4\n', 10)
+    stats = Stats()
+    assert docoptcfg(DOCSTRING_FAM, ['run'], sources=[source], stats=stats)['--threads'] == '4'
+    assert (stats.counters['files_opened'], stats.counters['cache_hits']) == (1, 5)
+    assert source.merged('FlashAirMusic', None) is not merged
+
+
+def test_concurrent(monkeypatch, layers):
+    """Test files are read in more than one thread.
+
+    :param monkeypatch: pytest fixture.
+    :param list layers: LayeredSource paths.
+    """
+    threads = set()
+    barrier = threading.Barrier(3) if hasattr(threading, 'Barrier') else None
+    read_config = module.read_config
+    fingerprint = module.ConfigCache.fingerprint
+
+    def overlap(path):
+        """Make the three conf.d stat() and read calls overlap since pool threads may be reused."""
+        if barrier is not None and os.path.basename(os.path.dirname(path)) == 'prog.d':
+            barrier.wait(5)
+
+    def record(path, stats=None):
+        """Record thread."""
+        overlap(path)
+        threads.add(threading.current_thread().ident)
+        return read_config(path, stats)
+
+    def wait(path):
+        """Wait for other stat() calls."""
+        overlap(path)
+        return fingerprint(path)
+
+    monkeypatch.setattr(module, 'read_config', record)
+    monkeypatch.setattr(module.ConfigCache, 'fingerprint', staticmethod(wait))
+    assert docoptcfg(DOCSTRING_FAM, ['run'], sources=[LayeredSource(layers)])['--threads'] == '3'
+    assert len(threads) > 1
+
+
+@pytest.mark.skipif(module.ThreadPoolExecutor is None, reason='Requires concurrent.futures.')
+def test_pool(monkeypatch, layers):
+    """Test one thread pool is created per source and reused by every lookup.
+
+    :param monkeypatch: pytest fixture.
+    :param list layers: LayeredSource paths.
+    """
+    pools = list()
+    executor = module.ThreadPoolExecutor
+    monkeypatch.setattr(module, 'ThreadPoolExecutor', lambda *args: pools.append(executor(*args)) or pools[-1])
+    source = LayeredSource(layers)
+    for _ in range(3):
+        assert docoptcfg(DOCSTRING_FAM, ['run'], sources=[source])['--threads'] == '3'
+    assert len(pools) == 1
+    assert docoptcfg(DOCSTRING_FAM, ['run'], sources=[LayeredSource(layers, max_workers=1)])['--threads'] == '3'
+    assert len(pools) == 1
+
+
+def test_errors(tmpdir):
+    """Test parse errors and values of the wrong type name the file.
+
+    :param tmpdir: pytest fixture.
+    """
+    good, bad = tmpdir.join('good.ini'), tmpdir.join('bad.ini')
+    write(good, '[my_script]\nflag = 1\n')
+    write(bad, 'no section\n')
+    with pytest.raises(DocoptcfgFileError) as exc:
+        docoptcfg(DOCSTRING_MULTI, ['1'], sources=[LayeredSource([str(good), str(bad)])])
+    assert (exc.value.message, exc.value.FILE_PATH) == ('Unable to parse config file.', str(bad))
+
+    write(bad, '[my_script]\nflag = maybe\n', 10)
+    with pytest.raises(DocoptcfgFileError) as exc:
+        docoptcfg(DOCSTRING_MULTI, ['1'], sources=[LayeredSource([str(good), str(bad)])])
+    assert (exc.value.message, exc.value.FILE_PATH) == ('Repeatable boolean option "flag" invalid.', str(bad))
+
+    # Config option file first, then layers.
+    write(bad, '[my_script]\nflag = 5\n', 20)
+    sources = [IniSource(), LayeredSource([str(bad)])]
+    actual = docoptcfg(DOCSTRING_MULTI, ['1', '--config', str(good)], config_option='--config', sources=sources)
+    assert actual['--flag'] == 1
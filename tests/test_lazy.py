@@ -0,0 +1,102 @@
+"""Test lazily resolved results."""
+
+import pytest
+
+from docoptcfg import CONFIG_CACHE, docoptcfg, DocoptcfgFileError, LazyResult
+from tests import DOCSTRING_FAM, DOCSTRING_MULTI
+
+
+class RecordingEnviron(dict):
+    """Environment mapping recording which variables were looked up."""
+
+    def __init__(self, *args, **kwargs):
+        """Constructor."""
+        super(RecordingEnviron, self).__init__(*args, **kwargs)
+        self.looked_up = list()
+        self.scans = 0
+
+    def __contains__(self, key):
+        """Record lookup."""
+        self.looked_up.append(key)
+        return super(RecordingEnviron, self).__contains__(key)
+
+    def items(self):
+        """Record scan."""
+        self.scans += 1
+        return super(RecordingEnviron, self).items()
+
+
+@pytest.mark.parametrize('argv', [
+    ['run'],
+    ['run', '-vq', '-t4'],
+    ['run', '-c', 'CONFIG'],
+    ['run', '-c', 'CONFIG', '--threads=2', '-s', '/src'],
+])
+@pytest.mark.parametrize('env_config', [False, True])
+def test_same_result(tmpdir, argv, env_config):
+    """Test reading every option gives the same result as eager resolution.
+
+    :param tmpdir: pytest fixture.
+    :param list argv: CLI arguments.
+    :param bool env_config: Config file path comes from an environment variable.
+    """
+    config_file = tmpdir.join('config.ini')
+    config_file.write('[FlashAirMusic]\nmac-addr = AA:BB\nthreads = 8\nverbose = true\nlog = /log\n')
+    argv = [str(config_file) if a == 'CONFIG' else a for a in argv]
+    environ = {'FAM_LOG': '/env.log', 'FAM_QUIET': 'no', 'FAM_MUSIC_SOURCE': '/music'}
+    if env_config:
+        environ['FAM_CONFIG'] = str(config_file)
+
+    expected = docoptcfg(DOCSTRING_FAM, argv, env_prefix='FAM_', config_option='--config', environ=environ)
+    actual = docoptcfg(DOCSTRING_FAM, argv, env_prefix='FAM_', config_option='--config', environ=environ, lazy=True)
+    assert actual.__class__ is LazyResult
+    assert dict(actual) == expected
+    assert actual == expected
+    assert repr(actual) == repr(expected)
+    assert sorted(actual) == sorted(expected)
+    assert len(actual) == len(expected)
+
+
+def test_on_demand(tmpdir):
+    """Test environment variables and the config file are only read when needed.
+
+    :param tmpdir: pytest fixture.
+    """
+    config_file = tmpdir.join('config.ini')
+    config_file.write('[my_script]\nflag = 3\nkey = a\n    b\n')
+    environ = RecordingEnviron(MULTI_CONFIG=str(config_file), MULTI_KEY2='e2')
+
+    actual = docoptcfg(DOCSTRING_MULTI, ['1', '--flag'], env_prefix='MULTI_', config_option='--config',
+                       environ=environ, lazy=True)
+    assert environ.looked_up == []
+    assert actual['<pos>'] == ['1']
+    assert actual['--flag'] == 1  # From argv.
+    assert environ.looked_up == []
+    assert CONFIG_CACHE.misses == 0
+
+    assert actual['--key'] == ['e2']  # List values need a scan of the environment.
+    assert environ.scans == 1
+    assert CONFIG_CACHE.misses == 0
+
+    actual = docoptcfg(DOCSTRING_MULTI, ['1'], env_prefix='MULTI_', config_option='--config', environ=environ,
+                       lazy=True)
+    assert actual['--flag'] == 3
+    assert environ.looked_up == ['MULTI_FLAG', 'MULTI_CONFIG']
+    assert (CONFIG_CACHE.hits, CONFIG_CACHE.misses) == (0, 1)
+    assert actual['--flag'] == 3  # Memoized.
+    assert environ.looked_up == ['MULTI_FLAG', 'MULTI_CONFIG']
+
+
+def test_errors(tmpdir):
+    """Test config file errors are raised when a value from it is read.
+
+    :param tmpdir: pytest fixture.
+    """
+    argv = ['run', '-c', str(tmpdir.join('missing.ini')), '-v']
+    actual = docoptcfg(DOCSTRING_FAM, argv, config_option='--config', lazy=True)
+    assert actual['--verbose'] is True
+    assert actual['--config'] == str(tmpdir.join('missing.ini'))
+    with pytest.raises(DocoptcfgFileError):
+        actual['--threads']
+    with pytest.raises(DocoptcfgFileError):
+        dict(actual)
@@ -0,0 +1,88 @@
+"""Test resolving many argv lists against one docstring."""
+
+import pickle
+
+import docopt
+import pytest
+
+from docoptcfg import clear_cache, CONFIG_CACHE, docoptcfg, docoptcfg_many, DocoptcfgExit, DocoptcfgFileError
+from tests import DOCSTRING_MULTI, EXPECTED_MULTI
+
+try:
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+except ImportError:
+    ProcessPoolExecutor = ThreadPoolExecutor = None
+
+
+def argv_lists(config_file, count):
+    """Generate argv lists.
+
+    :param config_file: Path to config file.
+    :param int count: Number of lists.
+
+    :return: Yields lists.
+    """
+    for i in range(count):
+        yield [str(i), '--config', str(config_file)] + ['--key=k{0}'.format(i)] * (i % 2)
+
+
+@pytest.mark.parametrize('executor_class', ['', 'thread', 'process'])
+def test_many(monkeypatch, tmpdir, executor_class):
+    """Compare to docoptcfg() results.
+
+    :param monkeypatch: pytest fixture.
+    :param tmpdir: pytest fixture.
+    :param str executor_class: Run in a thread or process pool.
+    """
+    if executor_class and ThreadPoolExecutor is None:
+        pytest.skip('concurrent.futures not available.')
+    config_file = tmpdir.join('config.ini')
+    config_file.write('[my_script]\nkey =\n    a\n    b\n')
+    monkeypatch.setenv('MULTI_FLAG', '2')
+
+    expected = [docoptcfg(DOCSTRING_MULTI, a, env_prefix='MULTI_', config_option='--config')
+                for a in argv_lists(config_file, 50)]
+    assert expected[0]['--key'] == ['a', 'b']
+    assert expected[1]['--key'] == ['k1']
+
+    clear_cache()
+    kwargs = dict(env_prefix='MULTI_', config_option='--config', chunksize=7, prefetch=2)
+    if not executor_class:
+        results = docoptcfg_many(DOCSTRING_MULTI, argv_lists(config_file, 50), **kwargs)
+        assert next(results) == expected[0]  # Streaming.
+        assert list(results) == expected[1:]
+        assert (CONFIG_CACHE.hits, CONFIG_CACHE.misses) == (0, 1)  # Read once.
+        return
+
+    executor_class = ThreadPoolExecutor if executor_class == 'thread' else ProcessPoolExecutor
+    with executor_class(max_workers=2) as executor:
+        actual = list(docoptcfg_many(DOCSTRING_MULTI, argv_lists(config_file, 50), executor=executor, **kwargs))
+    assert actual == expected
+
+
+def test_errors(tmpdir):
+    """Test raising or returning exceptions.
+
+    :param tmpdir: pytest fixture.
+    """
+    config_file = tmpdir.join('config.ini')
+    config_file.write('[my_script]\nflag = invalid\n')
+    argv_iter = [['1'], [], ['1', '--config', str(config_file)]]
+
+    results = docoptcfg_many(DOCSTRING_MULTI, argv_iter, config_option='--config')
+    expected = EXPECTED_MULTI.copy()
+    assert next(results) == expected
+    with pytest.raises(docopt.DocoptExit):
+        next(results)
+
+    results = list(docoptcfg_many(DOCSTRING_MULTI, argv_iter, config_option='--config', return_exceptions=True))
+    assert results[0] == expected
+    assert results[1].__class__ is DocoptcfgExit
+    assert results[2].__class__ is DocoptcfgFileError
+
+    # Exceptions survive pickling (process pools).
+    exc = pickle.loads(pickle.dumps(results[2]))
+    assert (exc.message, exc.FILE_PATH) == (results[2].message, str(config_file))
+    assert exc.original_error == results[2].original_error
+    exc = pickle.loads(pickle.dumps(results[1]))
+    assert exc.code == results[1].code
@@ -0,0 +1,80 @@
+"""Test @path response file expansion."""
+
+import pytest
+
+from docoptcfg import compile as compile_doc, docoptcfg, expand_response_files, TokenQueue
+from tests import DOCSTRING_FAM, DOCSTRING_MULTI, EXPECTED_FAM, EXPECTED_MULTI
+
+
+def test_expand(tmpdir):
+    """Test one argument per line, nested files, and arguments that aren't response files.
+
+    :param tmpdir: pytest fixture.
+    """
+    nested = tmpdir.join('nested.args')
+    nested.write('--key=n1\n--key\nn 2\n')
+    args = tmpdir.join('args')
+    args.write('--key=a\r\n\n@{0}\n--flag'.format(nested))
+    tmpdir.join('empty').write('')
+
+    argv = ['1', '@' + str(args), '@', '@' + str(tmpdir.join('empty')), '--flag']
+    assert list(expand_response_files(argv)) == ['1', '--key=a', '--key=n1', '--key', 'n 2', '--flag', '@', '--flag']
+
+    argv = ['1', '@' + str(args), '@', '--flag']
+    actual = docoptcfg(DOCSTRING_MULTI, argv, response_files=True)
+    assert actual == dict(EXPECTED_MULTI, **{'<pos>': ['1', '@'], '--flag': 2, '--key': ['a', 'n1', 'n 2']})
+
+    # Blank lines aren't empty arguments.
+    args.write('--key=a\n\n--key=b\n\n\n')
+    actual = docoptcfg(DOCSTRING_MULTI, ['1', '@' + str(args)], response_files=True)
+    assert actual == dict(EXPECTED_MULTI, **{'<pos>': ['1'], '--key': ['a', 'b']})
+
+    # Disabled by default.
+    assert docoptcfg(DOCSTRING_MULTI, ['@' + str(args)])['<pos>'] == ['@' + str(args)]
+
+
+def test_errors(capsys, tmpdir):
+    """Test missing and recursive response files.
+
+    :param capsys: pytest fixture.
+    :param tmpdir: pytest fixture.
+    """
+    missing = str(tmpdir.join('missing'))
+    with pytest.raises(SystemExit) as exc:
+        docoptcfg(DOCSTRING_MULTI, ['1', '@' + missing], response_files=True)
+    assert str(exc.value.code).startswith('Unable to read response file {0}: '.format(missing))
+    assert str(exc.value.code).endswith('Usage:\n    my_script <pos>... [--config=FILE] [--flag]... [--key=VAL]...')
+
+    loop = tmpdir.join('loop')
+    loop.write('--flag\n@{0}\n'.format(loop))
+    with pytest.raises(SystemExit) as exc:
+        docoptcfg(DOCSTRING_MULTI, ['1', '@' + str(loop)], response_files=True)
+    assert str(exc.value.code).startswith('Response file {0} includes itself.'.format(loop))
+    assert capsys.readouterr() == ('', '')
+
+
+def test_large(tmpdir):
+    """Test many arguments from one file.
+
+    :param tmpdir: pytest fixture.
+    """
+    values = ['file{0}.txt'.format(i) for i in range(5000)]
+    args = tmpdir.join('args')
+    args.write(''.join('--key={0}\n'.format(v) for v in values))
+    spec = compile_doc(DOCSTRING_MULTI)
+    docopt_dict, overridden = spec.parse_argv(['1', '@' + str(args)], response_files=True)
+    assert docopt_dict['--key'] == values
+    assert overridden == set(['--key'])
+
+
+def test_token_queue():
+    """Test TokenQueue behaves like docopt.TokenStream."""
+    tokens = TokenQueue(iter(['a', 'b']), SystemExit)
+    assert (tokens.error, tokens.current(), tokens.move(), tokens.move()) == (SystemExit, 'a', 'a', 'b')
+    assert (tokens.current(), tokens.move(), list(tokens)) == (None, None, [])
+
+    # Strings are split like docopt.docopt(doc, 'run --threads 3') does.
+    assert list(TokenQueue(' run  --threads 3\n', SystemExit)) == ['run', '--threads', '3']
+    expected = dict(EXPECTED_FAM, **{'--threads': '3'})
+    assert docoptcfg(DOCSTRING_FAM, 'run --threads 3', env_prefix='FAM_') == expected
+    assert docoptcfg(DOCSTRING_FAM, 'run --threads 3', env_prefix='FAM_', response_files=True) == expected
@@ -0,0 +1,107 @@
+"""Test caching resolved results by input fingerprint."""
+
+import os
+
+import pytest
+
+from docoptcfg import CONFIG_CACHE, docoptcfg, DocoptcfgFileError, RESULT_CACHE, ResultCache
+from tests import DOCSTRING_FAM, DOCSTRING_MULTI, EXPECTED_FAM, EXPECTED_MULTI
+
+
+def test_hits(monkeypatch):
+    """Test identical inputs are served from the cache and changed inputs aren't.
+
+    :param monkeypatch: pytest fixture.
+    """
+    monkeypatch.setenv('FAM_VERBOSE', 'true')
+    monkeypatch.setenv('OTHER_QUIET', 'true')
+    expected = dict(EXPECTED_FAM, **{'--verbose': True})
+
+    assert docoptcfg(DOCSTRING_FAM, ['run'], env_prefix='FAM_', result_cache=True) == expected
+    assert docoptcfg(DOCSTRING_FAM, ['run'], env_prefix='FAM_', result_cache=True) == expected
+    assert (RESULT_CACHE.hits, RESULT_CACHE.misses) == (1, 1)
+
+    # Unrelated variables don't matter.
+    monkeypatch.setenv('OTHER_QUIET', 'false')
+    assert docoptcfg(DOCSTRING_FAM, ['run'], env_prefix='FAM_', result_cache=True) == expected
+    assert (RESULT_CACHE.hits, RESULT_CACHE.misses) == (2, 1)
+
+    # Prefixed variables and argv do.
+    monkeypatch.setenv('FAM_QUIET', 'true')
+    expected['--quiet'] = True
+    assert docoptcfg(DOCSTRING_FAM, ['run'], env_prefix='FAM_', result_cache=True) == expected
+    expected['--threads'] = '4'
+    assert docoptcfg(DOCSTRING_FAM, ['run', '-t4'], env_prefix='FAM_', result_cache=True) == expected
+    assert (RESULT_CACHE.hits, RESULT_CACHE.misses, len(RESULT_CACHE)) == (2, 3, 3)
+
+
+def test_mutation():
+    """Test mutating a returned dictionary doesn't modify the cache."""
+    for _ in range(3):
+        actual = docoptcfg(DOCSTRING_MULTI, ['1'], result_cache=True)
+        assert actual == EXPECTED_MULTI
+        actual['<pos>'].append('mutated')
+        actual['--flag'] = 5
+    assert RESULT_CACHE.hits == 2
+
+
+def test_config_file(tmpdir):
+    """Test the config file is validated by stat and then by hash.
+
+    :param tmpdir: pytest fixture.
+    """
+    config_file = tmpdir.join('config.ini')
+    config_file.write('[FlashAirMusic]\nthreads = 2\n')
+    argv = ['run', '-c', str(config_file)]
+    expected = dict(EXPECTED_FAM, **{'--config': str(config_file), '--threads': '2'})
+
+    assert docoptcfg(DOCSTRING_FAM, argv, config_option='-c', result_cache=True) == expected
+    assert docoptcfg(DOCSTRING_FAM, argv, config_option='-c', result_cache=True) == expected
+    assert (RESULT_CACHE.hits, RESULT_CACHE.misses, CONFIG_CACHE.misses) == (1, 1, 1)
+
+    # Touched but same contents.
+    stat = config_file.stat()
+    os.utime(str(config_file), (stat.atime, stat.mtime + 10))
+    assert docoptcfg(DOCSTRING_FAM, argv, config_option='-c', result_cache=True) == expected
+    assert (RESULT_CACHE.hits, RESULT_CACHE.misses, CONFIG_CACHE.misses) == (2, 1, 1)
+
+    # Modified.
+    config_file.write('[FlashAirMusic]\nthreads = 30\n')
+    os.utime(str(config_file), (stat.atime, stat.mtime + 20))
+    expected['--threads'] = '30'
+    assert docoptcfg(DOCSTRING_FAM, argv, config_option='-c', result_cache=True) == expected
+    assert (RESULT_CACHE.hits, RESULT_CACHE.misses, CONFIG_CACHE.misses) == (2, 2, 2)
+
+    # Deleted.
+    config_file.remove()
+    with pytest.raises(DocoptcfgFileError):
+        docoptcfg(DOCSTRING_FAM, argv, config_option='-c', result_cache=True)
+
+
+def test_directory(tmpdir):
+    """Test results persist in a directory across ResultCache instances (i.e. processes).
+
+    :param tmpdir: pytest fixture.
+    """
+    cache = str(tmpdir.join('cache'))
+    expected = EXPECTED_MULTI.copy()
+    expected['<pos>'] = ['1', '2']
+    expected['--key'] = ['a']
+
+    first = ResultCache(directory=cache)
+    assert docoptcfg(DOCSTRING_MULTI, ['1', '2', '--key=a'], result_cache=first) == expected
+    assert (first.hits, first.misses) == (0, 1)
+
+    second = ResultCache(directory=cache)
+    actual = docoptcfg(DOCSTRING_MULTI, ['1', '2', '--key=a'], result_cache=second)
+    assert actual == expected
+    assert (second.hits, second.misses) == (1, 0)
+    assert RESULT_CACHE.hits == RESULT_CACHE.misses == 0
+
+
+def test_errors():
+    """Test errors aren't cached."""
+    for _ in range(2):
+        with pytest.raises(SystemExit):
+            docoptcfg(DOCSTRING_MULTI, ['--flag'], result_cache=True)
+    assert (RESULT_CACHE.hits, RESULT_CACHE.misses, len(RESULT_CACHE)) == (0, 2, 0)
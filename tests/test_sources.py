@@ -0,0 +1,130 @@
+"""Test the value source pipeline."""
+
+import pytest
+
+from docoptcfg import DictSource, docoptcfg, docoptcfg_many, DocoptcfgFileError, EnvSource, IniSource, Source, Stats
+from tests import DOCSTRING_FAM, DOCSTRING_MULTI, EXPECTED_FAM, EXPECTED_MULTI
+
+
+class RecordingSource(Source):
+    """Custom source recording which options it was asked for."""
+
+    PHASE = 'recording'
+    COUNTER = 'from_recording'
+
+    def __init__(self, mapping):
+        """Constructor.
+
+        :param dict mapping: Option long names to values.
+        """
+        self.mapping = mapping
+        self.asked = list()
+
+    def values(self, spec, keys, docopt_dict, stats=None):
+        """Record and look up keys.
+
+        :param Spec spec: Compiled docstring.
+        :param iter keys: Option long names still unresolved.
+        :param dict docopt_dict: Values resolved so far.
+        :param Stats stats: Collect counters in this instance.
+        """
+        self.asked.append(sorted(keys))
+        return dict((k, v) for k, v in self.mapping.items() if k in keys)
+
+
+def test_priority(tmpdir):
+    """Test earlier sources win and later sources are only asked for what's left.
+
+    :param tmpdir: pytest fixture.
+    """
+    config_file = tmpdir.join('config.ini')
+    config_file.write('[FlashAirMusic]\nthreads = 8\nlog = /file.log\nquiet = true\n')
+    environ = {'FAM_THREADS': '2', 'FAM_LOG': '/env.log'}
+    custom = RecordingSource({'--threads': '1', '--log': '/custom.log', '--mac-addr': 'AA:BB'})
+    sources = [DictSource({'--threads': '4'}), custom, EnvSource(environ=environ), IniSource()]
+    argv = ['run', '-v', '-c', str(config_file)]
+
+    stats = Stats()
+    actual = docoptcfg(DOCSTRING_FAM, argv, env_prefix='FAM_', config_option='-c', sources=sources, stats=stats)
+    expected = dict(EXPECTED_FAM, **{
+        '--config': str(config_file),
+        '--log': '/custom.log',
+        '--mac-addr': 'AA:BB',
+        '--quiet': True,
+        '--threads': '4',
+        '--verbose': True,
+    })
+    assert actual == expected
+    assert '--threads' not in custom.asked[0]
+    assert '--verbose' not in custom.asked[0]
+    assert [stats.counters[c] for c in ('from_dict', 'from_recording', 'from_env', 'from_file')] == [1, 2, 0, 1]
+    assert sorted(stats.timings) == ['argv', 'compile', 'config', 'dict', 'env', 'recording']
+    assert 'from_recording=2' in stats.report()
+
+    # Reversed: the config file comes first.
+    actual = docoptcfg(DOCSTRING_FAM, argv, env_prefix='FAM_', config_option='-c', sources=sources[::-1])
+    assert (actual['--threads'], actual['--log'], actual['--mac-addr']) == ('8', '/file.log', 'AA:BB')
+
+
+def test_early_exit():
+    """Test the pipeline stops once every option is resolved."""
+    first = RecordingSource({'--flag': 2, '--key': ['a']})
+    second = RecordingSource({'--flag': 5})
+    actual = docoptcfg(DOCSTRING_MULTI, ['1', '--config', 'missing.ini'], sources=[first, second])
+    assert actual == dict(EXPECTED_MULTI, **{'--config': 'missing.ini', '--flag': 2, '--key': ['a']})
+    assert first.asked == [['--flag', '--key']]
+    assert second.asked == []
+
+    # All overridden by argv.
+    actual = docoptcfg(DOCSTRING_MULTI, ['1', '--config=x', '--flag', '--key=b'], sources=[first])
+    assert actual['--key'] == ['b']
+    assert len(first.asked) == 1
+
+
+def test_defaults(monkeypatch, tmpdir):
+    """Test no sources argument is the same as environment variables then the config file.
+
+    :param monkeypatch: pytest fixture.
+    :param tmpdir: pytest fixture.
+    """
+    config_file = tmpdir.join('config.ini')
+    config_file.write('[my_script]\nflag = 3\nkey = f1\n    f2\n')
+    monkeypatch.setenv('MULTI_KEY1', 'e1')
+    monkeypatch.setenv('MULTI_KEY3', 'e3')
+    argv = ['1', '--config', str(config_file)]
+    expected = docoptcfg(DOCSTRING_MULTI, argv, env_prefix='MULTI_', config_option='--config')
+    assert expected['--key'] == ['e1', 'e3']
+    assert expected['--flag'] == 3
+
+    sources = [EnvSource(), IniSource()]
+    assert docoptcfg(DOCSTRING_MULTI, argv, env_prefix='MULTI_', config_option='--config', sources=sources) == expected
+    assert docoptcfg(DOCSTRING_MULTI, argv, env_prefix='MULTI_', config_option='--config', sources=[EnvSource()],
+                     lazy=True) == dict(expected, **{'--flag': 0})
+    assert list(docoptcfg_many(DOCSTRING_MULTI, [argv] * 2, sources=[EnvSource('MULTI_'), IniSource()],
+                               config_option='--config')) == [expected] * 2
+
+    # Nothing enabled.
+    assert docoptcfg(DOCSTRING_MULTI, ['1'], sources=[EnvSource(), IniSource()]) == EXPECTED_MULTI
+    assert docoptcfg(DOCSTRING_MULTI, ['1'], sources=[]) == EXPECTED_MULTI
+
+
+def test_ini_path(tmpdir):
+    """Test IniSource with a fixed path.
+
+    :param tmpdir: pytest fixture.
+    """
+    system = tmpdir.join('system.ini')
+    system.write('[FlashAirMusic]\nthreads = 8\nlog = /system.log\n')
+    user = tmpdir.join('user.ini')
+    user.write('[FlashAirMusic]\nthreads = 2\n')
+    missing = str(tmpdir.join('missing.ini'))
+    sources = [IniSource(missing, optional=True), IniSource(str(user)), IniSource(str(system))]
+
+    actual = docoptcfg(DOCSTRING_FAM, ['run'], sources=sources)
+    assert actual == dict(EXPECTED_FAM, **{'--threads': '2', '--log': '/system.log'})
+    assert docoptcfg(DOCSTRING_FAM, ['run'], sources=sources, lazy=True) == actual
+
+    with pytest.raises(DocoptcfgFileError):
+        docoptcfg(DOCSTRING_FAM, ['run'], sources=[IniSource(missing)])
+    with pytest.raises(DocoptcfgFileError):
+        docoptcfg(DOCSTRING_FAM, ['run'], sources=[IniSource(str(user), section='other')])
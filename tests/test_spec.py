@@ -0,0 +1,198 @@
+"""Test compiled docstring reuse."""
+
+import docopt
+import pytest
+
+import docoptcfg as module
+from docoptcfg import compile as compile_doc, docoptcfg
+from tests import DOCSTRING_FAM, DOCSTRING_MULTI, EXPECTED_FAM, EXPECTED_MULTI
+
+
+def test_attributes():
+    """Test values computed once per docstring."""
+    spec = compile_doc(DOCSTRING_MULTI, env_prefix='MULTI_', config_option='--config')
+    assert spec.config_option == '--config'
+    assert spec.candidates == set(['--config', '--flag', '--key'])
+    assert spec.booleans == set(['--flag'])
+    assert spec.repeatable == set(['--flag', '--key'])
+    assert spec.env_names == {'--config': 'MULTI_CONFIG', '--flag': 'MULTI_FLAG', '--key': 'MULTI_KEY'}
+
+    spec = compile_doc(DOCSTRING_FAM, config_option='-c')
+    assert spec.config_option == '--config'
+    assert spec.short_map['-t'] == '--threads'
+    assert '--help' not in spec.candidates
+    assert spec.repeatable == set()
+    assert spec.env_names == dict()
+
+
+def test_reuse(monkeypatch):
+    """Test parsing many argv lists with one compiled docstring.
+
+    :param monkeypatch: pytest fixture.
+    """
+    monkeypatch.setenv('MULTI_KEY', 'env')
+    spec = compile_doc(DOCSTRING_MULTI, env_prefix='MULTI_')
+
+    actual = spec.parse(['1'])
+    expected = EXPECTED_MULTI.copy()
+    expected['--key'] = ['env']
+    assert actual == expected
+
+    # Mutating a result must not leak into the next one.
+    actual['--key'].append('mutated')
+    actual['<pos>'].append('mutated')
+    assert spec.parse(['1']) == expected
+
+    actual = spec.parse(['1', '2', '--key=a', '--key=b', '--flag', '--flag'])
+    expected['<pos>'] = ['1', '2']
+    expected['--key'] = ['a', 'b']
+    expected['--flag'] = 2
+    assert actual == expected
+
+    with pytest.raises(SystemExit):
+        spec.parse(['--flag'])
+
+
+def test_memoized(monkeypatch):
+    """Test docoptcfg() only compiles each docstring once.
+
+    :param monkeypatch: pytest fixture.
+    """
+    monkeypatch.setattr(module, 'SPEC_CACHE', dict())
+    assert docoptcfg(DOCSTRING_FAM, ['run'], env_prefix='FAM_') == EXPECTED_FAM
+    assert docoptcfg(DOCSTRING_FAM, ['run'], env_prefix='FAM_') == EXPECTED_FAM
+    assert len(module.SPEC_CACHE) == 1
+    spec = list(module.SPEC_CACHE.values())[0][0]
+    assert module.get_spec(DOCSTRING_FAM, 'FAM_') is spec
+    assert module.get_spec(DOCSTRING_FAM, 'OTHER_') is not spec
+
+
+def test_memoized_bounded(monkeypatch):
+    """Test only the most recently used compiled docstrings are kept.
+
+    :param monkeypatch: pytest fixture.
+    """
+    monkeypatch.setattr(module, 'SPEC_CACHE', dict())
+    monkeypatch.setattr(module, 'SPEC_CACHE_SIZE', 2)
+    fam = module.get_spec(DOCSTRING_FAM)
+    multi = module.get_spec(DOCSTRING_MULTI)
+    assert module.get_spec(DOCSTRING_FAM) is fam  # Now more recently used than DOCSTRING_MULTI.
+
+    other = module.get_spec(DOCSTRING_MULTI, 'OTHER_')
+    assert len(module.SPEC_CACHE) == 2
+    assert module.get_spec(DOCSTRING_FAM) is fam
+    assert module.get_spec(DOCSTRING_MULTI, 'OTHER_') is other
+    assert module.get_spec(DOCSTRING_MULTI) is not multi  # Evicted.
+
+
+@pytest.mark.parametrize('argv', [
+    ['run', '--ffmpeg-bin=/tmp/ffmpeg', '-v'],
+    ['run', '--ffmpeg=/tmp/ffmpeg', '--verb'],
+    ['run', '-vf', '/tmp/ffmpeg'],
+    ['-f/tmp/ffmpeg', 'run', '-v'],
+])
+def test_parse_argv(argv):
+    """Test overridden options come from the same parse as the docopt dictionary.
+
+    :param list argv: CLI arguments.
+    """
+    spec = compile_doc(DOCSTRING_FAM, env_prefix='FAM_')
+    docopt_dict, overridden = spec.parse_argv(argv)
+    assert overridden == set(['--ffmpeg-bin', '--verbose'])
+    assert docopt_dict['--ffmpeg-bin'] == '/tmp/ffmpeg'
+    assert docopt_dict['--verbose'] is True
+
+
+def test_options_shortcut(monkeypatch):
+    """Test flags only in the [options] shortcut aren't mistaken for repeatable flags.
+
+    :param monkeypatch: pytest fixture.
+    """
+    monkeypatch.setenv('PROG_FLAG', 'yes')
+    doc = 'Usage:\n    prog [options] <pos>...\n\nOptions:\n    --flag  Flag.\n    --key=VAL  Key.\n'
+    spec = compile_doc(doc, env_prefix='PROG_')
+    assert spec.booleans == set(['--flag'])
+    assert spec.repeatable == set()
+    assert spec.parse(['1']) == {'--flag': True, '--key': None, '<pos>': ['1']}
+
+
+@pytest.mark.parametrize('doc', [
+    DOCSTRING_FAM,
+    DOCSTRING_MULTI,
+    'Usage:\n    p (a|b)... (<x>|<y> <y>) [-v -v] (go go | -k K -k K) [-vk=K]\n\nOptions:\n  -k K  K.\n  -v  V.\n',
+    'Usage:\n    p ((a|b) c)... [(--x=X|--y=Y)]... <z> <z> -q\n    p [options] [--new=N] --x X\n\nOptions:\n'
+    '  --x=X  X [default: 1 2].\n  --y=Y  Y.\n  -f --flag  F.\n',
+])
+def test_pattern(doc):
+    """Test the usage pattern is the same as the one docopt builds.
+
+    :param str doc: Docstring.
+    """
+    options = docopt.parse_defaults(doc)
+    pattern = docopt.parse_pattern(docopt.formal_usage(docopt.printable_usage(doc)), options)
+    for any_options in pattern.flat(docopt.AnyOptions):
+        any_options.children = list(set(docopt.parse_defaults(doc)) - set(pattern.flat(docopt.Option)))
+    pattern.fix()
+
+    spec = compile_doc(doc)
+    assert repr(spec.argv_options) == repr(options)
+    assert spec.leaves == pattern.flat()
+    assert [l.value for l in spec.leaves] == [l.value for l in pattern.flat()]  # Options compare without values.
+
+    # Same leaves shared.
+    expected, actual = dict(), dict()
+    assert [expected.setdefault(id(l), len(expected)) for l in pattern.flat()] == \
+        [actual.setdefault(id(l), len(actual)) for l in spec.leaves]
+
+
+def test_pattern_errors():
+    """Test invalid usage sections raise the same errors as docopt."""
+    for usage in ('p (a', 'p a)', 'p -y', 'p --xx', 'p --flag=1', 'p --x', 'p -x'):
+        doc = 'Usage:\n    {0}\n\nOptions:\n  -x X --x=X  X.\n  --xx=X  X.\n  --xx=Y  Y.\n  -y  Y.\n  -y  Y.\n' \
+              '  --flag  F.\n'.format(usage)
+        with pytest.raises(docopt.DocoptLanguageError) as exc:
+            docopt.docopt(doc, [])
+        with pytest.raises(docopt.DocoptLanguageError) as exc2:
+            compile_doc(doc)
+        assert str(exc2.value) == str(exc.value)
+
+
+def test_repeatable(monkeypatch):
+    """Test repeatable options are detected from the usage pattern, not from "..." anywhere in the docstring.
+
+    :param monkeypatch: pytest fixture.
+    """
+    calls = list()
+    pattern_cases = module.pattern_cases
+    monkeypatch.setattr(module, 'pattern_cases', lambda node: calls.append(node) or pattern_cases(node))
+
+    # "..." only in prose.
+    doc = ('Wait for it...\n\nUsage:\n    prog [options] <pos>\n\nOptions:\n    --key=VAL  Key...\n'
+           '    -v --verbose  V.\n')
+    spec = compile_doc(doc, env_prefix='PROG_')
+    assert spec.repeatable == set()
+    assert not calls
+    actual = spec.parse(['1'], environ={'PROG_KEY': 'a', 'PROG_VERBOSE': 'yes'})
+    assert actual == {'--key': 'a', '--verbose': True, '<pos>': '1'}
+
+    # Repeated without "...".
+    doc = ('Usage:\n    prog [-v -v] [--key=VAL --key=VAL]\n\nOptions:\n    --key=VAL  Key.\n'
+           '    -v --verbose  Verbose.\n')
+    spec = compile_doc(doc, env_prefix='PROG_')
+    assert spec.repeatable == set(['--key', '--verbose'])
+    assert calls
+    actual = spec.parse([], environ={'PROG_KEY1': 'a', 'PROG_KEY2': 'b', 'PROG_VERBOSE': '2'})
+    assert actual == {'--key': ['a', 'b'], '--verbose': 2}
+
+
+def test_short_only():
+    """Test options without a long name are never set by environment variables or config files."""
+    doc = 'Usage:\n    prog [options] [-x]\n\nOptions:\n    -a  A.\n    -o FILE  Output.\n    -v --verbose  V.\n'
+    spec = compile_doc(doc, env_prefix='P_', config_option='-o')
+    assert spec.candidates == set(['--verbose'])
+    assert spec.env_names == {'--verbose': 'P_VERBOSE'}
+
+    actual = docoptcfg(doc, ['-xaoout'], env_prefix='P_', environ={'P_VERBOSE': 'yes'})
+    assert actual == {'-a': True, '-o': 'out', '-x': True, '--verbose': True}
+    actual = docoptcfg(doc, [], env_prefix='P_', environ={'P_A': 'yes'})
+    assert actual == {'-a': False, '-o': None, '-x': False, '--verbose': False}
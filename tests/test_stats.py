@@ -0,0 +1,91 @@
+"""Test timings and counters instrumentation."""
+
+import pytest
+
+from docoptcfg import docoptcfg, Stats
+from tests import DOCSTRING_FAM, EXPECTED_FAM
+
+
+@pytest.mark.parametrize('reader', [None, 'stream', 'mmap'])
+def test_stats(monkeypatch, tmpdir, reader):
+    """Test counters from all sources.
+
+    :param monkeypatch: pytest fixture.
+    :param tmpdir: pytest fixture.
+    :param str reader: config_reader argument.
+    """
+    config_file = tmpdir.join('config.ini')
+    other, section = '[other]\nquiet = false\n', '[FlashAirMusic]\nthreads = 4\nquiet = true\n'
+    config_file.write(other + section)
+    monkeypatch.setenv('FAM_THREADS', '2')
+    argv = ['run', '-c', str(config_file), '-v']
+    expected = EXPECTED_FAM.copy()
+    expected.update({'--config': str(config_file), '--threads': '2', '--quiet': True, '--verbose': True})
+
+    stats = Stats()
+    actual = docoptcfg(DOCSTRING_FAM, argv, env_prefix='FAM_', config_option='-c', config_reader=reader, stats=stats)
+    assert actual == expected
+    assert sorted(stats.timings) == ['argv', 'compile', 'config', 'env']
+    assert stats.counters == {
+        'bytes_read': len(section) if reader == 'mmap' else len(other + section),
+        'cache_hits': 0,
+        'cache_misses': 1,
+        'env_lookups': 7,
+        'files_opened': 1,
+        'from_argv': 2,
+        'from_env': 1,
+        'from_file': 1,
+    }
+
+    stats = Stats()
+    assert docoptcfg(DOCSTRING_FAM, argv, env_prefix='FAM_', config_option='-c', config_reader=reader,
+                     stats=stats) == expected
+    assert (stats.counters['cache_hits'], stats.counters['files_opened'], stats.counters['bytes_read']) == (1, 0, 0)
+
+
+def test_profile(monkeypatch, capsys):
+    """Test DOCOPTCFG_PROFILE environment variable.
+
+    :param monkeypatch: pytest fixture.
+    :param capsys: pytest fixture.
+    """
+    assert docoptcfg(DOCSTRING_FAM, ['run'], env_prefix='FAM_') == EXPECTED_FAM
+    assert capsys.readouterr()[1] == ''
+
+    monkeypatch.setenv('DOCOPTCFG_PROFILE', '1')
+    assert docoptcfg(DOCSTRING_FAM, ['run'], env_prefix='FAM_') == EXPECTED_FAM
+    stderr = capsys.readouterr()[1]
+    assert stderr.startswith('docoptcfg [FlashAirMusic] argv=')
+    assert ' compile=' in stderr
+    assert stderr.endswith(' env_lookups=9 files_opened=0 bytes_read=0 cache_hits=0 cache_misses=0 from_argv=0 '
+                           'from_env=0 from_file=0\n')
+
+    # Disabled.
+    for value in ('', '0', 'false', ' Off '):
+        monkeypatch.setenv('DOCOPTCFG_PROFILE', value)
+        assert docoptcfg(DOCSTRING_FAM, ['run'], env_prefix='FAM_') == EXPECTED_FAM
+        assert capsys.readouterr()[1] == ''
+
+
+def test_profile_result_cache(monkeypatch, capsys):
+    """Test DOCOPTCFG_PROFILE with result_cache, on a miss and on a hit.
+
+    :param monkeypatch: pytest fixture.
+    :param capsys: pytest fixture.
+    """
+    monkeypatch.setenv('DOCOPTCFG_PROFILE', 'yes')
+    assert docoptcfg(DOCSTRING_FAM, ['run'], env_prefix='FAM_', result_cache=True) == EXPECTED_FAM
+    stderr = capsys.readouterr()[1]
+    assert stderr.count('\n') == 1
+    assert stderr.startswith('docoptcfg [FlashAirMusic] argv=')
+    assert ' compile=' in stderr
+    assert ' result_cache=' in stderr
+    assert stderr.endswith(' from_file=0 result_cache_misses=1\n')
+
+    stats = Stats()
+    assert docoptcfg(DOCSTRING_FAM, ['run'], env_prefix='FAM_', result_cache=True, stats=stats) == EXPECTED_FAM
+    stderr = capsys.readouterr()[1]
+    assert stderr.startswith('docoptcfg [FlashAirMusic] result_cache=')
+    assert stderr.endswith(' env_lookups=0 files_opened=0 bytes_read=0 cache_hits=0 cache_misses=0 from_argv=0 '
+                           'from_env=0 from_file=0 result_cache_hits=1\n')
+    assert sorted(stats.timings) == ['result_cache']
@@ -0,0 +1,172 @@
+"""Test subcommand config file sections like [prog], [prog run], and [prog sync remote]."""
+
+import pytest
+
+from docoptcfg import compile as compile_doc, ConfigParser, docoptcfg, DocoptcfgFileError, generate
+from docoptcfg import IniSource, LayeredSource, section_chain, section_index, watch
+from tests.test_generate import load
+
+DOCSTRING = """\
+Git style tool.
+
+Usage:
+    prog run [options]
+    prog sync remote [options]
+    prog sync local [options]
+
+Options:
+    -c FILE --config=FILE   Path to config file.
+    -t NUM --threads=NUM    Threads.
+    -v --verbose            Verbose.
+    -x VAL --extra=VAL      Extra.
+"""
+
+CONFIG = """\
+[prog]
+threads = 1
+extra = base
+
+[prog run]
+threads = 2
+
+[prog  sync   remote]
+verbose = true
+threads = 3
+
+[other]
+threads = 99
+"""
+
+
+def options(result):
+    """Values read from config files.
+
+    :param dict result: docoptcfg() result.
+
+    :return: --threads, --verbose, and --extra values.
+    :rtype: tuple
+    """
+    return result['--threads'], result['--verbose'], result['--extra']
+
+
+@pytest.mark.parametrize('config_reader', [None, 'stream', 'mmap'])
+def test_chain(tmpdir, config_reader):
+    """Test more specific sections override less specific ones.
+
+    :param tmpdir: pytest fixture.
+    :param str config_reader: docoptcfg() argument.
+    """
+    config_file = tmpdir.join('config.ini')
+    config_file.write(CONFIG)
+
+    def parse(*argv):
+        """Parse with the config file."""
+        argv = list(argv) + ['-c', str(config_file)]
+        return options(docoptcfg(DOCSTRING, argv, config_option='--config', config_reader=config_reader))
+
+    assert parse('run') == ('2', False, 'base')
+    assert parse('sync', 'remote') == ('3', True, 'base')
+    assert parse('sync', 'local') == ('1', False, 'base')  # No [prog sync] or [prog sync local].
+    assert parse('run', '-t', '8') == ('8', False, 'base')
+
+    # Without [prog].
+    config_file.write(CONFIG.replace('[prog]', '[unrelated]'))
+    assert parse('run') == ('2', False, None)
+    with pytest.raises(DocoptcfgFileError) as exc:
+        parse('sync', 'local')
+    assert exc.value.message == 'Section [prog] not in config file.'
+
+
+def test_sources(tmpdir):
+    """Test in memory configs, lazy results, and layered config files.
+
+    :param tmpdir: pytest fixture.
+    """
+    assert options(docoptcfg(DOCSTRING, ['sync', 'remote'], config=CONFIG)) == ('3', True, 'base')
+    assert docoptcfg(DOCSTRING, ['run'], config=CONFIG, lazy=True)['--threads'] == '2'
+
+    tmpdir.join('a.ini').write(CONFIG)
+    tmpdir.join('b.ini').write('[prog]\nthreads = 4\n[prog sync]\nextra = b\n')
+    source = LayeredSource([str(tmpdir.join('a.ini')), str(tmpdir.join('b.ini'))])
+    assert options(docoptcfg(DOCSTRING, ['run'], sources=[source])) == ('4', False, 'base')  # Later layer wins.
+    assert options(docoptcfg(DOCSTRING, ['sync', 'remote'], sources=[source])) == ('4', True, 'b')
+    assert options(docoptcfg(DOCSTRING, ['sync', 'local'], sources=[source])) == ('4', False, 'b')
+
+
+def test_index():
+    """Test the section index is built once per ConfigParser and chains are found by words."""
+    config = ConfigParser()
+    config.read_string(CONFIG)
+    index = section_index(config)
+    assert index == {('prog',): 'prog', ('prog', 'run'): 'prog run', ('prog', 'sync', 'remote'): 'prog  sync   remote',
+                     ('other',): 'other'}
+    assert section_index(config) is index
+    assert section_chain(config, 'prog', ('sync', 'remote')) == ['prog', 'prog  sync   remote']
+    assert section_chain(config, 'prog', ()) == ['prog']
+    assert section_chain(config, 'missing', ('run',)) == []
+
+    # Rebuilt when sections are added.
+    config.add_section('prog sync')
+    assert section_index(config) is not index
+    assert section_chain(config, 'prog', ('sync', 'remote')) == ['prog', 'prog sync', 'prog  sync   remote']
+
+    spec = compile_doc(DOCSTRING)
+    assert spec.commands == ('run', 'sync', 'remote', 'local')
+    assert spec.subcommands(spec.parse(['sync', 'remote'])) == ('sync', 'remote')
+
+
+def test_caller_owned():
+    """Test sections added to a ConfigParser owned by the caller after it was already used."""
+    config = ConfigParser()
+    config.read_string('[other]\nthreads = 99\n')
+    source = IniSource(config=config)
+    with pytest.raises(DocoptcfgFileError) as exc:
+        docoptcfg(DOCSTRING, ['run'], sources=[source])
+    assert exc.value.message == 'Section [prog] not in config file.'
+
+    config.add_section('prog')
+    config.set('prog', 'threads', '1')
+    assert options(docoptcfg(DOCSTRING, ['run'], sources=[source])) == ('1', False, None)
+    assert options(docoptcfg(DOCSTRING, ['run'], config=config)) == ('1', False, None)
+
+    config.add_section('prog run')
+    config.set('prog run', 'threads', '2')
+    assert options(docoptcfg(DOCSTRING, ['run'], sources=[source])) == ('2', False, None)
+    assert options(docoptcfg(DOCSTRING, ['run'], config=config)) == ('2', False, None)
+    assert options(docoptcfg(DOCSTRING, ['sync', 'local'], config=config)) == ('1', False, None)
+
+
+def test_generated(tmpdir):
+    """Test generated parsers read the same sections.
+
+    :param tmpdir: pytest fixture.
+    """
+    config_file = tmpdir.join('config.ini')
+    config_file.write(CONFIG)
+    parse = load(generate(DOCSTRING, config_option='--config'))['parse']
+    for argv in (['run'], ['sync', 'remote'], ['sync', 'local']):
+        argv += ['-c', str(config_file)]
+        assert parse(argv) == docoptcfg(DOCSTRING, argv, config_option='--config')
+
+
+def test_argv_order(tmpdir):
+    """Test commands select sections in argv order, not in the order they first appear in the usage section.
+
+    :param tmpdir: pytest fixture.
+    """
+    doc = ('Usage:\n    prog remote [options]\n    prog sync remote [options]\n\n'
+           'Options:\n    -c FILE --config=FILE  Config.\n    -x VAL --extra=VAL  Extra.\n')
+    config_file = tmpdir.join('config.ini')
+    config_file.write('[prog]\nextra = base\n[prog sync]\nextra = sync\n[prog sync remote]\nextra = sync remote\n')
+    argv = ['sync', 'remote', '-c', str(config_file)]
+
+    spec = compile_doc(doc, config_option='--config')
+    assert spec.commands == ('remote', 'sync')
+    assert spec.command_orders == [('remote',), ('sync', 'remote')]
+    assert spec.subcommands(spec.parse(argv)) == ('sync', 'remote')
+
+    assert docoptcfg(doc, argv, config_option='--config')['--extra'] == 'sync remote'
+    assert docoptcfg(doc, ['remote', '-c', str(config_file)], config_option='--config')['--extra'] == 'base'
+    assert docoptcfg(doc, argv, sources=[LayeredSource([str(config_file)])])['--extra'] == 'sync remote'
+    assert watch(doc, argv, config_option='--config', inotify=False).result['--extra'] == 'sync remote'
+    assert load(generate(doc, config_option='--config'))['parse'](argv)['--extra'] == 'sync remote'
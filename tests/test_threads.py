@@ -0,0 +1,71 @@
+"""Test resolving different docstrings concurrently."""
+
+import threading
+
+import docopt
+import pytest
+
+from docoptcfg import docoptcfg, DocoptcfgExit, DocoptcfgFileError
+from tests import DOCSTRING_FAM, DOCSTRING_MULTI, EXPECTED_FAM, EXPECTED_MULTI
+
+
+def test_stress(tmpdir):
+    """Resolve command lines of two programs with two config files from many threads at once.
+
+    :param tmpdir: pytest fixture.
+    """
+    fam_file = tmpdir.join('fam.ini')
+    fam_file.write('[FlashAirMusic]\nthreads = 4\n')
+    multi_file = tmpdir.join('multi.ini')
+    multi_file.write('[my_script]\nflag = 3\nkey =\n    a\n    b\n')
+    bad_file = tmpdir.join('bad.ini')
+    bad_file.write('[my_script]\nflag = bad\n')
+
+    expected_fam = EXPECTED_FAM.copy()
+    expected_fam.update({'--config': str(fam_file), '--threads': '4'})
+    expected_multi = EXPECTED_MULTI.copy()
+    expected_multi.update({'--config': str(multi_file), '--flag': 3, '--key': ['a', 'b']})
+
+    def fam():
+        """Resolve FlashAirMusic."""
+        assert docoptcfg(DOCSTRING_FAM, ['run', '-c', str(fam_file)], config_option='-c') == expected_fam
+
+    def multi():
+        """Resolve my_script."""
+        assert docoptcfg(DOCSTRING_MULTI, ['1', '--config', str(multi_file)], config_option='--config') == \
+            expected_multi
+
+    def bad_file_path():
+        """Error context must belong to this call."""
+        with pytest.raises(DocoptcfgFileError) as exc:
+            docoptcfg(DOCSTRING_MULTI, ['1', '--config', str(bad_file)], config_option='--config')
+        assert exc.value.FILE_PATH == str(bad_file)
+
+    def bad_argv():
+        """Usage in error message must belong to this docstring."""
+        with pytest.raises(DocoptcfgExit) as exc:
+            docoptcfg(DOCSTRING_FAM, ['run', '--threads'], config_option='-c')
+        assert str(exc.value.code).startswith('--threads requires argument\nUsage:\n    FlashAirMusic [options] run')
+        with pytest.raises(docopt.DocoptExit) as exc:
+            docoptcfg(DOCSTRING_MULTI, [], config_option='--config')
+        assert str(exc.value.code).startswith('Usage:\n    my_script <pos>...')
+
+    errors = list()
+
+    def worker(target):
+        """Run target many times, recording assertion errors.
+
+        :param target: Function to call.
+        """
+        try:
+            for _ in range(200):
+                target()
+        except Exception as exc:  # pylint: disable=broad-except
+            errors.append(exc)
+
+    threads = [threading.Thread(target=worker, args=(t,)) for t in (fam, multi, bad_file_path, bad_argv) * 4]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
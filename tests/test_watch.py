@@ -0,0 +1,156 @@
+"""Test re-resolving options when the config file changes."""
+
+import os
+import threading
+
+import pytest
+
+from docoptcfg import docoptcfg, DocoptcfgFileError, Inotify, watch
+from tests import DOCSTRING_FAM, DOCSTRING_MULTI, EXPECTED_FAM, EXPECTED_MULTI, write
+
+
+@pytest.mark.parametrize('inotify', [False, None])
+def test_check(tmpdir, inotify):
+    """Test only options from the config file are recomputed.
+
+    :param tmpdir: pytest fixture.
+    :param bool inotify: Use inotify.
+    """
+    config_file = tmpdir.join('config.ini')
+    write(config_file, '[FlashAirMusic]\nthreads = 2\nlog = /file.log\nquiet = true\nverbose = false\n')
+    argv = ['run', '-v', '-c', str(config_file)]
+    environ = {'FAM_LOG': '/env.log'}
+    diffs = list()
+
+    watcher = watch(DOCSTRING_FAM, argv, 'FAM_', '--config', callback=diffs.append, environ=environ, inotify=inotify)
+    expected = docoptcfg(DOCSTRING_FAM, argv, 'FAM_', '--config', environ=environ)
+    assert watcher.result == expected
+    assert watcher.check() == dict()
+
+    first = watcher.result
+    write(config_file, '[FlashAirMusic]\nthreads = 8\nlog = /other.log\nverbose = false\nmac-addr = AA\n', 10)
+    diff = watcher.check()
+    assert diff == {'--threads': ('2', '8'), '--quiet': (True, False), '--mac-addr': (None, 'AA')}
+    assert diffs == [diff]
+    assert watcher.result == dict(expected, **{'--threads': '8', '--quiet': False, '--mac-addr': 'AA'})
+    assert first == expected  # Replaced, not modified.
+
+    # Touched without changes.
+    write(config_file, config_file.read(), 20)
+    assert watcher.check() == dict()
+    assert len(diffs) == 1
+    watcher.stop()
+
+
+def test_errors(tmpdir):
+    """Test bad reloads keep the previous values.
+
+    :param tmpdir: pytest fixture.
+    """
+    config_file = tmpdir.join('config.ini')
+    write(config_file, '[my_script]\nflag = 2\n')
+    watcher = watch(DOCSTRING_MULTI, ['1', '--config', str(config_file)], config_option='--config', inotify=False)
+    assert watcher.result['--flag'] == 2
+
+    write(config_file, '[my_script]\nflag = maybe\n', 10)
+    assert watcher.check() == dict()
+    assert watcher.error.__class__ is DocoptcfgFileError
+    config_file.remove()
+    assert watcher.check() == dict()
+    assert watcher.result['--flag'] == 2
+
+    write(config_file, '[my_script]\nkey = a\n    b\n', 20)
+    assert watcher.check() == {'--flag': (2, 0), '--key': ([], ['a', 'b'])}
+    assert watcher.error is None
+
+    # Nothing to watch.
+    watcher = watch(DOCSTRING_MULTI, ['1'], config_option='--config')
+    assert (watcher.path, watcher.result) == (None, EXPECTED_MULTI)
+    assert watcher.start().check() == dict()
+    watcher.stop()
+
+
+@pytest.mark.parametrize('inotify', [False, None])
+def test_thread(tmpdir, inotify):
+    """Test the background thread calls back on changes.
+
+    :param tmpdir: pytest fixture.
+    :param bool inotify: Use inotify.
+    """
+    config_file = tmpdir.join('config.ini')
+    write(config_file, '[FlashAirMusic]\nthreads = 2\n')
+    changed = threading.Event()
+    diffs = list()
+
+    def callback(diff):
+        """Record diff.
+
+        :param dict diff: Changed options.
+        """
+        diffs.append(diff)
+        changed.set()
+
+    watcher = watch(DOCSTRING_FAM, ['run', '-c', str(config_file)], config_option='-c', callback=callback,
+                    interval=0.05, inotify=inotify).start()
+    assert watcher.result == dict(EXPECTED_FAM, **{'--config': str(config_file), '--threads': '2'})
+    tmp = tmpdir.join('config.ini.tmp')
+    write(tmp, '[FlashAirMusic]\nthreads = 16\n', 10)
+    tmp.rename(config_file)  # Atomic replace.
+    assert changed.wait(5)
+    watcher.stop()
+    assert diffs == [{'--threads': ('2', '16')}]
+    assert watcher.result['--threads'] == '16'
+
+
+def test_symlink(tmpdir):
+    """Test changes behind symlinks are noticed with inotify: edited targets and swapped Kubernetes ConfigMap links.
+
+    :param tmpdir: pytest fixture.
+    """
+    for version in ('v1', 'v2'):
+        write(tmpdir.ensure(version, dir=True).join('config.ini'), '[FlashAirMusic]\nthreads = 2\n')
+    os.symlink(str(tmpdir.join('v1')), str(tmpdir.join('..data')))
+    os.symlink(os.path.join('..data', 'config.ini'), str(tmpdir.join('config.ini')))
+
+    # Directory of the target watched too.
+    inotify = Inotify(str(tmpdir.join('config.ini')))
+    write(tmpdir.join('v1', 'config.ini'), '[FlashAirMusic]\nthreads = 2\n', 5)
+    assert inotify.wait(5)
+    inotify.close()
+
+    changed = threading.Event()
+    diffs = list()
+
+    def callback(diff):
+        """Record diff.
+
+        :param dict diff: Changed options.
+        """
+        diffs.append(diff)
+        changed.set()
+
+    watcher = watch(DOCSTRING_FAM, ['run', '-c', str(tmpdir.join('config.ini'))], config_option='-c',
+                    callback=callback, interval=0.05).start()
+    assert watcher.result['--threads'] == '2'
+
+    # Target edited in place.
+    write(tmpdir.join('v1', 'config.ini'), '[FlashAirMusic]\nthreads = 4\n', 10)
+    assert changed.wait(5)
+    changed.clear()
+
+    # ..data replaced by a link to another directory.
+    write(tmpdir.join('v2', 'config.ini'), '[FlashAirMusic]\nthreads = 8\n', 20)
+    os.symlink(str(tmpdir.join('v2')), str(tmpdir.join('..data_tmp')))
+    os.rename(str(tmpdir.join('..data_tmp')), str(tmpdir.join('..data')))
+    assert changed.wait(5)
+    watcher.stop()
+    assert diffs == [{'--threads': ('2', '4')}, {'--threads': ('4', '8')}]
+
+
+def test_inotify_errors(tmpdir):
+    """Test watching a missing directory raises OSError.
+
+    :param tmpdir: pytest fixture.
+    """
+    with pytest.raises(OSError):
+        Inotify(str(tmpdir.join('missing', 'config.ini')))